@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Batched procedural animation for MegaRealms monsters
+Stacks every keyed sprite into one (monsters, H, W, 4) array and renders
+each animation for all monsters and frames in a few vectorized passes,
+giving (monsters, frames, H, W, 4). Per-frame transforms (translate,
+squash/stretch about the feet, mirror), hit flash and fade are data in
+ANIMATIONS, and the frame timings are exported with the strips so the
+client need not hard-code them.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from sprite_catalog import ANIMATED_DIR, SPRITE_DIR, monster_names
+
+STRIP_DIR = f'{SPRITE_DIR}/animations'
+TIMING_PATH = 'assets/sprites/animations.json'
+DIRECTIONS = ['right', 'left']   # sources face right; left is mirrored
+
+# name -> per-frame channels; any channel left out keeps its neutral value
+# (dx/dy in pixels, sx/sy scale about the bottom centre, flash 0..1 toward
+# white, alpha 0..1). 'ms' is the duration of each frame.
+ANIMATIONS = {
+    'idle': {'dy': [0, -1, 0, 1], 'ms': [200, 200, 200, 200], 'loop': True},
+    'walk': {'dx': [0, 1, 0, -1], 'dy': [0, -1, 0, -1], 'ms': [150, 150, 150, 150], 'loop': True},
+    'squash': {'sx': [1.0, 1.1, 1.0, 0.92], 'sy': [1.0, 0.9, 1.0, 1.08], 'ms': [120, 120, 120, 120], 'loop': True},
+    'hit': {'dx': [-1, -1, 0], 'flash': [1.0, 0.5, 0.0], 'ms': [60, 60, 80], 'loop': False},
+    'death': {'dy': [0, 1, 2, 3, 4, 5], 'sy': [1.0, 0.95, 0.85, 0.75, 0.65, 0.55],
+              'alpha': [1.0, 0.8, 0.6, 0.4, 0.2, 0.0], 'ms': [100, 100, 100, 100, 100, 100], 'loop': False},
+}
+NEUTRAL = {'dx': 0, 'dy': 0, 'sx': 1.0, 'sy': 1.0, 'flash': 0.0, 'alpha': 1.0}
+
+
+def frame_count(spec):
+    return len(spec['ms'])
+
+
+def channels(spec, frames=None):
+    """{channel: (F,) array} of a spec, resampled to `frames` frames if given
+
+    Resampling picks the nearest keyframe, so a longer cycle holds each
+    pose for more frames and the timings stretch to match.
+    """
+    count = frame_count(spec)
+    frames = frames or count
+    pick = np.minimum((np.arange(frames) * count) // frames, count - 1)
+    out = {name: np.asarray(spec.get(name, [neutral] * count), dtype=np.float64)[pick]
+           for name, neutral in NEUTRAL.items()}
+    out['ms'] = np.asarray(spec['ms'], dtype=np.int64)[pick] * count // frames
+    return out
+
+
+def source_coords(ch, size, flip=False):
+    """(F, H, W) source row/column for every output pixel, -1 where outside
+
+    Inverse-maps each output pixel through the frame's scale (about the
+    bottom centre) and translation; nearest neighbour keeps pixel art crisp.
+    flip=True mirrors the finished frame, so motion mirrors with it.
+    """
+    height, width = size
+    y = np.arange(height, dtype=np.float64)[None, :, None]
+    x = np.arange(width, dtype=np.float64)[None, None, :]
+    sx, sy = ch['sx'][:, None, None], ch['sy'][:, None, None]
+    dx, dy = ch['dx'][:, None, None], ch['dy'][:, None, None]
+    anchor_y, centre_x = height - 0.5, width / 2
+    src_y = np.floor(anchor_y + (y + 0.5 - dy - anchor_y) / sy)
+    src_x = np.floor(centre_x + (x + 0.5 - dx - centre_x) / sx)
+    src_y, src_x = np.broadcast_arrays(src_y, src_x)
+    if flip:
+        src_y, src_x = src_y[..., ::-1], src_x[..., ::-1]
+    inside = (src_y >= 0) & (src_y < height) & (src_x >= 0) & (src_x < width)
+    return np.where(inside, src_y, -1).astype(np.intp), np.where(inside, src_x, -1).astype(np.intp)
+
+
+def render(stack, spec, frames=None, flip=False):
+    """(M, H, W, 4) uint8 sprites -> (M, F, H, W, 4) uint8 frames of one animation"""
+    stack = np.asarray(stack, dtype=np.uint8)
+    ch = channels(spec, frames)
+    src_y, src_x = source_coords(ch, stack.shape[1:3], flip)
+    inside = src_y >= 0
+    # One gather for every monster and frame; outside pixels read (0, 0)
+    # and are cleared below
+    out = stack[:, np.maximum(src_y, 0), np.maximum(src_x, 0)]
+    out[:, ~inside] = 0
+
+    flash, alpha = ch['flash'], ch['alpha']
+    if flash.any() or (alpha != 1).any():
+        work = out.astype(np.float32)
+        rgb = work[..., :3]
+        rgb += (255 - rgb) * flash[None, :, None, None, None].astype(np.float32)
+        work[..., 3] *= alpha[None, :, None, None].astype(np.float32)
+        out = np.clip(np.rint(work), 0, 255).astype(np.uint8)
+    return out
+
+
+def render_all(stack, animations=ANIMATIONS, frames=None, directions=DIRECTIONS):
+    """{(animation, direction): (M, F, H, W, 4)} for every animation and facing
+
+    `frames` maps an animation name to a frame count overriding its spec.
+    """
+    frames = frames or {}
+    return {(name, direction): render(stack, spec, frames.get(name), direction == 'left')
+            for name, spec in animations.items() for direction in directions}
+
+
+def timings(animations=ANIMATIONS, frames=None):
+    """{name: {'frames', 'ms', 'loop'}} as exported to the client"""
+    frames = frames or {}
+    out = {}
+    for name, spec in animations.items():
+        ch = channels(spec, frames.get(name))
+        out[name] = {'frames': len(ch['ms']), 'ms': ch['ms'].tolist(), 'loop': spec['loop']}
+    return out
+
+
+def idle_frames(image, frames=None):
+    """(F, H, W, 4) idle frames of one (H, W, 4) sprite"""
+    return render(np.asarray(image)[None], ANIMATIONS['idle'], frames)[0]
+
+
+def idle_ms(frames=None):
+    """Per-frame idle durations, the timing the inline case blocks use"""
+    return channels(ANIMATIONS['idle'], frames)['ms'].tolist()
+
+
+def load_stack(names, frame_dir=ANIMATED_DIR):
+    """(M, H, W, 4) of the keyed base frame of each sprite, plus the names found"""
+    from PIL import Image
+
+    found = []
+    images = []
+    for name in names:
+        path = os.path.join(frame_dir, f'{name}_frame0.png')
+        if os.path.exists(path):
+            found.append(name)
+            images.append(np.array(Image.open(path).convert('RGBA')))
+    return (np.stack(images) if images else np.zeros((0, 32, 32, 4), np.uint8)), found
+
+
+def strip_path(name, animation, direction, out_dir=STRIP_DIR):
+    return os.path.join(out_dir, f'{name}_{animation}_{direction}.png')
+
+
+def write_strips(rendered, names, out_dir=STRIP_DIR):
+    """Save each (monster, animation, direction) as a horizontal frame strip
+
+    Returns {name: {animation: {direction: path}}}.
+    """
+    from png_encoder import save_png
+    from PIL import Image
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for (animation, direction), frames in rendered.items():
+        for i, name in enumerate(names):
+            # (F, H, W, 4) -> (H, F*W, 4)
+            strip = np.concatenate(list(frames[i]), axis=1)
+            path = strip_path(name, animation, direction, out_dir)
+            save_png(Image.fromarray(np.ascontiguousarray(strip), 'RGBA'), path)
+            paths.setdefault(name, {}).setdefault(animation, {})[direction] = path.replace(os.sep, '/')
+    return paths
+
+
+def build(names=None, frames=None, out_dir=STRIP_DIR, timing_path=TIMING_PATH):
+    """Render and save every animation of `names`; returns the timing manifest"""
+    stack, found = load_stack(names or monster_names())
+    rendered = render_all(stack, frames=frames)
+    # Strips of sprites not rebuilt this time stay listed
+    strips = {}
+    if os.path.exists(timing_path):
+        with open(timing_path, 'r', encoding='utf-8') as f:
+            strips = json.load(f).get('strips', {})
+    strips.update(write_strips(rendered, found, out_dir))
+    manifest = {
+        'frame_size': list(stack.shape[1:3]),
+        'directions': DIRECTIONS,
+        'animations': timings(frames=frames),
+        'strips': strips,
+    }
+    os.makedirs(os.path.dirname(timing_path) or '.', exist_ok=True)
+    with open(timing_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def parse_frames(text):
+    """'walk=8,idle=6' -> {'walk': 8, 'idle': 6}"""
+    frames = {}
+    for item in filter(None, text.split(',')):
+        name, _, count = item.partition('=')
+        if name not in ANIMATIONS or not count.isdigit() or int(count) < 1:
+            raise argparse.ArgumentTypeError(f"expected <animation>=<frames>, got {item!r}")
+        frames[name] = int(count)
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render every monster animation in one batched pass')
+    parser.add_argument('--frames', type=parse_frames, default={}, metavar='NAME=N,...',
+                        help=f"override frame counts ({', '.join(ANIMATIONS)})")
+    parser.add_argument('--only', default='', help='comma-separated sprite names (default: all)')
+    args = parser.parse_args()
+
+    names = [n for n in args.only.split(',') if n] or None
+    manifest = build(names, args.frames)
+    print(f"✓ {len(manifest['strips'])} monsters × {len(ANIMATIONS)} animations × {len(DIRECTIONS)} directions")
+    for name, timing in manifest['animations'].items():
+        print(f"  {name:8s} {timing['frames']} frames  {'/'.join(map(str, timing['ms']))} ms"
+              f"{'  loop' if timing['loop'] else ''}")
+    print(f"  → {STRIP_DIR}/, {TIMING_PATH}")
+
+
+if __name__ == '__main__':
+    main()
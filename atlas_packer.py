@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Texture atlas packer for MegaRealms
+Packs every monster animation frame and tile into one or a few atlas PNGs
+and generates an SM-style coordinate map plus frame sequences, so the client
+decodes a single image instead of 56+ separate data URIs
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+
+from PIL import Image
+
+from animation_engine import ANIMATIONS
+from sprite_catalog import ANIMATED_DIR, ANIMATION_FRAMES, HTML_PATH, MONSTERS, TILES_DIR
+
+ATLAS_DIR = 'assets/sprites/hashed'
+ATLAS_MAP = 'assets/sprites/atlas.json'
+MAX_ATLAS_SIZE = 1024
+FRAME_MS = ANIMATIONS['idle']['ms'][0]
+PADDING = 0
+TILE_SIZE = (32, 32)
+
+ATLAS_BEGIN = '// ============ ATLAS (generated by atlas_packer.py) ============\n'
+ATLAS_END = '// ============ END ATLAS ============\n'
+SM_RE = re.compile(r"const SM=\{.*?\n\};\n", re.S)
+
+
+def collect_sprites(animated_dir=ANIMATED_DIR, tiles_dir=TILES_DIR, frames=ANIMATION_FRAMES,
+                    tile_size=TILE_SIZE):
+    """Load the sprites to pack
+
+    Returns ({name: RGBA image}, {sequence: [frame names]}). Monster frames
+    are named <sprite>_<n>; tiles are prefixed with tile_ so they cannot
+    collide with SM names, and scaled to tile_size since the game draws
+    them at TS.
+    """
+    images = {}
+    sequences = {}
+    for name in MONSTERS:
+        seq = []
+        for i in range(frames):
+            path = os.path.join(animated_dir, f'{name}_frame{i}.png')
+            if not os.path.exists(path):
+                break
+            with Image.open(path) as img:
+                images[f'{name}_{i}'] = img.convert('RGBA')
+            seq.append(f'{name}_{i}')
+        if seq:
+            sequences[name] = seq
+
+    for path in sorted(glob.glob(os.path.join(tiles_dir, '*.png'))):
+        with Image.open(path) as img:
+            tile = img.convert('RGBA')
+        if tile.size != tuple(tile_size):
+            tile = tile.resize(tuple(tile_size), Image.Resampling.LANCZOS)
+        images['tile_' + os.path.splitext(os.path.basename(path))[0]] = tile
+    return images, sequences
+
+
+def _next_pow2(n):
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+def shelf_pack(sizes, max_size=MAX_ATLAS_SIZE, padding=PADDING):
+    """Place rectangles on shelves, tallest first, opening a new page when full
+
+    sizes: {key: (w, h)}. Returns ({key: (page, x, y)}, [(page_w, page_h)]).
+    """
+    order = sorted(sizes, key=lambda k: (-sizes[k][1], -sizes[k][0], k))
+    too_big = [k for k in order if sizes[k][0] > max_size or sizes[k][1] > max_size]
+    if too_big:
+        raise ValueError(f"Sprite larger than {max_size}px atlas: {', '.join(too_big)}")
+
+    # Aim for a roughly square page, never narrower than the widest sprite
+    area = sum((w + padding) * (h + padding) for w, h in sizes.values())
+    widest = max((w for w, _ in sizes.values()), default=1)
+    width = min(max_size, max(_next_pow2(int(area ** 0.5)), _next_pow2(widest)))
+
+    placed = {}
+    pages = []
+    page = x = y = shelf_h = used_w = 0
+    for key in order:
+        w, h = sizes[key]
+        if x + w > width:
+            x, y, shelf_h = 0, y + shelf_h + padding, 0
+        if y + h > max_size:
+            pages.append((used_w, y - padding))
+            page, x, y, shelf_h, used_w = page + 1, 0, 0, 0, 0
+        placed[key] = (page, x, y)
+        x += w + padding
+        used_w = max(used_w, x - padding)
+        shelf_h = max(shelf_h, h)
+    if placed:
+        pages.append((used_w, y + shelf_h))
+    return placed, pages
+
+
+def build_atlas(images, sequences, max_size=MAX_ATLAS_SIZE, padding=PADDING):
+    """Pack images into atlas pages
+
+    Identical frames (e.g. the two rest poses of a bob cycle) share one rect.
+    Returns ([page images], {name: [page, x, y, w, h]}, sequences).
+    """
+    by_content = {}
+    alias = {}
+    for name, img in images.items():
+        digest = hashlib.sha256(img.tobytes() + repr(img.size).encode()).hexdigest()
+        alias[name] = by_content.setdefault(digest, name)
+    unique = {name: images[name].size for name in set(alias.values())}
+
+    placed, page_sizes = shelf_pack(unique, max_size, padding)
+    pages = [Image.new('RGBA', size, (0, 0, 0, 0)) for size in page_sizes]
+    for name, (page, x, y) in placed.items():
+        pages[page].paste(images[name], (x, y))
+
+    coords = {}
+    for name in sorted(images):
+        page, x, y = placed[alias[name]]
+        w, h = images[name].size
+        coords[name] = [page, x, y, w, h]
+    return pages, coords, sequences
+
+
+def save_pages(pages, out_dir=ATLAS_DIR):
+    """Write atlas pages under content-hashed names; returns their paths"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for page in pages:
+        buf = io.BytesIO()
+        page.save(buf, 'PNG', optimize=True)
+        data = buf.getvalue()
+        path = os.path.join(out_dir, f'atlas-{hashlib.sha256(data).hexdigest()[:16]}.png')
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(data)
+        paths.append(path.replace(os.sep, '/'))
+    return paths
+
+
+def atlas_js(paths, coords, sequences, frame_ms=FRAME_MS):
+    """Client-side map and helpers, in the style of SM/drawSpr"""
+    am = ','.join(f"{name}:[{','.join(map(str, rect))}]" for name, rect in coords.items())
+    af = ','.join(f"{name}:[{','.join(repr(f) for f in frames)}]" for name, frames in sequences.items())
+    pages = ','.join(repr(p) for p in paths)
+    return (
+        ATLAS_BEGIN
+        + f"const ATLAS=[{pages}].map(s=>{{const i=new Image();i.src=s;return i;}});\n"
+        + f"const AM={{{am}}};\n"
+        + f"const AF={{{af}}};\n"
+        + f"const AF_MS={frame_ms};\n"
+        + "function drawAtlas(ctx,name,dx,dy,dw,dh){\n"
+          "  const e=AM[name];if(!e)return false;\n"
+          "  const img=ATLAS[e[0]];if(!img.complete||!img.naturalWidth)return false;\n"
+          "  ctx.drawImage(img,e[1],e[2],e[3],e[4],dx,dy,dw||e[3],dh||e[4]);return true;\n"
+          "}\n"
+          "function atlasFrame(seq,t){const f=AF[seq];return f?f[Math.floor(t/AF_MS)%f.length]:seq;}\n"
+        + ATLAS_END
+    )
+
+
+def atlas_animation_code(sprite_name):
+    """drawMonster case body drawing the current frame of a sequence"""
+    return (
+        f"if(!drawAtlas(ctx,atlasFrame('{sprite_name}',Date.now()),0,0,32,32))"
+        f"px(ctx,8,12,16,10,'rgba(160,154,150,0.3)');"
+    )
+
+
+def inject_atlas(html, js, names):
+    """Place the atlas block after SM and point the monsters' case blocks at it
+
+    Returns (html, PatchReport).
+    """
+    from html_patcher import patch_html
+
+    start = html.find(ATLAS_BEGIN)
+    if start != -1:
+        end = html.index(ATLAS_END, start) + len(ATLAS_END)
+        html = html[:start] + js + html[end:]
+    else:
+        match = SM_RE.search(html)
+        if not match:
+            raise LookupError(f"SM sprite map not found in {HTML_PATH}")
+        html = html[:match.end()] + js + html[match.end():]
+
+    blocks = {MONSTERS[name]['case']: atlas_animation_code(name) for name in names}
+    return patch_html(html, cases=blocks)
+
+
+def pack(out_dir=ATLAS_DIR, map_path=ATLAS_MAP, max_size=MAX_ATLAS_SIZE, padding=PADDING):
+    """Collect, pack and save; returns (paths, coords, sequences)"""
+    images, sequences = collect_sprites()
+    if not images:
+        raise LookupError(f"No sprites found in {ANIMATED_DIR} or {TILES_DIR}")
+    pages, coords, sequences = build_atlas(images, sequences, max_size, padding)
+    paths = save_pages(pages, out_dir)
+
+    os.makedirs(os.path.dirname(map_path) or '.', exist_ok=True)
+    with open(map_path, 'w', encoding='utf-8') as f:
+        json.dump({'pages': paths, 'frame_ms': FRAME_MS, 'sprites': coords, 'sequences': sequences},
+                  f, indent=1)
+    return paths, coords, sequences
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack monster frames and tiles into a texture atlas')
+    parser.add_argument('--max-size', type=int, default=MAX_ATLAS_SIZE, help='maximum atlas page edge')
+    parser.add_argument('--padding', type=int, default=PADDING, help='pixels between sprites')
+    parser.add_argument('--inject', action='store_true',
+                        help=f'patch the atlas map and monster draw code into {HTML_PATH}')
+    args = parser.parse_args()
+
+    paths, coords, sequences = pack(max_size=args.max_size, padding=args.padding)
+    rects = len({tuple(rect) for rect in coords.values()})
+    print(f"✓ Packed {len(coords)} sprites ({rects} unique) into {len(paths)} page(s)")
+    for path in paths:
+        with Image.open(path) as img:
+            print(f"  → {path} ({img.size[0]}×{img.size[1]})")
+    print(f"  → {ATLAS_MAP}")
+
+    if args.inject:
+        from html_patcher import write_atomic
+
+        with open(HTML_PATH, 'r', encoding='utf-8') as f:
+            html = f.read()
+        new_html, report = inject_atlas(html, atlas_js(paths, coords, sequences), sequences)
+        for line in report.lines():
+            print(line)
+        if new_html != html:
+            write_atomic(HTML_PATH, new_html)
+        print(f"\n✓ {HTML_PATH} now draws {len(sequences)} monsters from the atlas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Array-based background removal for MegaRealms sprites
+Keys out a solid background colour with a soft alpha ramp at the edges
+"""
+import numpy as np
+from PIL import Image
+
+
+def key_out_array(data, key=(255, 255, 255), threshold=240, feather=20):
+    """Make pixels close to the key colour transparent
+
+    Each channel is scored by similarity to the key (255 = exact match).
+    Pixels whose channels all score above `threshold` become fully
+    transparent; pixels within `feather` below that get an alpha ramp
+    from 0 up to 255 based on their mean similarity. feather=0 is a hard
+    threshold with no ramp.
+    """
+    if feather < 0:
+        raise ValueError(f"feather must be >= 0, got {feather}")
+    data = np.array(data, dtype=np.uint8)
+    key = np.asarray(key, dtype=np.int16)
+    similarity = 255 - np.abs(data[..., :3].astype(np.int16) - key)
+
+    keyed = (similarity > threshold).all(axis=-1)
+    edge = (similarity > threshold - feather).all(axis=-1) & ~keyed
+
+    data[keyed] = tuple(key) + (0,)
+    if feather:
+        # Same float arithmetic as the original per-pixel loop: mean, then ramp
+        avg = similarity[edge].sum(axis=-1) / 3
+        ramp = np.trunc((threshold - avg) * (255 / feather))
+        data[edge, 3] = np.clip(ramp, 0, 255).astype(np.uint8)
+    return data
+
+
+def remove_background(img, key=(255, 255, 255), threshold=240, feather=20):
+    """Key out a PIL image"""
+    data = key_out_array(np.array(img.convert('RGBA')), key, threshold, feather)
+    return Image.fromarray(data, 'RGBA')
+
+
+def resize_keyed(img, size, resample=Image.Resampling.LANCZOS):
+    """Resize a keyed image, keeping colour and alpha consistent at the edges
+
+    Pillow already resamples RGBA in premultiplied form for every filter
+    but NEAREST, so keyed pixels leak no key colour into their neighbours.
+    """
+    return img.resize(size, resample)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the MegaRealms sprite pipeline
+Times every stage on synthetic 32x32 sprites, 1024x1024 AI-sized originals
+and a synthetic minified index.html, plus the end-to-end build, and writes
+JSON results that can be compared across runs with a regression threshold
+"""
+import argparse
+import atexit
+import contextlib
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+RESULTS_PATH = 'build/benchmarks/latest.json'
+DEFAULT_THRESHOLD = 0.10
+MIN_TIME = 0.05
+REPEAT = 5
+SEED = 1234
+
+
+# ------------------------------------------------------------- fixtures ---
+
+def synthetic_sprite(size, seed=SEED, mode='RGBA'):
+    """A monster-like blob on a white background
+
+    1024px sprites are RGB like the AI originals; 32px ones RGBA like the
+    extracted sprites. Shading noise gives realistic colour counts.
+    """
+    rng = np.random.default_rng([seed, size])
+    yy, xx = np.mgrid[0:size, 0:size] / size
+    body = (xx - 0.5) ** 2 / 0.12 + (yy - 0.55) ** 2 / 0.08 < 1
+    head = (xx - 0.5) ** 2 + (yy - 0.25) ** 2 < 0.02
+
+    img = np.full((size, size, 4), 255, dtype=np.uint8)
+    base = rng.integers(40, 200, 3)
+    shade = (yy * 60 + rng.normal(0, 12, (size, size)))[..., None]
+    color = np.clip(base + shade, 0, 255).astype(np.uint8)
+    mask = body | head
+    img[mask, :3] = color[mask]
+    return Image.fromarray(img, 'RGBA').convert(mode)
+
+
+def synthetic_html(monsters=14, slots=27, items=110, total_kb=550, seed=SEED, cases=None, legacy=False):
+    """A minified page shaped like index.html
+
+    Animated monster case blocks, single-image slots, item <img> tags and
+    plain script filler, at roughly the real page's size. `cases` is a list
+    of (case label, image variable) to use instead of generated names;
+    legacy=True writes the single-image blocks the page had before
+    animation, which the regex-based integrate matches.
+    """
+    from integrate_animated_v2 import animation_code, png_bytes_to_base64
+
+    def png_uri(i):
+        buf = io.BytesIO()
+        synthetic_sprite(32, seed + i).save(buf, 'PNG')
+        return png_bytes_to_base64(buf.getvalue())
+
+    rng = np.random.default_rng(seed)
+    parts = ["<!DOCTYPE html><html><head><title>bench</title></head><body><script>"]
+    parts.append("function drawMonster(ctx,x,y,type){ctx.save();switch(type){")
+    for m, (label, var) in enumerate(cases or [(f'mon{m}', f'_m{m}I') for m in range(monsters)]):
+        if legacy:
+            parts.append(f"case '{label}':{{if(!window.{var}){{window.{var}=new Image();"
+                         f"window.{var}.src='{png_uri(m * 4)}';}}if(window.{var}.complete)"
+                         f"ctx.drawImage(window.{var},0,0,32,32);else{{px(ctx,8,12,16,10,'#888');}}}}break;")
+        else:
+            parts.append(f"case '{label}':{{{animation_code(var, [png_uri(m * 4 + f) for f in range(4)])}}}break;")
+        parts.append(f"case 'plain{m}':{{px(ctx,8,8,16,16,'#{m:02x}8040');}}break;")
+    parts.append("}ctx.restore();}")
+    for s in range(slots):
+        parts.append(f"window._s{s}I=new Image();window._s{s}I.src='{png_uri(1000 + s)}';")
+    parts.append("const ITEMS={")
+    for i in range(items):
+        parts.append(f"it{i}:{{n:'Item {i}',i:'<img src=\"{png_uri(2000 + i % 40)}\">',v:{i}}},")
+    parts.append("};")
+    words = ['const', 'let', 'if', 'return', 'ctx', 'px', 'TT', 'MONS', 'for', 'while']
+    while sum(map(len, parts)) < total_kb * 1024:
+        parts.append(f"function f{len(parts)}(a,b){{{' '.join(rng.choice(words, 40))};return a+b;}}")
+    parts.append("</script></body></html>")
+    return ''.join(parts)
+
+
+def synthetic_site(root, seed=SEED):
+    """A synthetic page plus originals and AI-sized sources for every catalog monster"""
+    from sprite_catalog import HTML_PATH, IMPROVED_DIR, MONSTERS, ORIGINAL_DIR
+
+    for directory in (ORIGINAL_DIR, IMPROVED_DIR):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    for i, name in enumerate(MONSTERS):
+        synthetic_sprite(32, seed + i).save(os.path.join(root, ORIGINAL_DIR, f'{name}.png'))
+        synthetic_sprite(1024, seed + i, 'RGB').save(os.path.join(root, IMPROVED_DIR, f'{name}.png'))
+    with open(os.path.join(root, HTML_PATH), 'w', encoding='utf-8') as f:
+        f.write(synthetic_html(cases=[(info['case'], info['var']) for info in MONSTERS.values()], seed=seed))
+
+
+# Before the single-pass patcher: one regex over the whole page per monster
+LEGACY_CASE_RE = (r"case\s+'{label}':\s*\{{[^}}]*?if\(!window\.{var}\)\{{[^}}]+?}};?[^}}]*?"
+                  r"if\(window\.{var}\.complete\)[^}}]*?else\{{[^}}]*?}}\s*}}\s*break;")
+
+
+def legacy_integrate(html, blocks):
+    """Apply {(label, var): code} the way integrate_animated_v2 used to"""
+    for (label, var), code in blocks.items():
+        pattern = LEGACY_CASE_RE.format(label=re.escape(label), var=var)
+        html, _ = re.subn(pattern, lambda _: f"case '{label}':{{{code}}}break;", html, count=1, flags=re.DOTALL)
+    return html
+
+
+@contextlib.contextmanager
+def _cwd(path):
+    old = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+# ---------------------------------------------------------------- timer ---
+
+def measure(fn, min_time=MIN_TIME, repeat=REPEAT):
+    """Per-call seconds of fn(), auto-calibrating the loop count like timeit"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 16:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {'min': min(times), 'median': statistics.median(times), 'number': number, 'repeat': repeat}
+
+
+# ------------------------------------------------------------ benchmarks ---
+
+def benchmarks():
+    """{name: zero-argument callable}; fixtures are built once up front"""
+    import build_sprites
+    from fix_transparency_and_animate import create_animation_frame, process_sprite, remove_white_background
+    from extract_sprites import discover_images
+    from html_patcher import HtmlIndex, patch_html
+    from improve_sprites import MAX_COLORS, TIBIA_PALETTE, add_outline, quantize_to_palette
+    from integrate_animated_v2 import animation_code
+    from png_encoder import encode_png
+    from sprite_pipeline import default_steps, new_sprite, run_pipeline
+
+    small = synthetic_sprite(32)
+    large = synthetic_sprite(1024, mode='RGB')
+    keyed = remove_white_background(small)
+    html = synthetic_html()
+    blocks = {f'mon{m}': animation_code(f'_m{m}I', ['data:,'] * 4) for m in range(14)}
+    legacy_html = synthetic_html(cases=[(f'mon{m}', f'_m{m}I') for m in range(14)], legacy=True)
+    legacy_blocks = {(f'mon{m}', f'_m{m}I'): code for m, code in enumerate(blocks.values())}
+    tmp = tempfile.mkdtemp(prefix='mr-bench-')
+    atexit.register(shutil.rmtree, tmp, True)
+    original = os.path.join(tmp, 'original.png')
+    small.save(original)
+    ai_original = os.path.join(tmp, 'ai_original.png')
+    large.save(ai_original)
+
+    def quiet(fn):
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                fn()
+        return run
+
+    site = os.path.join(tmp, 'site')
+    synthetic_site(site)
+
+    def build():
+        # The whole build, serially and uncached, so every stage is timed
+        with _cwd(site):
+            status = build_sprites.main(['--stages', 'improve,animate,integrate', '--jobs', '1', '--force',
+                                         '--report', os.path.join(tmp, 'report.json')])
+        if status:
+            raise RuntimeError('synthetic build failed')
+
+    return {
+        'quantize_32': lambda: quantize_to_palette(small, TIBIA_PALETTE, MAX_COLORS),
+        'quantize_1024': lambda: quantize_to_palette(large, TIBIA_PALETTE, MAX_COLORS),
+        'outline_32': lambda: add_outline(small),
+        'outline_1024': lambda: add_outline(large),
+        'key_out_32': lambda: remove_white_background(small),
+        'key_out_1024': lambda: remove_white_background(large),
+        'animation_frames_32': lambda: [create_animation_frame(keyed, f, 4) for f in range(4)],
+        'encode_png_32': lambda: encode_png(keyed),
+        'html_index': lambda: HtmlIndex(html),
+        'html_patch_14_cases': lambda: patch_html(html, cases=blocks),
+        'html_regex_14_cases': lambda: legacy_integrate(legacy_html, legacy_blocks),
+        'html_discover_images': lambda: discover_images(html),
+        'graph_32': lambda: run_pipeline(new_sprite('bench'), default_steps(original)),
+        'animate_1024': quiet(lambda: process_sprite(ai_original, os.path.join(tmp, 'ai.png'))),
+        'build_end_to_end': quiet(build),
+    }
+
+
+def run(names=None, min_time=MIN_TIME, repeat=REPEAT):
+    results = {}
+    for name, fn in benchmarks().items():
+        if names and not any(n in name for n in names):
+            continue
+        fn()  # warm caches (palette LUTs, imports) before timing
+        results[name] = measure(fn, min_time, repeat)
+        print(f"  {name:24s} {results[name]['min'] * 1e3:10.3f} ms  (median {results[name]['median'] * 1e3:.3f})")
+    return results
+
+
+def metadata():
+    import PIL
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """[(name, baseline s, current s, ratio, regressed)] for benchmarks in both runs
+
+    Uses the minimum time, the figure least disturbed by machine noise.
+    """
+    rows = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['min'], result['min']
+        ratio = new / old if old else float('inf')
+        rows.append((name, old, new, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the MegaRealms sprite pipeline')
+    parser.add_argument('--out', default=RESULTS_PATH, help=f'results JSON (default: {RESULTS_PATH})')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'allowed slowdown before failing, as a fraction (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--filter', default='', help='comma-separated substrings of benchmarks to run')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME, help='seconds per timing sample')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='timing samples per benchmark')
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("MegaRealms Sprite Pipeline Benchmarks")
+    print("=" * 60)
+    results = run([n for n in args.filter.split(',') if n], args.min_time, args.repeat)
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump({'meta': metadata(), 'results': results}, f, indent=1, sort_keys=True)
+    print(f"\n✓ Results: {args.out}")
+
+    if not args.compare:
+        return 0
+    with open(args.compare, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    rows = compare(results, baseline, args.threshold)
+    print(f"\nvs {args.compare} (threshold +{args.threshold:.0%}):")
+    for name, old, new, ratio, regressed in rows:
+        mark = '✗' if regressed else '✓'
+        print(f"  {mark} {name:24s} {old * 1e3:9.3f} → {new * 1e3:9.3f} ms  ({ratio - 1:+.1%})")
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Content-hash build manifest for the MegaRealms sprite pipeline
+A stage is skipped when its inputs, parameters and outputs all match the last run
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_PATH = 'assets/sprites/build_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def hash_bytes(data):
+    """sha256 hex digest of a bytes object"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """sha256 hex digest of a file, or None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hash_bytes(f.read())
+
+
+def hash_params(params):
+    """Stable digest of a JSON-serialisable parameter dict"""
+    return hash_bytes(json.dumps(params, sort_keys=True, default=list).encode('utf-8'))
+
+
+class BuildCache:
+    """Tracks one manifest entry per (stage, key)
+
+    Worker processes get a snapshot of the entries they need and send back
+    `updated`, `hits` and `misses`, which the parent folds in with merge().
+    """
+
+    def __init__(self, path=MANIFEST_PATH, force=False, entries=None):
+        self.path = path
+        self.force = force
+        self.entries = entries if entries is not None else self._load()
+        self.updated = {}
+        self.hits = []
+        self.misses = []
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('entries', {})
+
+    def snapshot(self, stages, key):
+        """Entries for one key across stages, for handing to a worker process"""
+        wanted = {f'{stage}:{key}' for stage in stages}
+        return {k: v for k, v in self.entries.items() if k in wanted}
+
+    def is_fresh(self, stage, key, inputs, params, outputs):
+        """True if the recorded run for (stage, key) can be reused"""
+        name = f'{stage}:{key}'
+        entry = self.entries.get(name)
+        fresh = (
+            not self.force
+            and entry is not None
+            and entry.get('params') == hash_params(params)
+            and entry.get('inputs') == {path: hash_file(path) for path in inputs}
+            and set(entry.get('outputs', {})) == set(outputs)
+            and all(hash_file(path) == digest for path, digest in entry['outputs'].items())
+        )
+        (self.hits if fresh else self.misses).append(name)
+        return fresh
+
+    def record(self, stage, key, inputs, params, outputs):
+        """Store the hashes of a completed run"""
+        entry = {
+            'inputs': {path: hash_file(path) for path in inputs},
+            'params': hash_params(params),
+            'outputs': {path: hash_file(path) for path in outputs},
+        }
+        name = f'{stage}:{key}'
+        self.entries[name] = entry
+        self.updated[name] = entry
+
+    def run(self, stage, key, inputs, params, outputs, fn):
+        """Call fn() unless the cached result is still valid; returns True if it ran"""
+        if self.is_fresh(stage, key, inputs, params, outputs):
+            return False
+        fn()
+        self.record(stage, key, inputs, params, outputs)
+        return True
+
+    def merge(self, updated, hits, misses):
+        """Fold in the results reported by a worker"""
+        self.entries.update(updated)
+        self.updated.update(updated)
+        self.hits.extend(hits)
+        self.misses.extend(misses)
+
+    def save(self):
+        """Write the manifest if anything changed"""
+        if not self.path or not self.updated:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f,
+                      indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        """One-line hit/miss report"""
+        total = len(self.hits) + len(self.misses)
+        note = ' (--force)' if self.force else ''
+        return f"Cache: {len(self.hits)} hit, {len(self.misses)} miss of {total}{note}"
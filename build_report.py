@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the MegaRealms sprite build
+Records wall time, CPU time, tracemalloc peak and bytes in/out for every
+(stage, sprite) run, writes one JSON build report and prints the slowest
+sprites and stages. Optionally profiles each run with cProfile.
+"""
+import cProfile
+import json
+import os
+import platform
+import pstats
+import time
+import tracemalloc
+
+REPORT_PATH = 'build/report.json'
+PROFILE_DIR = 'build/profile'
+PAGE = '*'  # sprite name recorded for page-level stages
+
+
+def _size(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def measure(stage, sprite, fn, inputs=(), outputs=(), profile_dir=None):
+    """Run fn() and return (its result, a record dict)
+
+    Exceptions propagate; the caller decides how failures are recorded.
+    With profile_dir, the run is profiled to <stage>.<sprite>.prof there.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+
+    bytes_in = _size(inputs)
+    profiler = cProfile.Profile() if profile_dir else None
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        if profiler:
+            result = profiler.runcall(fn)
+        else:
+            result = fn()
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        if profiler:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, f'{stage}.{sprite}.prof'))
+
+    record = {
+        'stage': stage,
+        'sprite': sprite,
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'peak_bytes': max(0, peak - base),
+        'bytes_in': bytes_in,
+        'bytes_out': _size(outputs),
+    }
+    return result, record
+
+
+class BuildReport:
+    """Collects records from the parent and from worker processes"""
+
+    def __init__(self):
+        self.records = []
+        self.started = time.perf_counter()
+
+    def add(self, record, **extra):
+        record = dict(record, **extra)
+        self.records.append(record)
+        return record
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    def totals(self, key):
+        """{key value: summed wall/cpu, max peak, summed bytes} over all records"""
+        out = {}
+        for r in self.records:
+            t = out.setdefault(r[key], {'wall_s': 0.0, 'cpu_s': 0.0, 'peak_bytes': 0,
+                                        'bytes_in': 0, 'bytes_out': 0, 'runs': 0})
+            t['wall_s'] += r['wall_s']
+            t['cpu_s'] += r['cpu_s']
+            t['peak_bytes'] = max(t['peak_bytes'], r['peak_bytes'])
+            t['bytes_in'] += r['bytes_in']
+            t['bytes_out'] += r['bytes_out']
+            t['runs'] += 1
+        return out
+
+    def hottest_stage(self):
+        stages = self.totals('stage')
+        return max(stages, key=lambda s: stages[s]['wall_s']) if stages else None
+
+    def save(self, path=REPORT_PATH, **meta):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        report = {
+            'meta': dict(meta, python=platform.python_version(),
+                         timestamp=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                         elapsed_s=time.perf_counter() - self.started),
+            'stages': self.totals('stage'),
+            'sprites': {k: v for k, v in self.totals('sprite').items() if k != PAGE},
+            'records': self.records,
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        os.replace(tmp_path, path)
+        return report
+
+    def summary(self, top=5):
+        """Lines for the slowest sprites and stages"""
+        def rows(title, totals):
+            ranked = sorted(totals.items(), key=lambda kv: -kv[1]['wall_s'])[:top]
+            lines = [f"{title:18s} {'wall':>8s} {'cpu':>8s} {'peak':>9s} {'in':>9s} {'out':>9s}"]
+            for name, t in ranked:
+                lines.append(f"  {name:16s} {t['wall_s']:7.2f}s {t['cpu_s']:7.2f}s "
+                             f"{t['peak_bytes'] / 1e6:7.1f}MB {t['bytes_in'] / 1e3:7.1f}kB "
+                             f"{t['bytes_out'] / 1e3:7.1f}kB")
+            return lines
+
+        sprites = {k: v for k, v in self.totals('sprite').items() if k != PAGE}
+        return rows('Slowest stages', self.totals('stage')) + rows('Slowest sprites', sprites)
+
+
+def merge_profiles(stage, profile_dir=PROFILE_DIR):
+    """Combine every <stage>.*.prof into <stage>.prof; returns (path, Stats) or None"""
+    files = sorted(os.path.join(profile_dir, f) for f in os.listdir(profile_dir)
+                   if f.startswith(f'{stage}.') and f.endswith('.prof') and f != f'{stage}.prof')
+    if not files:
+        return None
+    path = os.path.join(profile_dir, f'{stage}.prof')
+    pstats.Stats(*files).dump_stats(path)
+    return path, pstats.Stats(path)
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+MegaRealms sprite build
+Runs the per-sprite stages for every monster across a process pool, then
+integrates the results into index.html in a single pass. animate keys and
+resizes the full-size AI art in improved/; improve writes its palette
+version of the extracted originals to quantized/ and is not run by default.
+
+The externalize stage then moves every data URI into content-hashed files
+under assets/sprites/hashed/ so the page itself stays small.
+
+With --in-memory, animate runs as one in-memory stage graph
+(sprite_pipeline) and only the final frames are PNG-encoded.
+
+Every stage run is instrumented (build_report): wall/CPU time, peak memory
+and bytes in/out go to build/report.json, and --profile adds cProfile
+output for the hottest stage.
+
+--reduce decodes the large AI originals straight to a small working
+resolution (sprite_loader), and --memory-budget only starts a sprite while
+the estimated peaks of the sprites in flight fit within the budget.
+
+--adaptive-palette quantizes each sprite to its own few colours of one
+palette shared by the whole set (palette_builder). It applies to the
+shipped frames (animate/graph) and to improve's quantized/ output, which
+otherwise uses the fixed Tibia colours.
+"""
+import argparse
+import os
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from build_cache import BuildCache
+from build_report import PAGE, PROFILE_DIR, REPORT_PATH, BuildReport, measure, merge_profiles
+from sprite_catalog import ANIMATED_DIR, HTML_PATH, IMPROVED_DIR, MONSTERS, ORIGINAL_DIR, QUANTIZED_DIR, monster_cases
+
+# Per-sprite stages run in worker processes; page stages run once afterwards
+SPRITE_STAGES = ['extract', 'improve', 'animate', 'graph']
+PAGE_STAGES = ['animations', 'variants', 'integrate', 'atlas', 'fix', 'bundle', 'externalize', 'budget']
+ALL_STAGES = SPRITE_STAGES + PAGE_STAGES
+CHECKPOINT_DIR = 'build/checkpoints'
+DEFAULT_STAGES = ['animate', 'integrate', 'budget']
+
+
+def stage_extract(name, cache, options):
+    """index.html -> original/<name>.png"""
+    from extract_sprites import extract_sprite
+
+    def run():
+        with open(HTML_PATH, 'r', encoding='utf-8') as f:
+            html = f.read()
+        extract_sprite(html, name, MONSTERS[name]['var'])
+
+    output_path = os.path.join(ORIGINAL_DIR, f'{name}.png')
+    cache.run('extract', name, [HTML_PATH], {'var': MONSTERS[name]['var']}, [output_path], run)
+
+
+def stage_improve(name, cache, options):
+    """original/<name>.png -> quantized/<name>.png"""
+    from improve_sprites import improve_params, improve_sprite
+
+    input_path = os.path.join(ORIGINAL_DIR, f'{name}.png')
+    output_path = os.path.join(QUANTIZED_DIR, f'{name}.png')
+    reduce = options.get('reduce', False)
+    palette = options.get('palettes', {}).get(name)
+    cache.run('improve', name, [input_path], improve_params(reduce=reduce, palette=palette), [output_path],
+              lambda: improve_sprite(input_path, output_path, reduce=reduce, palette=palette))
+
+
+def stage_animate(name, cache, options):
+    """improved/<name>.png -> animated/<name>_frameN.png"""
+    from fix_transparency_and_animate import animate_params, frame_paths, process_sprite
+
+    os.makedirs(ANIMATED_DIR, exist_ok=True)
+    input_path = os.path.join(IMPROVED_DIR, f'{name}.png')
+    output_path = os.path.join(ANIMATED_DIR, f'{name}.png')
+    reduce = options.get('reduce', False)
+    palette = options.get('palettes', {}).get(name)
+    cache.run('animate', name, [input_path], animate_params(reduce=reduce, palette=palette), frame_paths(output_path),
+              lambda: process_sprite(input_path, output_path, reduce=reduce, palette=palette))
+
+
+def stage_graph(name, cache, options):
+    """improved/<name>.png -> animated/<name>_frameN.png without intermediate files
+
+    The animate stage in memory. Returns the encoded frames so integration
+    needs no second decode.
+    """
+    from fix_transparency_and_animate import frame_paths
+    from sprite_pipeline import default_steps, new_sprite, run_pipeline
+
+    input_path = os.path.join(IMPROVED_DIR, f'{name}.png')
+    outputs = frame_paths(os.path.join(ANIMATED_DIR, f'{name}.png'))
+    steps = default_steps(input_path, options.get('reduce', False), options.get('palettes', {}).get(name))
+    frames = []
+
+    def run():
+        sprite = run_pipeline(new_sprite(name), steps, options['checkpoints'], CHECKPOINT_DIR)
+        os.makedirs(ANIMATED_DIR, exist_ok=True)
+        for path, data in zip(outputs, sprite['png']):
+            with open(path, 'wb') as f:
+                f.write(data)
+        frames.extend(sprite['png'])
+        print(f"  ✓ {name}: {len(frames)} frames (in memory)")
+
+    if not cache.run('graph', name, [input_path], steps, outputs, run):
+        for path in outputs:
+            with open(path, 'rb') as f:
+                frames.append(f.read())
+    return frames
+
+
+def adaptive_palettes():
+    """{name: subset colours} of the shared palette over every monster's art
+
+    Built from all monsters, not just --only, so a partial build quantizes
+    to the same palette as a full one.
+    """
+    from improve_sprites import TIBIA_PALETTE
+    from palette_builder import PALETTE_PATH, build_palette, monster_sources, subset_colors
+
+    result, cached = build_palette(monster_sources(), list(TIBIA_PALETTE.values()))
+    print(f"✓ Shared palette: {len(result['shared'])} colours "
+          f"({'cached' if cached else 'rebuilt'}, {PALETTE_PATH})\n")
+    return {name: subset_colors(result, name) for name in result['subsets']}
+
+
+def stage_files(stage, name):
+    """(inputs, outputs) of a per-sprite stage, for the bytes in/out figures"""
+    from fix_transparency_and_animate import frame_paths
+
+    original = os.path.join(ORIGINAL_DIR, f'{name}.png')
+    improved = os.path.join(IMPROVED_DIR, f'{name}.png')
+    quantized = os.path.join(QUANTIZED_DIR, f'{name}.png')
+    frames = frame_paths(os.path.join(ANIMATED_DIR, f'{name}.png'))
+    return {
+        'extract': ([HTML_PATH], [original]),
+        'improve': ([original], [quantized]),
+        'animate': ([improved], frames),
+        'graph': ([improved], frames),
+    }[stage]
+
+
+def sprite_cost(name, stages, options):
+    """Estimated peak bytes of building one sprite, for the memory budget"""
+    from sprite_loader import estimate_peak
+
+    inputs = {path for stage in stages for path in stage_files(stage, name)[0] if path != HTML_PATH}
+    return estimate_peak(sorted(inputs), (32, 32), options.get('reduce', False))
+
+
+def budgeted_map(pool, fn, args, costs, budget):
+    """pool.map(fn, *args) that keeps the summed cost of running tasks within budget
+
+    A task is always admitted when nothing else is running, so a single
+    sprite above the budget still builds. Results come back in input order.
+    """
+    pending = list(range(len(costs)))
+    running = {}  # future -> index
+    in_flight = 0
+    results = [None] * len(costs)
+    while pending or running:
+        while pending and (not running or in_flight + costs[pending[0]] <= budget):
+            i = pending.pop(0)
+            running[pool.submit(fn, *(a[i] for a in args))] = i
+            in_flight += costs[i]
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            i = running.pop(future)
+            in_flight -= costs[i]
+            results[i] = future.result()
+    return results
+
+
+SPRITE_STAGE_FUNCS = {
+    'extract': stage_extract,
+    'improve': stage_improve,
+    'animate': stage_animate,
+    'graph': stage_graph,
+}
+
+
+def build_sprite(name, stages, entries, options):
+    """Run the per-sprite stages for one monster
+
+    Returns (name, failed_stage, traceback, payload, cache_report, records);
+    failed_stage is None on success, payload is whatever the last stage
+    returned and records are the build_report measurements. Exceptions
+    never escape, so one broken sprite cannot take down the pool.
+    """
+    cache = BuildCache(path=None, force=options['force'], entries=entries)
+    failed = None, None
+    payload = None
+    records = []
+    for stage in stages:
+        inputs, outputs = stage_files(stage, name)
+        hits = len(cache.hits)
+        try:
+            payload, record = measure(stage, name, lambda: SPRITE_STAGE_FUNCS[stage](name, cache, options),
+                                      inputs, outputs, options.get('profile_dir'))
+        except Exception:
+            failed = stage, traceback.format_exc()
+            break
+        record['cached'] = len(cache.hits) > hits
+        records.append(record)
+    return (name,) + failed + (payload, (cache.updated, cache.hits, cache.misses), records)
+
+
+def run_sprite_stages(names, stages, jobs, cache, options, report=None):
+    """Run per-sprite stages for all monsters, in parallel when jobs > 1
+
+    Returns ([(name, failed_stage, traceback)], {name: payload}); stage
+    measurements are added to `report` if given. With options['memory_budget']
+    (bytes), sprites are only started while their estimated peaks fit in it.
+    """
+    if not stages:
+        return [(name, None, None) for name in names], {}
+
+    snapshots = [cache.snapshot(stages, name) for name in names]
+    args = (names, [stages] * len(names), snapshots, [options] * len(names))
+    budget = options.get('memory_budget')
+    if jobs <= 1:
+        reports = list(map(build_sprite, *args))
+    elif budget:
+        costs = [sprite_cost(name, stages, options) for name in names]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            reports = budgeted_map(pool, build_sprite, args, costs, budget)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            reports = list(pool.map(build_sprite, *args))
+
+    results = []
+    payloads = {}
+    for name, stage, detail, payload, cache_report, records in reports:
+        cache.merge(*cache_report)
+        if report is not None:
+            report.extend(records)
+        results.append((name, stage, detail))
+        if payload is not None:
+            payloads[name] = payload
+    return results, payloads
+
+
+def stage_integrate(names, payloads):
+    """Patch the animated frames of the built monsters into index.html
+
+    Frames already encoded in memory are used directly; otherwise they are
+    read from animated/. All blocks are spliced in with one pass.
+    """
+    from html_patcher import patch_html, write_atomic
+    from integrate_animated_v2 import create_animation_code_inline, packed_animation_code
+
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    failures = []
+    blocks = {}
+    for name in names:
+        info = MONSTERS[name]
+        if name in payloads:
+            code = packed_animation_code(info['var'], payloads[name])
+        else:
+            code = create_animation_code_inline(name, info['var'])
+        if code:
+            blocks[info['case']] = code
+        else:
+            failures.append((name, 'integrate', 'animation frames missing'))
+
+    new_html, report = patch_html(html, cases=blocks)
+    for line in report.lines():
+        print(f" {line}")
+    cases = monster_cases()
+    for _, label in report.unmatched:
+        failures.append((cases[label][0], 'integrate', f"case '{label}' not found"))
+    for _, label, count in report.duplicate:
+        failures.append((cases[label][0], 'integrate', f"case '{label}' found {count} times"))
+
+    if new_html != html:
+        write_atomic(HTML_PATH, new_html)
+    return failures
+
+
+def stage_atlas(names, payloads):
+    """Pack all frames and tiles into one atlas and draw the built monsters from it"""
+    from atlas_packer import atlas_js, inject_atlas, pack
+    from html_patcher import write_atomic
+
+    paths, coords, sequences = pack()
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+    new_html, report = inject_atlas(html, atlas_js(paths, coords, sequences),
+                                    [name for name in names if name in sequences])
+
+    failures = [(name, 'atlas', 'animation frames missing') for name in names if name not in sequences]
+    cases = monster_cases()
+    for _, label in report.unmatched:
+        failures.append((cases[label][0], 'atlas', f"case '{label}' not found"))
+    for _, label, count in report.duplicate:
+        failures.append((cases[label][0], 'atlas', f"case '{label}' found {count} times"))
+
+    if new_html != html:
+        write_atomic(HTML_PATH, new_html)
+    print(f"  ✓ atlas: {len(coords)} sprites on {len(paths)} page(s)")
+    return failures
+
+
+def stage_fix(names, payloads):
+    """Add the sprite preloading screen to index.html"""
+    from apply_sprite_fix import apply_fix
+
+    apply_fix()
+    return []
+
+
+def stage_animations(names, payloads):
+    """Render every animation of the built sprites as strips, plus their timings"""
+    from animation_engine import DIRECTIONS, TIMING_PATH, build
+
+    manifest = build(names)
+    print(f"  ✓ animations: {', '.join(manifest['animations'])} × {len(DIRECTIONS)} directions → {TIMING_PATH}")
+    return []
+
+
+def stage_variants(names, payloads):
+    """1x/2x/3x variants of the built sprites and every tile, plus the DPR manifest"""
+    from resolution_variants import RESOLUTION_MANIFEST, build
+
+    manifest = build(names)
+    print(f"  ✓ variants: {', '.join(f'{s}x' for s in manifest['scales'])} of "
+          f"{len(manifest['monsters'])} monsters, {len(manifest['tiles'])} tiles → {RESOLUTION_MANIFEST}")
+    return []
+
+
+def stage_bundle(names, payloads):
+    """Move monster sprites out of index.html into per-floor bundles fetched on demand"""
+    from html_patcher import write_atomic
+    from sprite_bundles import CORE, build
+
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+    new_html, manifest, problems = build(html)
+    if new_html != html:
+        write_atomic(HTML_PATH, new_html)
+    floors = sum(1 for entry in manifest['floors'].values() if entry['bundle'])
+    print(f"  ✓ bundles: core ({len(manifest[CORE]['sprites'])} sprites) + {floors} floors")
+    for problem in problems:
+        print(f"  • {problem}")
+    return []
+
+
+def stage_externalize(names, payloads):
+    """Move every embedded sprite in index.html into a content-hashed file"""
+    from externalize_sprites import externalize_file
+
+    manifest = externalize_file(HTML_PATH)
+    print(f"  ✓ externalized {manifest['images']} images, "
+          f"{manifest['bytes_saved'] / 1024:.1f} KB off {HTML_PATH}")
+    return []
+
+
+def stage_budget(names, payloads):
+    """Fail the build when index.html is over its page weight budget"""
+    from page_budget import analyze, check_budgets, load_budgets, unmeasured_budgets
+
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        result = analyze(f.read())
+    total = result['parts']['total']
+    print(f"  ✓ page weight: {total['raw'] / 1000:.1f} kB raw, {total['gzip'] / 1000:.1f} kB gzip")
+    budgets = load_budgets()
+    return ([(HTML_PATH, 'budget', f"{key}: {actual / 1000:.1f} kB exceeds the {limit / 1000:.1f} kB budget")
+             for key, limit, actual in check_budgets(result, budgets)]
+            + [(HTML_PATH, 'budget', f"{key}: budget set but not measurable (pip install brotli)")
+               for key in unmeasured_budgets(result, budgets)])
+
+
+PAGE_STAGE_FUNCS = {
+    'animations': stage_animations,
+    'variants': stage_variants,
+    'integrate': stage_integrate,
+    'atlas': stage_atlas,
+    'fix': stage_fix,
+    'bundle': stage_bundle,
+    'externalize': stage_externalize,
+    'budget': stage_budget,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Build all MegaRealms monster sprites')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='worker processes for per-sprite stages (default: CPU count)')
+    parser.add_argument('--stages', default=','.join(DEFAULT_STAGES),
+                        help=f"comma-separated stages from {','.join(ALL_STAGES)} "
+                             f"(default: {','.join(DEFAULT_STAGES)})")
+    parser.add_argument('--only', default='',
+                        help='comma-separated sprite names to build (default: all)')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild everything, ignoring the build manifest')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='run animate as one in-memory stage graph')
+    parser.add_argument('--reduce', action='store_true',
+                        help='decode large originals at a reduced working resolution')
+    parser.add_argument('--memory-budget', type=float, default=0, metavar='MB',
+                        help='cap on the estimated memory of sprites building at once (default: no cap)')
+    parser.add_argument('--adaptive-palette', action='store_true',
+                        help='quantize to per-sprite subsets of a shared palette built from all sprites')
+    parser.add_argument('--report', default=REPORT_PATH,
+                        help=f'JSON build report path (default: {REPORT_PATH})')
+    parser.add_argument('--profile', action='store_true',
+                        help=f'cProfile every stage run and dump the hottest stage to {PROFILE_DIR}')
+    parser.add_argument('--checkpoint', default='',
+                        help=f'comma-separated graph stages to dump under {CHECKPOINT_DIR} '
+                             '(with --in-memory)')
+    args = parser.parse_args(argv)
+
+    args.stages = [s for s in args.stages.split(',') if s]
+    unknown = [s for s in args.stages if s not in ALL_STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    if args.in_memory:
+        args.stages = [s for s in args.stages if s != 'animate']
+        args.stages.append('graph')
+    args.checkpoint = [c for c in args.checkpoint.split(',') if c]
+
+    args.only = [n for n in args.only.split(',') if n]
+    unknown = [n for n in args.only if n not in MONSTERS]
+    if unknown:
+        parser.error(f"unknown sprite(s): {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.only or list(MONSTERS)
+    sprite_stages = [s for s in SPRITE_STAGES if s in args.stages]
+    page_stages = [s for s in PAGE_STAGES if s in args.stages]
+
+    print("=" * 60)
+    print("MegaRealms Sprite Build")
+    print("=" * 60)
+    print(f"Sprites: {len(names)}  Stages: {', '.join(args.stages)}  Jobs: {args.jobs}\n")
+
+    cache = BuildCache(force=args.force)
+    report = BuildReport()
+    profile_dir = PROFILE_DIR if args.profile else None
+    if profile_dir and os.path.isdir(profile_dir):
+        for stale in os.listdir(profile_dir):
+            os.remove(os.path.join(profile_dir, stale))
+    options = {'force': args.force, 'checkpoints': args.checkpoint, 'profile_dir': profile_dir,
+               'reduce': args.reduce, 'memory_budget': int(args.memory_budget * 1e6)}
+    if args.adaptive_palette and {'improve', 'animate', 'graph'} & set(sprite_stages):
+        options['palettes'] = adaptive_palettes()
+    results, payloads = run_sprite_stages(names, sprite_stages, args.jobs, cache, options, report)
+    cache.save()
+    failures = [r for r in results if r[1] is not None]
+    built = [name for name, stage, _ in results if stage is None]
+
+    # A failing page stage is recorded like a failing sprite; the rest still run
+    for stage in page_stages:
+        if built:
+            try:
+                stage_failures, record = measure(stage, PAGE, lambda: PAGE_STAGE_FUNCS[stage](built, payloads),
+                                                 [HTML_PATH], [HTML_PATH], profile_dir)
+            except Exception:
+                failures.append((HTML_PATH, stage, traceback.format_exc()))
+                continue
+            report.add(record)
+            failures.extend(stage_failures)
+
+    report.save(args.report, stages=args.stages, jobs=args.jobs, sprites=names,
+                reduce=args.reduce, memory_budget_mb=args.memory_budget,
+                failures=[[name, stage] for name, stage, _ in failures])
+
+    print("\n" + "=" * 60)
+    print(f"✓ Built: {len(names) - len({f[0] for f in failures if f[0] in names})}/{len(names)}")
+    print(cache.summary())
+    for line in report.summary():
+        print(line)
+    print(f"Report: {args.report}")
+    if profile_dir:
+        hottest = report.hottest_stage()
+        merged = hottest and merge_profiles(hottest, profile_dir)
+        if merged:
+            print(f"Profile of hottest stage '{hottest}': {merged[0]}")
+            merged[1].sort_stats('cumulative').print_stats(15)
+    for name, stage, detail in failures:
+        print(f"✗ {name} ({stage}):")
+        print("    " + detail.strip().replace("\n", "\n    "))
+    print("=" * 60)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo combat and loot simulator for MegaRealms balancing
+Loads MONS, ITEMS, VOCS and the skill/price tables straight from
+game-data.js, ports xpNeeded, calcDamage, calcMonsterDamage, getSkillMult,
+skillXpNeeded and getDjinnPrice to NumPy, and simulates fights in
+vectorized batches. Reports kill time, damage taken, XP/hour and gold/hour
+distributions per vocation, level and monster. --parity checks the ports
+against the JS functions under node.
+"""
+import argparse
+import json
+import math
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+from sprite_catalog import HTML_PATH
+
+GAME_DATA_PATH = 'game-data.js'
+TABLES = ['MONS', 'ITEMS', 'VOCS', 'VOC_SKILL_MULT', 'DJINN_LOOT_PRICES']
+# Player attack cooldown from index.html (ACOOL); used when the page is unavailable
+DEFAULT_ACOOL = 1800
+# What Player() starts with in index.html
+START_SKILLS = {'melee': 10, 'distance': 10, 'magic': 0, 'shielding': 10}
+START_GEAR = {'weapon': 'club', 'armor': ['leather', 'leather_legs', 'sandals']}
+DEFAULT_LEVELS = [1, 10, 20, 40]
+DEFAULT_FIGHTS = 100_000
+BETWEEN_FIGHTS = 3.0       # seconds spent reaching the next monster
+MAX_DEATH_RATE = 0.5       # above this, hourly rates are not reported
+CHUNK_ELEMENTS = 4_000_000  # random draws per batch
+HOUR_MS = 3_600_000
+SEED = 0
+
+TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<str>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<num>-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<punct>[{}\[\]:,])
+)""", re.S | re.X)
+ACOOL_RE = re.compile(r"\bACOOL=(\d+)")
+
+
+# ------------------------------------------------------------- game data ---
+
+def js_literal(text):
+    """Parse a JS object/array literal of plain data (as in game-data.js)"""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"unexpected JS at {pos}: {text[pos:pos + 30]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        token = match.group(kind)
+        if kind == 'comment':
+            continue
+        if kind == 'str':
+            token = json.dumps(token[1:-1].replace("\\'", "'").replace('\\"', '"'))
+        elif kind == 'num':
+            token = token if re.fullmatch(r"-?\d+", token) else repr(float(token))
+        elif kind == 'name' and token not in ('true', 'false', 'null'):
+            token = json.dumps(token)
+        tokens.append(token)
+    # Trailing commas are legal JS but not JSON
+    tokens = [t for i, t in enumerate(tokens) if not (t == ',' and i + 1 < len(tokens) and tokens[i + 1] in '}]')]
+    return json.loads(''.join(tokens))
+
+
+def js_object(source, name):
+    """Value of `const <name> = {...}` in a script"""
+    from html_patcher import match_brace
+
+    match = re.search(rf"\bconst {name}\s*=\s*(?=[{{\[])", source)
+    if not match:
+        raise LookupError(f"{name} not found in {GAME_DATA_PATH}")
+    return js_literal(source[match.end():match_brace(source, match.end()) + 1])
+
+
+def load_game_data(path=GAME_DATA_PATH, html_path=HTML_PATH):
+    """{table name: data} for TABLES, plus 'ACOOL' from the page"""
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    data = {name: js_object(source, name) for name in TABLES}
+    data['ACOOL'] = DEFAULT_ACOOL
+    try:
+        with open(html_path, 'r', encoding='utf-8') as f:
+            match = ACOOL_RE.search(f.read())
+        if match:
+            data['ACOOL'] = int(match.group(1))
+    except FileNotFoundError:
+        pass
+    return data
+
+
+# -------------------------------------------------------------- formulas ---
+# NumPy ports of game-data.js; `u` stands in for Math.random() draws
+
+def xp_needed(level):
+    return np.floor(50 * np.power(np.asarray(level, dtype=np.float64), 2.2))
+
+
+def calc_damage(player_atk, player_matk, monster_def, is_spell, u):
+    """calcDamage(): melee with ±10% spread, or the 0.7x spell formula"""
+    atk = np.asarray(player_atk, dtype=np.float64)
+    matk = np.asarray(player_matk, dtype=np.float64)
+    mdef = np.asarray(monster_def, dtype=np.float64)
+    spell = np.floor(np.where(matk != 0, matk, atk) * 0.7)
+    spell = np.maximum(1, np.floor(spell - mdef / 3))
+    melee = np.floor(atk - mdef / 2)
+    melee = np.maximum(1, melee + np.floor(u * melee * 0.2 - melee * 0.1))
+    return np.where(is_spell, spell, melee)
+
+
+def calc_monster_damage(monster_atk, player_def, u):
+    """calcMonsterDamage(): attack minus half defence, -1/0/+1 spread"""
+    dmg = np.floor(np.asarray(monster_atk, dtype=np.float64) - np.asarray(player_def, dtype=np.float64) / 2)
+    return np.maximum(1, dmg + np.floor(u * 3 - 1))
+
+
+def get_skill_mult(data, voc, skill):
+    return data['VOC_SKILL_MULT'].get(voc, {}).get(skill) or 1.5
+
+
+def skill_xp_needed(data, level, voc, skill):
+    return math.floor(level * 8 * get_skill_mult(data, voc, skill))
+
+
+def djinn_price(data, item_id):
+    """getDjinnPrice(): what the Blue Djinn pays for one item"""
+    if data['DJINN_LOOT_PRICES'].get(item_id):
+        return data['DJINN_LOOT_PRICES'][item_id]
+    item = data['ITEMS'].get(item_id)
+    if not item:
+        return 0
+    if item['t'] in ('weapon', 'armor', 'boots', 'amulet', 'ring'):
+        return math.floor(item['p'] * 0.3)
+    if item['t'] in ('potion', 'food'):
+        return math.floor(item['p'] * 0.2)
+    return 0
+
+
+# ---------------------------------------------------------------- player ---
+
+def player_stats(data, voc, level, weapon=START_GEAR['weapon'], armor=START_GEAR['armor'], skills=None):
+    """Attack, defence and max HP as the Player getters in index.html compute them
+
+    Level-up gains are added one level at a time like lvUp(), so fractional
+    per-level gains round the same way. Weapons with matk attack with matk,
+    as atkTgt() does.
+    """
+    vc = data['VOCS'][voc]
+    items = data['ITEMS']
+    skills = dict(START_SKILLS, **(skills or {}))
+    batk, bdef, mhp = vc['atk'], vc['def'], vc['hp']
+    for _ in range(level - 1):
+        batk += vc['aL']
+        bdef += vc['dL']
+        mhp += vc['hpL']
+
+    atk = batk
+    matk = skills['magic'] // 3
+    weapon_item = items[weapon] if weapon else {}
+    if weapon:
+        atk += weapon_item.get('atk', 0)
+        skill = weapon_item.get('sk')
+        if skill and skills.get(skill):
+            atk += skills[skill] // 5
+        matk += weapon_item.get('matk', 0)
+    defense = bdef + sum(items[a].get('def', 0) for a in armor) + skills['shielding'] // 5
+    return {'atk': atk, 'matk': matk, 'def': defense, 'hp': mhp,
+            'attack': matk if weapon_item.get('matk') else atk}
+
+
+# ------------------------------------------------------------ simulation ---
+
+def _min_hit(attack, monster_def):
+    base = math.floor(attack - monster_def / 2)
+    return max(1, base + math.floor(-base * 0.1))
+
+
+def simulate(data, stats, monster, fights=DEFAULT_FIGHTS, rng=None, between=BETWEEN_FIGHTS):
+    """Per-fight arrays for `fights` fights of one player against one monster
+
+    Both sides strike on contact, then the player every ACOOL ms and the
+    monster every spd ms, until the monster dies. Each fight starts at full
+    HP; 'died' marks fights whose damage taken reached it.
+    """
+    rng = rng or np.random.default_rng(SEED)
+    mon = data['MONS'][monster]
+    acool = data['ACOOL']
+    max_hits = math.ceil(mon['hp'] / _min_hit(stats['attack'], mon['def']))
+    rows = max(1, CHUNK_ELEMENTS // max_hits)
+    loot = [(entry, djinn_price(data, entry['id'])) for entry in mon.get('loot', [])]
+
+    out = {key: [] for key in ('kill_ms', 'taken', 'gold', 'loot_value')}
+    for start in range(0, fights, rows):
+        n = min(rows, fights - start)
+        dealt = calc_damage(stats['attack'], 0, mon['def'], False, rng.random((n, max_hits)))
+        hits = np.argmax(np.cumsum(dealt, axis=1) >= mon['hp'], axis=1) + 1
+        kill_ms = (hits - 1) * acool
+
+        # Monster swings at 0, spd, 2*spd, ... before the killing blow
+        swings = np.ceil(kill_ms / mon['spd']).astype(np.int64)
+        most = int(swings.max()) if n else 0
+        taken = np.zeros(n)
+        if most:
+            dmg = calc_monster_damage(mon['atk'], stats['def'], rng.random((n, most)))
+            taken = (dmg * (np.arange(most) < swings[:, None])).sum(axis=1)
+
+        gold = np.zeros(n)
+        value = np.zeros(n)
+        for entry, price in loot:
+            dropped = rng.random(n) < entry['ch']
+            qty = (entry['mn'] + np.floor(rng.random(n) * (entry['mx'] - entry['mn'] + 1))) * dropped
+            if entry['id'] == 'gold_coin':
+                gold += qty
+            else:
+                value += qty * price
+        for key, arr in (('kill_ms', kill_ms), ('taken', taken), ('gold', gold), ('loot_value', value)):
+            out[key].append(arr)
+
+    result = {key: np.concatenate(parts) for key, parts in out.items()}
+    result['died'] = result['taken'] >= stats['hp']
+    result['cycle_ms'] = result['kill_ms'] + acool + between * 1000
+    result['xp'] = np.full(fights, mon['xp'], dtype=np.float64)
+    return result
+
+
+def per_hour(result, keys=('xp', 'gold', 'loot_value')):
+    """{key: totals per complete hour} of back-to-back fights
+
+    Lost fights still take their time but earn nothing.
+    """
+    hour = (np.cumsum(result['cycle_ms']) // HOUR_MS).astype(np.int64)
+    complete = hour < hour[-1] if len(hour) else hour.astype(bool)
+    hours = int(hour[-1]) if len(hour) else 0
+    won = ~result['died'][complete]
+    return {key: np.bincount(hour[complete], result[key][complete] * won, minlength=hours)[:hours]
+            for key in keys}
+
+
+def summarize(result):
+    """Percentiles and means of one simulate() result
+
+    Hourly rates are None when more than MAX_DEATH_RATE of the fights are
+    lost, since nobody hunts that way.
+    """
+    hourly = per_hour(result)
+    death_rate = float(result['died'].mean())
+    if death_rate > MAX_DEATH_RATE:
+        hourly = {key: hourly[key][:0] for key in hourly}
+    pct = lambda arr, q: float(np.percentile(arr, q)) if len(arr) else None  # noqa: E731
+    return {
+        'fights': len(result['kill_ms']),
+        'kill_s': {q: pct(result['kill_ms'], q) / 1000 for q in (10, 50, 90)},
+        'taken': {'mean': float(result['taken'].mean()), 'p90': pct(result['taken'], 90),
+                  'max': float(result['taken'].max())},
+        'death_rate': death_rate,
+        'hours': len(hourly['xp']),
+        'xp_per_hour': {q: pct(hourly['xp'], q) for q in (10, 50, 90)},
+        'gold_per_hour': {q: pct(hourly['gold'], q) for q in (10, 50, 90)},
+        'loot_per_hour': {q: pct(hourly['loot_value'], q) for q in (10, 50, 90)},
+    }
+
+
+# ---------------------------------------------------------------- parity ---
+
+def parity_cases(data, rng):
+    """Inputs spanning the formulas' branches, including u at both ends"""
+    u = np.concatenate([[0.0, 0.5, 0.999999], rng.random(61)])
+    atks = [1, 2.5, 7, 14, 15.8, 33.6, 120]
+    defs = sorted({m['def'] for m in data['MONS'].values()})
+    return {
+        'xp': list(range(1, 301)),
+        'damage': [[a, m, d, s, float(x)] for a in atks for m in (0, 10, 40) for d in defs[::4]
+                   for s in (False, True) for x in u[::8]],
+        'monster': [[m['atk'], d, float(x)] for m in list(data['MONS'].values())[::3]
+                    for d in (0, 7, 25, 60) for x in u[::4]],
+        'mult': [[v, s] for v in list(data['VOCS']) + ['druid'] for s in list(START_SKILLS) + ['fishing']],
+        'skill_xp': [[lv, v, s] for lv in (1, 10, 55) for v in data['VOCS'] for s in START_SKILLS],
+        'price': list(data['ITEMS']) + ['no_such_item'],
+    }
+
+
+def js_outputs(cases, path=GAME_DATA_PATH):
+    """The same cases evaluated by game-data.js under node"""
+    with open(path, 'r', encoding='utf-8') as f:
+        source = re.sub(r"^export\b.*$", '', f.read(), flags=re.M)
+    script = (
+        f"{source}\nconst C={json.dumps(cases)};\n"
+        "const pin=u=>{Math.random=()=>u;};\n"
+        "process.stdout.write(JSON.stringify({\n"
+        "  xp:C.xp.map(l=>xpNeeded(l)),\n"
+        "  damage:C.damage.map(([a,m,d,s,u])=>{pin(u);return calcDamage(a,m,d,s);}),\n"
+        "  monster:C.monster.map(([a,d,u])=>{pin(u);return calcMonsterDamage(a,d);}),\n"
+        "  mult:C.mult.map(([v,s])=>getSkillMult(v,s)),\n"
+        "  skill_xp:C.skill_xp.map(([l,v,s])=>skillXpNeeded(l,v,s)),\n"
+        "  price:C.price.map(id=>getDjinnPrice(id)),\n"
+        "}));\n"
+    )
+    # Piped through stdin: the inlined game data is too long for an argument
+    result = subprocess.run(['node', '-'], input=script, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def py_outputs(data, cases):
+    damage = np.array([c[:4] + [c[4]] for c in cases['damage']], dtype=np.float64)
+    monster = np.array(cases['monster'], dtype=np.float64)
+    return {
+        'xp': xp_needed(cases['xp']).tolist(),
+        'damage': calc_damage(damage[:, 0], damage[:, 1], damage[:, 2], damage[:, 3].astype(bool),
+                              damage[:, 4]).tolist(),
+        'monster': calc_monster_damage(monster[:, 0], monster[:, 1], monster[:, 2]).tolist(),
+        'mult': [get_skill_mult(data, v, s) for v, s in cases['mult']],
+        'skill_xp': [skill_xp_needed(data, lv, v, s) for lv, v, s in cases['skill_xp']],
+        'price': [djinn_price(data, item) for item in cases['price']],
+    }
+
+
+def parity(data, seed=SEED):
+    """[(formula, cases, [(case, python, js)] mismatches)]"""
+    cases = parity_cases(data, np.random.default_rng(seed))
+    ours, theirs = py_outputs(data, cases), js_outputs(cases)
+    return [(name, len(cases[name]), [(c, a, b) for c, a, b in zip(cases[name], ours[name], theirs[name]) if a != b])
+            for name in cases]
+
+
+# ------------------------------------------------------------------- cli ---
+
+def _csv(text):
+    return [s for s in text.split(',') if s]
+
+
+def _positive(text):
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected at least 1, got {value}")
+    return value
+
+
+def parse_skills(text):
+    """'melee=40,shielding=30' -> {'melee': 40, 'shielding': 30}"""
+    skills = {}
+    for item in _csv(text):
+        name, _, value = item.partition('=')
+        if name not in START_SKILLS or not value.isdigit():
+            raise argparse.ArgumentTypeError(f"expected <{'|'.join(START_SKILLS)}>=<level>, got {item!r}")
+        skills[name] = int(value)
+    return skills
+
+
+def report_lines(voc, level, stats, rows):
+    lines = [f"{voc} lv{level}  atk {stats['attack']:.1f}  def {stats['def']:.1f}  hp {stats['hp']:.0f}",
+             f"  {'monster':20s} {'kill s p50/p90':>15s} {'taken avg/p90':>14s} {'death':>6s} "
+             f"{'xp/h':>8s} {'gold/h':>8s} {'loot/h':>8s}"]
+    for monster, s in rows:
+        lines.append(
+            f"  {monster:20s} {s['kill_s'][50]:7.1f}/{s['kill_s'][90]:<7.1f} "
+            f"{s['taken']['mean']:6.0f}/{s['taken']['p90']:<7.0f} {s['death_rate'] * 100:5.1f}% "
+            + ' '.join(f"{s[k][50]:8.0f}" if s[k][50] is not None else f"{'-':>8s}"
+                       for k in ('xp_per_hour', 'gold_per_hour', 'loot_per_hour')))
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate MegaRealms fights and loot from game-data.js')
+    parser.add_argument('--voc', type=_csv, default=None, help='comma-separated vocations (default: all)')
+    parser.add_argument('--level', type=lambda t: [int(v) for v in _csv(t)], default=DEFAULT_LEVELS,
+                        help=f"comma-separated levels (default: {','.join(map(str, DEFAULT_LEVELS))})")
+    parser.add_argument('--monster', type=_csv, default=None, help='comma-separated MONS ids (default: all)')
+    parser.add_argument('--fights', type=_positive, default=DEFAULT_FIGHTS,
+                        help=f'fights per vocation/level/monster (default: {DEFAULT_FIGHTS})')
+    parser.add_argument('--weapon', default=START_GEAR['weapon'], help='ITEMS id of the weapon')
+    parser.add_argument('--armor', type=_csv, default=START_GEAR['armor'], help='comma-separated ITEMS ids worn')
+    parser.add_argument('--skills', type=parse_skills, default={}, metavar='SKILL=N,...',
+                        help='skill levels (default: a new character)')
+    parser.add_argument('--between', type=float, default=BETWEEN_FIGHTS,
+                        help=f'seconds to reach the next monster (default: {BETWEEN_FIGHTS})')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--json', metavar='PATH', help='also write the summaries as JSON')
+    parser.add_argument('--parity', action='store_true', help='check the formula ports against game-data.js in node')
+    args = parser.parse_args(argv)
+
+    data = load_game_data()
+    if args.parity:
+        failed = 0
+        for name, count, mismatches in parity(data, args.seed):
+            print(f"{'✓' if not mismatches else '✗'} {name:9s} {count - len(mismatches)}/{count} match")
+            for case, ours, theirs in mismatches[:5]:
+                print(f"    {case}: python {ours} != js {theirs}")
+            failed += bool(mismatches)
+        return 1 if failed else 0
+
+    unknown = [m for m in args.monster or [] if m not in data['MONS']]
+    unknown += [v for v in args.voc or [] if v not in data['VOCS']]
+    unknown += [i for i in [args.weapon] + args.armor if i and i not in data['ITEMS']]
+    if unknown:
+        parser.error(f"unknown id(s): {', '.join(unknown)}")
+
+    rng = np.random.default_rng(args.seed)
+    summaries = []
+    for voc in args.voc or list(data['VOCS']):
+        for level in args.level:
+            stats = player_stats(data, voc, level, args.weapon, args.armor, args.skills)
+            rows = [(monster, summarize(simulate(data, stats, monster, args.fights, rng, args.between)))
+                    for monster in args.monster or list(data['MONS'])]
+            for line in report_lines(voc, level, stats, rows):
+                print(line)
+            summaries += [dict(voc=voc, level=level, monster=m, stats=stats, **s) for m, s in rows]
+    print(f"• {args.fights} fights each, player attack every {data['ACOOL']} ms, {args.between:g} s between fights")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(summaries, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
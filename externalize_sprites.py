@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Move embedded sprites out of index.html into content-hashed files
+Every data URI is written once to assets/sprites/hashed/<sha256[:16]>.<ext>
+and replaced in the page by that URL, so a changed sprite only invalidates
+its own file and _headers can mark them immutable
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from extract_sprites import decode_payload, discover_images
+from html_patcher import write_atomic
+from sprite_catalog import HTML_PATH, site_path
+
+HASHED_DIR = 'assets/sprites/hashed'
+HASHED_MANIFEST = os.path.join(HASHED_DIR, 'manifest.json')
+
+
+def externalize(html, out_dir=HASHED_DIR, jobs=None):
+    """Write every embedded image to out_dir and point the page at it
+
+    Returns (new_html, manifest). The manifest maps each slot variable or
+    object key to its URL; images with neither are listed by offset.
+    """
+    images = discover_images(html)
+    if not images:
+        return html, {'source': HTML_PATH, 'images': 0, 'unique': 0, 'bytes_saved': 0, 'sprites': {}}
+    os.makedirs(out_dir, exist_ok=True)
+
+    unique = {}
+    for image in images:
+        unique.setdefault(image['b64'], image['format'])
+    payloads = list(unique)
+
+    args = (payloads, [unique[p] for p in payloads], [out_dir] * len(payloads))
+    if jobs == 1:
+        decoded = list(map(decode_payload, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            decoded = list(pool.map(decode_payload, *args, chunksize=16))
+    urls = {b64: site_path(path).replace(os.sep, '/') for b64, (_, _, path, _) in zip(payloads, decoded)}
+
+    # Data URIs never overlap, so one left-to-right splice rewrites them all
+    pieces = []
+    pos = 0
+    sprites = {}
+    for image in images:
+        prefix = f"data:image/{image['format']};base64,"
+        end = image['offset'] + len(prefix) + len(image['b64'])
+        pieces.append(html[pos:image['offset']])
+        pieces.append(urls[image['b64']])
+        pos = end
+        name = image['var'] or image['key'] or f"@{image['offset']}"
+        sprites[name] = urls[image['b64']]
+    pieces.append(html[pos:])
+    new_html = ''.join(pieces)
+
+    manifest = {
+        'source': HTML_PATH,
+        'images': len(images),
+        'unique': len(payloads),
+        'bytes_saved': len(html.encode('utf-8')) - len(new_html.encode('utf-8')),
+        'sprites': sprites,
+    }
+    return new_html, manifest
+
+
+def write_manifest(manifest, path=HASHED_MANIFEST):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def externalize_file(path=HTML_PATH, out_dir=HASHED_DIR, jobs=None):
+    """Externalize a page in place; returns the manifest"""
+    with open(path, 'r', encoding='utf-8') as f:
+        html = f.read()
+    new_html, manifest = externalize(html, out_dir, jobs)
+    if new_html == html:
+        return manifest
+
+    # Sprites externalized by earlier runs are no longer data URIs; keep them
+    manifest_path = os.path.join(out_dir, 'manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f).get('sprites', {})
+        manifest['sprites'] = {**previous, **manifest['sprites']}
+
+    write_atomic(path, new_html)
+    write_manifest(manifest, manifest_path)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move embedded sprites into content-hashed files')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='decode worker processes')
+    parser.add_argument('--html', default=HTML_PATH, help='page to rewrite in place')
+    parser.add_argument('--out', default=HASHED_DIR, help='directory for hashed sprites')
+    args = parser.parse_args()
+    try:
+        args.out = site_path(args.out)
+    except ValueError as e:
+        parser.error(f"--out: {e}")
+
+    manifest = externalize_file(args.html, args.out, args.jobs)
+    print(f"✓ Externalized {manifest['images']} images ({manifest['unique']} files)")
+    print(f"  {args.html}: {manifest['bytes_saved'] / 1024:.1f} KB smaller")
+    print(f"  → {os.path.join(args.out, 'manifest.json')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,45 +1,195 @@
 #!/usr/bin/env python3
-import re
+"""
+Extract every embedded image from index.html
+Finds all base64 data URIs in one pass, decodes them in parallel, stores each
+distinct payload once and writes a manifest of where every copy lives
+"""
+import argparse
 import base64
+import bisect
+import hashlib
+import io
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
 
-# Read index.html
-with open('index.html', 'r') as f:
-    html = f.read()
-
-# Monster sprites to extract (main 5 + extras)
-sprites = {
-    'rat': '_ratI',
-    'skeleton': '_sklI',
-    'dragon': '_drgI',
-    'troll': '_trlI',
-    'spider': '_pspI',  # poison_spider
-    'bug': '_bugI',
-    'cave_rat': '_crI',
-    'snake': '_snkI',
-    'scorpion': '_scpI',
-    'wolf': '_wlfI',
-    'bear': '_brI',
-    'deer': '_drI',
-    'boar': '_boaI',
-    'rotworm': '_rwI'
-}
-
-# Extract and save each sprite
-for name, var in sprites.items():
-    pattern = rf"window\.{var}\.src='data:image/png;base64,([^']+)'"
-    match = re.search(pattern, html)
-    
-    if match:
-        b64_data = match.group(1)
-        try:
-            img_data = base64.b64decode(b64_data)
-            output_path = f'assets/sprites/monsters/original/{name}.png'
-            with open(output_path, 'wb') as img_file:
-                img_file.write(img_data)
-            print(f"✓ Extracted: {name}.png")
-        except Exception as e:
-            print(f"✗ Failed to extract {name}: {e}")
+from html_patcher import HtmlIndex
+from sprite_catalog import HTML_PATH, ORIGINAL_DIR, monster_vars
+
+EXTRACTED_DIR = 'assets/sprites/extracted'
+MANIFEST_NAME = 'manifest.json'
+
+DATA_URI_RE = re.compile(r"data:image/(?P<fmt>[\w+.-]+);base64,(?P<b64>[A-Za-z0-9+/=]+)")
+# What the URI is assigned to, looked up in the text just before it
+SLOT_RE = re.compile(r"window\.(?P<var>[\w$]+(?:\[\d+\])?)\.src=['\"]$")
+KEY_RE = re.compile(r"(?P<key>[\w$]+):\{[^{}]*$")
+CONTEXT_CHARS = 256
+
+EXTENSIONS = {'png': 'png', 'gif': 'gif', 'jpeg': 'jpg', 'webp': 'webp', 'svg+xml': 'svg'}
+
+
+def discover_images(html):
+    """Every data URI in the page with its variable, object key and owning case
+
+    Returns a list of dicts in document order; 'b64' holds the raw payload.
+    """
+    index = HtmlIndex(html)
+    spans = sorted((start, end, label) for label, found in index.cases.items() for start, end in found)
+    starts = [start for start, _, _ in spans]
+
+    found = []
+    for match in DATA_URI_RE.finditer(html):
+        context = html[max(0, match.start() - CONTEXT_CHARS):match.start()]
+        slot = SLOT_RE.search(context)
+        key = None if slot else KEY_RE.search(context)
+
+        owner = None
+        i = bisect.bisect_right(starts, match.start()) - 1
+        if i >= 0 and match.start() < spans[i][1]:
+            owner = spans[i][2]
+
+        found.append({
+            'offset': match.start(),
+            'var': slot.group('var') if slot else None,
+            'key': key.group('key') if key else None,
+            'case': owner,
+            'format': match.group('fmt'),
+            'b64': match.group('b64'),
+        })
+    return found
+
+
+def decode_payload(b64, fmt, out_dir):
+    """Decode one payload and store it under its content hash
+
+    Returns (sha256, byte size, path, (width, height) or None).
+    """
+    from PIL import Image
+
+    data = base64.b64decode(b64)
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(out_dir, f"{digest[:16]}.{EXTENSIONS.get(fmt, 'bin')}")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    size = None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            size = img.size
+    except Exception:
+        pass
+    return digest, len(data), path, size
+
+
+def extract_all(html, out_dir=EXTRACTED_DIR, jobs=None):
+    """Decode every embedded image into out_dir and write its manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    images = discover_images(html)
+
+    # Identical base64 text means identical bytes, so decode each once
+    unique = {}
+    for image in images:
+        unique.setdefault(image['b64'], image['format'])
+    payloads = list(unique)
+
+    args = (payloads, [unique[p] for p in payloads], [out_dir] * len(payloads))
+    if jobs == 1:
+        decoded = list(map(decode_payload, *args))
     else:
-        print(f"✗ Not found: {name}")
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            decoded = list(pool.map(decode_payload, *args, chunksize=16))
+    by_payload = dict(zip(payloads, decoded))
+
+    entries = []
+    for image in images:
+        digest, size, path, dims = by_payload[image['b64']]
+        entries.append({
+            'var': image['var'],
+            'key': image['key'],
+            'case': image['case'],
+            'offset': image['offset'],
+            'format': image['format'],
+            'bytes': size,
+            'width': dims[0] if dims else None,
+            'height': dims[1] if dims else None,
+            'sha256': digest,
+            'path': path,
+        })
+
+    manifest = {
+        'source': HTML_PATH,
+        'images': len(entries),
+        'unique': len(payloads),
+        'entries': entries,
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def extract_sprite(html, name, var):
+    """Decode one monster's base64 sprite from index.html into original/
+
+    Only the static window.<var> slot is used. Animated frames (<var>_f) are
+    already keyed, quantized and outlined, so they are never copied back
+    over the unprocessed originals.
+    """
+    pattern = rf"window\.{re.escape(var)}\.src='data:image/png;base64,([^']+)'"
+    match = re.search(pattern, html)
+    if not match:
+        raise LookupError(f"no static {var} image in {HTML_PATH}")
+
+    img_data = base64.b64decode(match.group(1))
+    output_path = os.path.join(ORIGINAL_DIR, f'{name}.png')
+    os.makedirs(ORIGINAL_DIR, exist_ok=True)
+    with open(output_path, 'wb') as img_file:
+        img_file.write(img_data)
+    return output_path
+
+
+def copy_originals(manifest):
+    """Refresh original/<name>.png for catalog monsters from the extracted set
+
+    Like extract_sprite, only static slots count; monsters drawn from
+    animated frames are left alone.
+    """
+    by_var = {entry['var']: entry for entry in manifest['entries'] if entry['var']}
+    os.makedirs(ORIGINAL_DIR, exist_ok=True)
+    for name, var in monster_vars().items():
+        entry = by_var.get(var)
+        if entry is None:
+            print(f"• Kept: {name}.png (no static {var} slot)")
+            continue
+        with open(entry['path'], 'rb') as src, open(os.path.join(ORIGINAL_DIR, f'{name}.png'), 'wb') as dst:
+            dst.write(src.read())
+        print(f"✓ Extracted: {name}.png ({entry['var']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract every embedded image from index.html')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='decode worker processes')
+    parser.add_argument('--out', default=EXTRACTED_DIR, help='directory for extracted images')
+    parser.add_argument('--originals', action='store_true',
+                        help=f'also refresh {ORIGINAL_DIR}/ from static monster slots')
+    args = parser.parse_args()
+
+    # Read index.html
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    manifest = extract_all(html, args.out, args.jobs)
+    print(f"✓ Found {manifest['images']} embedded images, {manifest['unique']} unique")
+    print(f"  → {os.path.join(args.out, MANIFEST_NAME)}\n")
+
+    if args.originals:
+        copy_originals(manifest)
+
+    print("\n✓ Sprite extraction complete!")
+
 
-print("\n✓ Sprite extraction complete!")
+if __name__ == '__main__':
+    main()
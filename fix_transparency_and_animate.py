@@ -2,95 +2,122 @@
 """
 Fix MegaRealms sprite transparency and add animation frames
 """
+import argparse
 import os
-from PIL import Image
 import numpy as np
+from PIL import Image
+
+from animation_engine import ANIMATIONS, idle_frames
+from background_key import remove_background, resize_keyed
+from build_cache import BuildCache
+from palette_quantizer import quantize_image
+from png_encoder import ENCODER_VERSION, save_png
+from sprite_loader import load_reduced
+from sprite_catalog import ANIMATED_DIR, ANIMATION_FRAMES, IMPROVED_DIR, monster_names
 
-def remove_white_background(img):
+# Stage parameters (recorded in the build manifest)
+FRAME_SIZE = (32, 32)
+KEY_COLOR = (255, 255, 255)
+KEY_THRESHOLD = 240
+KEY_FEATHER = 20
+FRAME_RESAMPLE = Image.Resampling.LANCZOS
+
+def remove_white_background(img, key=KEY_COLOR, threshold=KEY_THRESHOLD, feather=KEY_FEATHER):
     """Remove white background and make it transparent"""
-    img = img.convert('RGBA')
-    data = np.array(img)
-    
-    # Find pixels that are mostly white (RGB > 240)
-    white_mask = (data[:, :, 0] > 240) & (data[:, :, 1] > 240) & (data[:, :, 2] > 240)
-    
-    # Make white pixels transparent
-    data[white_mask] = [255, 255, 255, 0]
-    
-    # Also handle near-white pixels (anti-aliasing artifacts)
-    near_white_mask = (data[:, :, 0] > 220) & (data[:, :, 1] > 220) & (data[:, :, 2] > 220)
-    # Reduce alpha based on how white they are
-    for i in range(data.shape[0]):
-        for j in range(data.shape[1]):
-            if near_white_mask[i, j] and not white_mask[i, j]:
-                avg = (int(data[i, j, 0]) + int(data[i, j, 1]) + int(data[i, j, 2])) / 3
-                if avg > 220:
-                    alpha = int((240 - avg) * 12.75)  # Scale 220-240 to 255-0
-                    data[i, j, 3] = max(0, alpha)
-    
-    return Image.fromarray(data, 'RGBA')
+    return remove_background(img, key, threshold, feather)
 
 def create_animation_frame(img, frame_num, total_frames=4):
-    """Create animation frame by slightly shifting the sprite"""
-    width, height = img.size
-    
-    # Simple idle animation: slight vertical bob
-    if total_frames == 4:
-        offsets = [0, -1, 0, 1]  # Pixels to shift
-        offset = offsets[frame_num]
-    else:
-        offset = 0
-    
-    # Create new image with offset
-    new_img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
-    new_img.paste(img, (0, offset))
-    
-    return new_img
+    """One frame of the idle bob (animation_engine), stretched to total_frames"""
+    frames = idle_frames(np.array(img.convert('RGBA')), total_frames)
+    return Image.fromarray(frames[frame_num], 'RGBA')
+
+def process_sprite(input_path, output_base_path, create_frames=True, key_after_resize=False, reduce=False,
+                   palette=None):
+    """Process a single sprite: transparency + animation frames
 
-def process_sprite(input_path, output_base_path, create_frames=True):
-    """Process a single sprite: transparency + animation frames"""
+    key_after_resize=True downscales first and keys out the 32x32 result,
+    instead of running background removal over the full-size original.
+    reduce=True decodes a large original at a few times FRAME_SIZE, so key-out
+    never runs over the full 1024x1024 image.
+    palette snaps the resized sprite to those colours (alpha is kept), e.g.
+    a subset of the shared palette from palette_builder.
+    """
     print(f"Processing: {os.path.basename(input_path)}")
     
     # Load image
-    img = Image.open(input_path)
-    
-    # Remove white background
-    img = remove_white_background(img)
+    if reduce:
+        img = load_reduced(input_path, FRAME_SIZE)
+    else:
+        img = Image.open(input_path).convert('RGBA')
     
-    # Resize to 32x32 for performance (original is 1024x1024)
-    img = img.resize((32, 32), Image.Resampling.LANCZOS)
+    if key_after_resize:
+        img = img.resize(FRAME_SIZE, FRAME_RESAMPLE)
+        img = remove_white_background(img)
+    else:
+        # Remove white background
+        img = remove_white_background(img)
+        
+        # Resize to 32x32 for performance (original is 1024x1024)
+        img = resize_keyed(img, FRAME_SIZE, FRAME_RESAMPLE)
+
+    if palette:
+        img = quantize_image(img, palette)
     
     if create_frames:
-        # Create 4 animation frames
-        for frame in range(4):
-            frame_img = create_animation_frame(img, frame, 4)
+        # Create 4 animation frames in one batched pass
+        frames = idle_frames(np.array(img), ANIMATION_FRAMES)
+        for frame in range(ANIMATION_FRAMES):
+            frame_img = Image.fromarray(frames[frame], 'RGBA')
             output_path = output_base_path.replace('.png', f'_frame{frame}.png')
-            frame_img.save(output_path, 'PNG')
+            save_png(frame_img, output_path)
             print(f"  ✓ Frame {frame}: {os.path.basename(output_path)}")
     else:
         # Just save single frame
-        img.save(output_base_path, 'PNG')
+        save_png(img, output_base_path)
         print(f"  ✓ Saved: {os.path.basename(output_base_path)}")
     
     return True
 
+def animate_params(create_frames=True, key_after_resize=False, reduce=False, palette=None):
+    """Everything besides the input file that affects process_sprite output"""
+    return {
+        'target_size': list(FRAME_SIZE),
+        'frames': ANIMATION_FRAMES if create_frames else 1,
+        'animation': ANIMATIONS['idle'] if create_frames else None,
+        'key': list(KEY_COLOR),
+        'threshold': KEY_THRESHOLD,
+        'feather': KEY_FEATHER,
+        'key_after_resize': key_after_resize,
+        'reduce': reduce,
+        'palette': [list(c) for c in palette] if palette else None,
+        'encoder': ENCODER_VERSION,
+    }
+
+def frame_paths(output_base_path, create_frames=True):
+    """Files written by process_sprite for one sprite"""
+    if not create_frames:
+        return [output_base_path]
+    return [output_base_path.replace('.png', f'_frame{frame}.png') for frame in range(ANIMATION_FRAMES)]
+
 def main():
     """Process all monster sprites"""
+    parser = argparse.ArgumentParser(description='Key out and animate MegaRealms monster sprites')
+    parser.add_argument('--force', action='store_true', help='ignore the build cache')
+    args = parser.parse_args()
+    cache = BuildCache(force=args.force)
+    params = animate_params()
+    
     print("=" * 60)
     print("MegaRealms - Transparency Fix + Animation")
     print("=" * 60)
     
-    input_dir = 'assets/sprites/monsters/improved'
-    output_dir = 'assets/sprites/monsters/animated'
+    input_dir = IMPROVED_DIR
+    output_dir = ANIMATED_DIR
     
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    monsters = [
-        'rat', 'skeleton', 'dragon', 'troll', 'spider',
-        'bug', 'cave_rat', 'snake', 'scorpion', 'wolf',
-        'bear', 'deer', 'boar', 'rotworm'
-    ]
+    monsters = monster_names()
     
     print(f"\n=== Processing {len(monsters)} monsters ===\n")
     
@@ -100,14 +127,20 @@ def main():
         
         if os.path.exists(input_path):
             try:
-                process_sprite(input_path, output_path, create_frames=True)
+                ran = cache.run('animate', monster, [input_path], params, frame_paths(output_path),
+                                lambda: process_sprite(input_path, output_path, create_frames=True))
+                if not ran:
+                    print(f"  • Unchanged: {monster}.png")
             except Exception as e:
                 print(f"  ✗ Error: {e}")
         else:
             print(f"  ⚠ Skipped: {monster}.png not found")
     
+    cache.save()
+    
     print("\n" + "=" * 60)
     print("✓ Processing complete!")
+    print(cache.summary())
     print("=" * 60)
     print(f"\nOutput: {output_dir}/")
     print("Each monster has 4 animation frames:")
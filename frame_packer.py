@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Frame deduplication for MegaRealms animated sprites
+Finds frames that are byte-for-byte repeats or pure translations of an
+earlier frame (the idle bob makes frame 2 a copy of frame 0 and frames 1/3
+one-pixel shifts of it), so each unique image is embedded once and the rest
+become (image, dx, dy) entries in a frame table
+"""
+import argparse
+import hashlib
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+from sprite_catalog import ANIMATED_DIR, ANIMATION_FRAMES, monster_names
+
+MAX_SHIFT = 2   # largest translation searched, in pixels per axis
+
+
+def decode(data):
+    """PNG bytes -> (H, W, 4) uint8 with the colour of transparent pixels zeroed"""
+    arr = np.array(Image.open(io.BytesIO(data)).convert('RGBA'))
+    arr[arr[..., 3] == 0] = 0
+    return arr
+
+
+def shift(arr, dx, dy):
+    """Move an image by (dx, dy), clearing what is uncovered"""
+    result = np.zeros_like(arr)
+    height, width = arr.shape[:2]
+    result[max(dy, 0):height + min(dy, 0), max(dx, 0):width + min(dx, 0)] = \
+        arr[max(-dy, 0):height + min(-dy, 0), max(-dx, 0):width + min(-dx, 0)]
+    return result
+
+
+def translation(base, frame, max_shift=MAX_SHIFT):
+    """(dx, dy) such that drawing `base` at that offset gives exactly `frame`
+
+    Only offsets that push fully transparent pixels out of the frame
+    count, so nothing is drawn outside the sprite's own square. None when
+    no offset matches.
+    """
+    if base.shape != frame.shape:
+        return None
+    for dy in range(-max_shift, max_shift + 1):
+        for dx in range(-max_shift, max_shift + 1):
+            if (dx or dy) and np.array_equal(shift(base, dx, dy), frame) \
+                    and int(base[..., 3].sum()) == int(frame[..., 3].sum()):
+                return dx, dy
+    return None
+
+
+def pack_frames(pngs, max_shift=MAX_SHIFT):
+    """Split a sprite's encoded frames into unique images and a frame table
+
+    Returns (unique PNG bytes, [(image index, dx, dy) per frame]). Frame 0
+    is always image 0, so frame-0 slot lookups keep working.
+    """
+    uniques = []
+    arrays = []
+    by_hash = {}
+    table = []
+    for data in pngs:
+        arr = decode(data)
+        digest = hashlib.sha256(arr.tobytes()).digest()
+        if digest in by_hash:
+            table.append((by_hash[digest], 0, 0))
+            continue
+        for index, base in enumerate(arrays):
+            offset = translation(base, arr, max_shift)
+            if offset:
+                table.append((index, *offset))
+                break
+        else:
+            by_hash[digest] = len(uniques)
+            table.append((len(uniques), 0, 0))
+            uniques.append(data)
+            arrays.append(arr)
+    return uniques, table
+
+
+def read_frames(name, frame_dir=ANIMATED_DIR):
+    """Encoded frames of one sprite from disk, or None if any is missing"""
+    frames = []
+    for frame in range(ANIMATION_FRAMES):
+        path = os.path.join(frame_dir, f'{name}_frame{frame}.png')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            frames.append(f.read())
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report how far frame deduplication shrinks the animated sprites')
+    parser.add_argument('--max-shift', type=int, default=MAX_SHIFT, help='largest translation searched (pixels)')
+    args = parser.parse_args()
+
+    before = after = 0
+    for name in monster_names():
+        frames = read_frames(name)
+        if frames is None:
+            print(f"  ⚠ {name}: frames missing")
+            continue
+        uniques, table = pack_frames(frames, args.max_shift)
+        before += sum(len(data) for data in frames)
+        after += sum(len(data) for data in uniques)
+        entries = ' '.join(f"{i}" + (f"@{dx:+d},{dy:+d}" if dx or dy else '') for i, dx, dy in table)
+        print(f"  {name:12s} {len(frames)} frames → {len(uniques)} images  [{entries}]")
+    if before:
+        print(f"✓ {before / 1024:.1f} KB → {after / 1024:.1f} KB of PNG ({100 - after * 100 / before:.0f}% smaller)")
+
+
+if __name__ == '__main__':
+    main()
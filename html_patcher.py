@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Single-pass, index-based patcher for index.html
+Indexes every window._xxI.src= slot and case '<label>':{...}break; block once,
+then applies all replacements in one splice
+"""
+import os
+import re
+import tempfile
+
+# Two patterns with literal prefixes rather than one alternation: the regex
+# engine can then jump between "window." / "case" hits instead of trying
+# every character of the page's base64
+SLOT_RE = re.compile(r"window\.(?P<var>[\w$]+(?:\[\d+\])?)\.src=(?P<quote>['\"])")
+CASE_RE = re.compile(r"case\s*'(?P<case>[\w$]+)':\s*\{")
+BREAK_RE = re.compile(r"\s*break;")
+# The only characters match_brace has to look at
+BRACE_SCAN_RE = re.compile(r"['\"`{}/]")
+
+
+def _skip_string(text, i):
+    """Index just past the JS string literal starting at text[i]
+
+    Jumps from quote to quote with str.find, so a multi-kilobyte base64
+    literal costs one call; a quote after an odd run of backslashes is
+    escaped and skipped.
+    """
+    quote = text[i]
+    i += 1
+    while True:
+        end = text.find(quote, i)
+        if end == -1:
+            raise ValueError("Unterminated string literal")
+        slashes = end
+        while text[slashes - 1] == '\\':
+            slashes -= 1
+        if (end - slashes) % 2 == 0:
+            return end + 1
+        i = end + 1
+
+
+def match_brace(text, open_pos):
+    """Index of the '}' closing the '{' at open_pos, skipping strings and comments"""
+    depth = 0
+    i = open_pos
+    n = len(text)
+    while i < n:
+        match = BRACE_SCAN_RE.search(text, i)
+        if not match:
+            break
+        i = match.start()
+        c = text[i]
+        if c in '\'"`':
+            i = _skip_string(text, i)
+            continue
+        if c == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        if c == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    raise ValueError(f"Unbalanced brace at offset {open_pos}")
+
+
+class HtmlIndex:
+    """Offsets of every patchable location in a document
+
+    slots: image variable -> [(start, end)] spanning the quoted src value
+    cases: case label -> [(start, end)] spanning "case '...':{...}break;"
+    """
+
+    def __init__(self, html):
+        self.html = html
+        self.slots = {}
+        self.cases = {}
+        self.errors = []
+        for match in SLOT_RE.finditer(html):
+            start = match.end() - 1
+            try:
+                end = _skip_string(html, start)
+            except ValueError:
+                self.errors.append(f"unterminated src for {match.group('var')}")
+                continue
+            self.slots.setdefault(match.group('var'), []).append((start, end))
+        for match in CASE_RE.finditer(html):
+            label = match.group('case')
+            try:
+                close = match_brace(html, match.end() - 1)
+            except ValueError as e:
+                self.errors.append(f"case '{label}': {e}")
+                continue
+            brk = BREAK_RE.match(html, close + 1)
+            if not brk:
+                self.errors.append(f"case '{label}': no break; after block")
+                continue
+            self.cases.setdefault(label, []).append((match.start(), brk.end()))
+
+
+class PatchReport:
+    """What happened to each requested replacement
+
+    Targets are (kind, key) pairs such as ('case', 'rat') or ('slot', '_mumI');
+    duplicates also carry how many times the target was found.
+    """
+
+    def __init__(self):
+        self.applied = []
+        self.unmatched = []
+        self.duplicate = []
+
+    @property
+    def ok(self):
+        return not self.unmatched and not self.duplicate
+
+    def lines(self):
+        out = [f"  ✓ {kind} {key}" for kind, key in self.applied]
+        out += [f"  ✗ {kind} {key} (not found)" for kind, key in self.unmatched]
+        out += [f"  ✗ {kind} {key} (found {count}×, skipped)" for kind, key, count in self.duplicate]
+        return out
+
+
+def _locate(kind, table, key, report):
+    spans = table.get(key, [])
+    if not spans:
+        report.unmatched.append((kind, key))
+        return None
+    if len(spans) > 1:
+        report.duplicate.append((kind, key, len(spans)))
+        return None
+    report.applied.append((kind, key))
+    return spans[0]
+
+
+def patch_html(html, slots=None, cases=None, index=None):
+    """Apply every replacement in one splice
+
+    slots: image variable -> new src value (without quotes)
+    cases: case label -> new block body (the code between '{' and '}break;')
+    Returns (new_html, PatchReport). Missing or duplicated targets are left
+    untouched and reported instead of guessed at.
+    """
+    index = index or HtmlIndex(html)
+    report = PatchReport()
+    edits = []
+
+    for label, body in (cases or {}).items():
+        span = _locate('case', index.cases, label, report)
+        if span:
+            edits.append((span[0], span[1], f"case '{label}':{{{body}}}break;"))
+
+    for var, value in (slots or {}).items():
+        span = _locate('slot', index.slots, var, report)
+        if span:
+            quote = html[span[0]]
+            edits.append((span[0], span[1], f"{quote}{value}{quote}"))
+
+    edits.sort()
+    for (_, prev_end, _), (start, _, _) in zip(edits, edits[1:]):
+        if start < prev_end:
+            raise ValueError(f"Overlapping patches at offset {start}")
+
+    pieces = []
+    pos = 0
+    for start, end, text in edits:
+        pieces.append(html[pos:start])
+        pieces.append(text)
+        pos = end
+    pieces.append(html[pos:])
+    return ''.join(pieces), report
+
+
+def write_atomic(path, text, encoding='utf-8'):
+    """Replace a file in one step so readers never see a half-written page"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            f.write(text)
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -3,9 +3,16 @@
 Local sprite improvement script for MegaRealms
 Applies Tibia 7.x style enhancements without using external APIs
 """
+import argparse
 import os
-from PIL import Image, ImageEnhance, ImageFilter, ImageDraw
-import numpy as np
+from PIL import Image, ImageEnhance
+
+from build_cache import BuildCache
+from palette_quantizer import quantize_image
+from png_encoder import ENCODER_VERSION, save_png
+from sprite_outline import outline_image
+from sprite_catalog import ORIGINAL_DIR, QUANTIZED_DIR, TILE_VARIANTS_DIR, TILES_DIR, monster_names
+from sprite_loader import load_reduced
 
 # Tibia 7.x color palette (earthy muted tones)
 TIBIA_PALETTE = {
@@ -24,113 +31,91 @@ TIBIA_PALETTE = {
     'blue_ice': (135, 206, 235),
 }
 
-def quantize_to_palette(img, palette_colors, max_colors=8):
-    """Reduce image to limited color palette (Tibia style)"""
-    img_array = np.array(img.convert('RGB'))
-    height, width, _ = img_array.shape
-    
-    # Flatten image
-    pixels = img_array.reshape(-1, 3)
-    
-    # Simple k-means-like clustering to palette
+# Stage parameters (recorded in the build manifest)
+SHARPNESS = 2.0
+MAX_COLORS = 6
+OUTLINE_THICKNESS = 1
+TILE_NAMES = ['grass', 'dirt', 'water', 'stone_wall', 'sand', 'cave_floor', 'ice', 'lava']
+
+def quantize_to_palette(img, palette_colors, max_colors=8, mode='rgb'):
+    """Reduce image to limited color palette (Tibia style)
+
+    mode='rgb' matches by Euclidean RGB distance, mode='lab' by
+    perceptual L*a*b* distance.
+    """
     palette_values = list(palette_colors.values())[:max_colors]
-    
-    # Find closest palette color for each pixel
-    quantized = np.zeros_like(pixels)
-    for i, pixel in enumerate(pixels):
-        distances = [np.linalg.norm(pixel - np.array(p)) for p in palette_values]
-        closest = palette_values[np.argmin(distances)]
-        quantized[i] = closest
-    
-    # Reshape back
-    quantized_img = quantized.reshape(height, width, 3).astype(np.uint8)
-    result = Image.fromarray(quantized_img)
-    
-    # Preserve alpha channel if exists
-    if img.mode == 'RGBA':
-        result.putalpha(img.split()[3])
-    
-    return result
+    return quantize_image(img, palette_values, mode=mode)
 
-def add_outline(img, outline_color=(0, 0, 0), thickness=1):
+def add_outline(img, outline_color=(0, 0, 0), thickness=1, connectivity=8, placement='inner'):
     """Add 1px black outline to non-transparent pixels"""
-    if img.mode != 'RGBA':
-        img = img.convert('RGBA')
-    
-    # Create a copy for drawing
-    outlined = img.copy()
-    alpha = img.split()[3]
-    
-    # Find edges
-    edges = alpha.filter(ImageFilter.FIND_EDGES)
-    
-    # Create mask for outline
-    outline_mask = Image.new('L', img.size, 0)
-    outline_mask.paste(edges, (0, 0))
-    
-    # Apply outline
-    draw = ImageDraw.Draw(outlined)
-    for x in range(img.width):
-        for y in range(img.height):
-            if alpha.getpixel((x, y)) > 0:
-                # Check neighbors
-                for dx in [-thickness, 0, thickness]:
-                    for dy in [-thickness, 0, thickness]:
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < img.width and 0 <= ny < img.height:
-                            if alpha.getpixel((nx, ny)) == 0:
-                                outlined.putpixel((x, y), outline_color + (255,))
-                                break
-    
-    return outlined
+    return outline_image(img, outline_color, thickness, connectivity, placement)
 
-def improve_sprite(input_path, output_path, target_size=(32, 32), add_border=True):
+def improve_sprite(input_path, output_path, target_size=(32, 32), add_border=True, reduce=False, palette=None):
     """
     Improve a sprite using local processing:
-    - Resize to 32x32 (nearest neighbor for pixel art)
+    - Resize to 32x32 (nearest neighbor for pixel art); with reduce=True a
+      large source is first decoded at a reduced working resolution
     - Enhance sharpness
-    - Quantize to Tibia palette
+    - Quantize to Tibia palette, or to `palette` (a subset of the shared
+      palette from palette_builder) when given
     - Add 1px black outline
     """
     print(f"Processing: {os.path.basename(input_path)}")
     
-    try:
-        # Load image
+    # Load image
+    if reduce:
+        img = load_reduced(input_path, target_size)
+    else:
         img = Image.open(input_path)
-        
-        # Ensure RGBA
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-        
-        # Resize if needed (nearest neighbor to preserve pixels)
-        if img.size != target_size:
-            img = img.resize(target_size, Image.NEAREST)
-        
-        # Enhance sharpness
-        enhancer = ImageEnhance.Sharpness(img)
-        img = enhancer.enhance(2.0)
-        
-        # Quantize to Tibia palette (reduce colors)
-        img = quantize_to_palette(img, TIBIA_PALETTE, max_colors=6)
-        
-        # Add outline
-        if add_border:
-            img = add_outline(img, outline_color=(0, 0, 0), thickness=1)
-        
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Save with maximum quality
-        img.save(output_path, 'PNG', optimize=True)
-        print(f"  ✓ Saved: {output_path}")
-        
-    except Exception as e:
-        print(f"  ✗ Error processing {input_path}: {e}")
+    
+    # Ensure RGBA
+    if img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    
+    # Resize if needed (nearest neighbor to preserve pixels)
+    if img.size != target_size:
+        img = img.resize(target_size, Image.NEAREST)
+    
+    # Enhance sharpness
+    enhancer = ImageEnhance.Sharpness(img)
+    img = enhancer.enhance(SHARPNESS)
+    
+    # Quantize to Tibia palette (reduce colors)
+    if palette:
+        img = quantize_image(img, palette)
+    else:
+        img = quantize_to_palette(img, TIBIA_PALETTE, max_colors=MAX_COLORS)
+    
+    # Add outline
+    if add_border:
+        img = add_outline(img, outline_color=(0, 0, 0), thickness=OUTLINE_THICKNESS)
+    
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    # Palette PNG with tRNS when the colours allow, smallest filter/zlib setting
+    save_png(img, output_path)
+    print(f"  ✓ Saved: {output_path}")
+
+def improve_params(target_size=(32, 32), add_border=True, reduce=False, palette=None):
+    """Everything besides the input file that affects improve_sprite output"""
+    return {
+        'reduce': reduce,
+        'palette': [list(c) for c in palette] if palette else list(TIBIA_PALETTE.values())[:MAX_COLORS],
+        'max_colors': MAX_COLORS,
+        'sharpness': SHARPNESS,
+        'outline_thickness': OUTLINE_THICKNESS if add_border else 0,
+        'target_size': list(target_size),
+        'encoder': ENCODER_VERSION,
+    }
 
-def improve_all_monsters():
+def improve_all_monsters(cache=None):
     """Improve all monster sprites"""
-    original_dir = 'assets/sprites/monsters/original'
-    improved_dir = 'assets/sprites/monsters/improved'
+    owns_cache = cache is None
+    cache = cache or BuildCache()
+    params = improve_params()
+    original_dir = ORIGINAL_DIR
+    improved_dir = QUANTIZED_DIR
     
     if not os.path.exists(original_dir):
         print(f"Error: {original_dir} not found")
@@ -138,146 +123,80 @@ def improve_all_monsters():
     
     os.makedirs(improved_dir, exist_ok=True)
     
-    monsters = [
-        'rat', 'skeleton', 'dragon', 'troll', 'spider',
-        'bug', 'cave_rat', 'snake', 'scorpion', 'wolf',
-        'bear', 'deer', 'boar', 'rotworm'
-    ]
-    
     print("\n=== Improving Monster Sprites ===")
-    for monster in monsters:
+    for monster in monster_names():
         input_path = os.path.join(original_dir, f"{monster}.png")
         output_path = os.path.join(improved_dir, f"{monster}.png")
         
         if os.path.exists(input_path):
-            improve_sprite(input_path, output_path)
+            try:
+                ran = cache.run('improve', monster, [input_path], params, [output_path],
+                                lambda: improve_sprite(input_path, output_path))
+                if not ran:
+                    print(f"  • Unchanged: {monster}.png")
+            except Exception as e:
+                print(f"  ✗ Error processing {input_path}: {e}")
         else:
             print(f"  ⚠ Skipped (not found): {monster}.png")
+    
+    if owns_cache:
+        cache.save()
+
+def create_tile_sprites(cache=None, seed=None):
+    """Generate improved tile sprites programmatically
+
+    Tiles come from tile_generator: seeded, so reruns are byte-identical.
+    Every SM-named variant goes to TILE_VARIANTS_DIR and the first variant of
+    each terrain is also kept under its old name in TILES_DIR.
+    """
+    from tile_generator import DEFAULT_SEED, TERRAINS, generate_all, tile_params, write_tiles
 
-def create_tile_sprites():
-    """Generate improved tile sprites programmatically"""
-    tiles_dir = 'assets/sprites/tiles/improved'
+    seed = DEFAULT_SEED if seed is None else seed
+    tiles_dir = TILES_DIR
     os.makedirs(tiles_dir, exist_ok=True)
     
     print("\n=== Creating Improved Tiles ===")
     
-    # Grass tile
-    grass = Image.new('RGBA', (32, 32), TIBIA_PALETTE['green_grass'] + (255,))
-    draw = ImageDraw.Draw(grass)
-    # Add grass tufts
-    for _ in range(8):
-        x, y = np.random.randint(0, 32, 2)
-        draw.rectangle([x, y, x+3, y+3], fill=TIBIA_PALETTE['green_bright'] + (255,))
-    # Add shadows
-    for _ in range(5):
-        x, y = np.random.randint(0, 32, 2)
-        draw.point((x, y), fill=TIBIA_PALETTE['green_dark'] + (255,))
-    grass.save(os.path.join(tiles_dir, 'grass.png'))
-    print("  ✓ Created: grass.png")
-    
-    # Dirt tile
-    dirt = Image.new('RGBA', (32, 32), (139, 115, 85, 255))
-    draw = ImageDraw.Draw(dirt)
-    # Add dirt patches
-    for _ in range(10):
-        x, y = np.random.randint(0, 30, 2)
-        draw.rectangle([x, y, x+6, y+6], fill=(107, 83, 69, 255))
-    # Add highlights
-    for _ in range(8):
-        x, y = np.random.randint(0, 32, 2)
-        draw.point((x, y), fill=(166, 143, 105, 255))
-    dirt.save(os.path.join(tiles_dir, 'dirt.png'))
-    print("  ✓ Created: dirt.png")
-    
-    # Water tile
-    water = Image.new('RGBA', (32, 32), TIBIA_PALETTE['blue_water'] + (255,))
-    draw = ImageDraw.Draw(water)
-    # Add water ripples
-    draw.rectangle([6, 6, 26, 26], fill=(37, 99, 212, 255))
-    for i in range(6):
-        x, y = np.random.randint(0, 28, 2)
-        draw.rectangle([x, y, x+4, y+4], fill=(74, 149, 255, 255))
-    # Wave lines
-    draw.line([(2, 14), (30, 14)], fill=(13, 38, 73, 255), width=1)
-    draw.line([(2, 22), (30, 22)], fill=(13, 38, 73, 255), width=1)
-    water.save(os.path.join(tiles_dir, 'water.png'))
-    print("  ✓ Created: water.png")
-    
-    # Stone wall tile
-    stone = Image.new('RGBA', (32, 32), (101, 67, 33, 255))
-    draw = ImageDraw.Draw(stone)
-    # Draw brick pattern
-    for y in range(0, 32, 8):
-        for x in range(0, 32, 8):
-            if (x + y) % 16 == 0:
-                draw.rectangle([x+2, y+2, x+6, y+6], fill=(85, 85, 85, 255))
-    stone.save(os.path.join(tiles_dir, 'stone_wall.png'))
-    print("  ✓ Created: stone_wall.png")
-    
-    # Sand tile
-    sand = Image.new('RGBA', (32, 32), (232, 199, 90, 255))
-    draw = ImageDraw.Draw(sand)
-    # Add sand dunes
-    for _ in range(9):
-        x, y = np.random.randint(0, 28, 2)
-        draw.rectangle([x, y, x+5, y+3], fill=(212, 169, 55, 255))
-    sand.save(os.path.join(tiles_dir, 'sand.png'))
-    print("  ✓ Created: sand.png")
-    
-    # Cave floor tile
-    cave = Image.new('RGBA', (32, 32), (74, 60, 42, 255))
-    draw = ImageDraw.Draw(cave)
-    # Add rocks
-    for _ in range(6):
-        x, y = np.random.randint(0, 28, 2)
-        draw.rectangle([x, y, x+4, y+4], fill=(101, 67, 33, 255))
-    # Add cracks
-    for _ in range(4):
-        x1, y1 = np.random.randint(0, 32, 2)
-        x2, y2 = np.random.randint(0, 32, 2)
-        draw.line([(x1, y1), (x2, y2)], fill=(42, 24, 16, 255), width=1)
-    cave.save(os.path.join(tiles_dir, 'cave_floor.png'))
-    print("  ✓ Created: cave_floor.png")
+    owns_cache = cache is None
+    cache = cache or BuildCache()
+    params = dict(tile_params(seed), tiles=TILE_NAMES)
+    tiles = generate_all(seed)
+    firsts = {name: tiles[f"{TERRAINS[name]['key']}1"] for name in TILE_NAMES}
+    outputs = ([os.path.join(tiles_dir, f'{name}.png') for name in TILE_NAMES]
+               + [os.path.join(TILE_VARIANTS_DIR, f'{key}.png') for key in tiles])
+    if cache.is_fresh('tiles', 'all', [], params, outputs):
+        print("  • Unchanged: all tiles")
+        return
     
-    # Ice tile
-    ice = Image.new('RGBA', (32, 32), (184, 224, 255, 255))
-    draw = ImageDraw.Draw(ice)
-    # Add ice patches
-    for _ in range(4):
-        x, y = np.random.randint(0, 28, 2)
-        draw.rectangle([x, y, x+12, y+12], fill=(212, 240, 255, 255))
-    # Add sparkles
-    for _ in range(8):
-        x, y = np.random.randint(0, 32, 2)
-        draw.point((x, y), fill=(255, 255, 255, 255))
-        draw.point((x+1, y), fill=(255, 255, 255, 255))
-    ice.save(os.path.join(tiles_dir, 'ice.png'))
-    print("  ✓ Created: ice.png")
+    for name in write_tiles(firsts, tiles_dir):
+        print(f"  ✓ Created: {os.path.basename(name)}")
+    write_tiles(tiles, TILE_VARIANTS_DIR)
+    print(f"  ✓ Created: {len(tiles)} variants in {TILE_VARIANTS_DIR} (seed {seed})")
     
-    # Lava tile
-    lava = Image.new('RGBA', (32, 32), (74, 32, 32, 255))
-    draw = ImageDraw.Draw(lava)
-    # Add lava pools
-    for _ in range(4):
-        x, y = np.random.randint(0, 28, 2)
-        draw.ellipse([x, y, x+8, y+8], fill=(255, 68, 68, 255))
-    for _ in range(3):
-        x, y = np.random.randint(0, 28, 2)
-        draw.ellipse([x, y, x+10, y+10], fill=(255, 136, 68, 255))
-    lava.save(os.path.join(tiles_dir, 'lava.png'))
-    print("  ✓ Created: lava.png")
+    cache.record('tiles', 'all', [], params, outputs)
+    if owns_cache:
+        cache.save()
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description='Improve MegaRealms sprites and tiles')
+    parser.add_argument('--force', action='store_true', help='ignore the build cache')
+    parser.add_argument('--seed', type=int, default=None, help='tile generator seed')
+    args = parser.parse_args()
+    cache = BuildCache(force=args.force)
+    
     print("=" * 50)
     print("MegaRealms Sprite Improvement (Local)")
     print("=" * 50)
     
     # Improve monster sprites
-    improve_all_monsters()
+    improve_all_monsters(cache)
     
     # Create improved tiles
-    create_tile_sprites()
+    create_tile_sprites(cache, args.seed)
+    
+    cache.save()
+    print(f"\n{cache.summary()}")
     
     print("\n" + "=" * 50)
     print("✓ All sprites and tiles improved successfully!")
@@ -4,69 +4,105 @@ Integrate animated transparent sprites - V2 (handles minified code)
 """
 import os
 import base64
-import re
+
+from animation_engine import idle_ms
+from frame_packer import pack_frames, read_frames
+from html_patcher import patch_html, write_atomic
+from sprite_catalog import ANIMATED_DIR, ANIMATION_FRAMES, HTML_PATH, monster_cases
+
+def png_bytes_to_base64(data):
+    """Convert encoded PNG bytes to a base64 data URI"""
+    b64 = base64.b64encode(data).decode('utf-8')
+    return f"data:image/png;base64,{b64}"
 
 def png_to_base64(file_path):
     """Convert PNG to base64"""
     with open(file_path, 'rb') as f:
         data = f.read()
-    b64 = base64.b64encode(data).decode('utf-8')
-    return f"data:image/png;base64,{b64}"
+    return png_bytes_to_base64(data)
 
 def create_animation_code_inline(monster_name, var_prefix):
     """Generate compact inline JavaScript for animation"""
-    frames_b64 = []
-    
-    for frame in range(4):
-        sprite_path = f'assets/sprites/monsters/animated/{monster_name}_frame{frame}.png'
-        if os.path.exists(sprite_path):
-            frames_b64.append(png_to_base64(sprite_path))
-        else:
-            print(f"    ⚠ Missing: {sprite_path}")
-            return None
+    frames = read_frames(monster_name)
+    if frames is None:
+        print(f"    ⚠ Missing frames: {os.path.join(ANIMATED_DIR, monster_name)}_frameN.png")
+        return None
     
+    return packed_animation_code(var_prefix, frames)
+
+def packed_animation_code(var_prefix, pngs, ms=None):
+    """animation_code for encoded frames, embedding each unique image once
+
+    Repeated and translated frames become frame table entries (frame_packer).
+    """
+    uniques, table = pack_frames(pngs)
+    return animation_code(var_prefix, [png_bytes_to_base64(data) for data in uniques], ms, table)
+
+def frame_delay(var_prefix, ms):
+    """JS expression for how long the current frame stays up
+
+    A single number when every frame shares one duration, else a lookup by
+    the frame index.
+    """
+    if len(set(ms)) == 1:
+        return str(ms[0])
+    return f"[{','.join(map(str, ms))}][window.{var_prefix}_fi]"
+
+def frame_table(table):
+    """JS array of [image] or [image,dx,dy] per frame"""
+    return '[' + ','.join(f"[{i},{dx},{dy}]" if dx or dy else f"[{i}]" for i, dx, dy in table) + ']'
+
+def animation_code(var_prefix, frames_b64, ms=None, table=None):
+    """Compact inline JavaScript cycling through the frame data URIs
+
+    `ms` is the duration of each frame, the idle timing from
+    animation_engine by default. With a frame table ([(image, dx, dy)] per
+    frame, see frame_packer) `frames_b64` holds only the unique images and
+    each frame draws one of them at an offset.
+    """
+    count = len(table) if table else len(frames_b64)
+    ms = ms or idle_ms(count)
     # Compact inline code (no newlines for minified HTML)
     code = (
         f"if(!window.{var_prefix}_f){{"
-        f"window.{var_prefix}_f=[new Image(),new Image(),new Image(),new Image()];"
+        f"window.{var_prefix}_f=[{','.join(['new Image()'] * len(frames_b64))}];"
         f"window.{var_prefix}_fi=0;"
         f"window.{var_prefix}_t=0;"
-        f"window.{var_prefix}_f[0].src='{frames_b64[0]}';"
-        f"window.{var_prefix}_f[1].src='{frames_b64[1]}';"
-        f"window.{var_prefix}_f[2].src='{frames_b64[2]}';"
-        f"window.{var_prefix}_f[3].src='{frames_b64[3]}';"
-        f"}}"
+        + ''.join(f"window.{var_prefix}_f[{i}].src='{uri}';" for i, uri in enumerate(frames_b64))
+        + f"}}"
         f"const n=Date.now();"
-        f"if(n-window.{var_prefix}_t>200){{"
-        f"window.{var_prefix}_fi=(window.{var_prefix}_fi+1)%4;"
+        f"if(n-window.{var_prefix}_t>{frame_delay(var_prefix, ms)}){{"
+        f"window.{var_prefix}_fi=(window.{var_prefix}_fi+1)%{count};"
         f"window.{var_prefix}_t=n;"
         f"}}"
-        f"const cf=window.{var_prefix}_f[window.{var_prefix}_fi];"
-        f"if(cf.complete)ctx.drawImage(cf,0,0,32,32);"
-        f"else px(ctx,8,12,16,10,'rgba(160,154,150,0.3)');"
     )
+    if table:
+        code += (
+            f"const fe={frame_table(table)}[window.{var_prefix}_fi];"
+            f"const cf=window.{var_prefix}_f[fe[0]];"
+            f"if(cf.complete&&cf.naturalWidth)ctx.drawImage(cf,fe[1]|0,fe[2]|0,32,32);"
+        )
+    else:
+        code += (
+            f"const cf=window.{var_prefix}_f[window.{var_prefix}_fi];"
+            f"if(cf.complete&&cf.naturalWidth)ctx.drawImage(cf,0,0,32,32);"
+        )
+    code += "else px(ctx,8,12,16,10,'rgba(160,154,150,0.3)');"
     
     return code
 
-def integrate_monster(html_content, monster_name, var_name):
-    """Replace single monster sprite code"""
-    # Find the case statement for this monster
-    # Pattern: case 'monster':{if(!window._var){...}if(window._var.complete)...else{...}}break;
-    
-    pattern = rf"case\s+'{re.escape(monster_name)}':\s*\{{[^}}]*?if\(!window\.{var_name}\)\{{[^}}]+?}};?[^}}]*?if\(window\.{var_name}\.complete\)[^}}]*?else\{{[^}}]*?}}\s*}}\s*break;"
-    
-    new_code = create_animation_code_inline(monster_name.replace('_', '_'), var_name)
+def integrate_monster(html_content, monster_name, var_name, sprite_name=None, code=None):
+    """Replace single monster sprite code
+
+    `code` overrides the animation code built from the frame PNGs on disk.
+    """
+    new_code = code or create_animation_code_inline(sprite_name or monster_name, var_name)
     
     if not new_code:
         return html_content, 0
     
-    # Create replacement
-    replacement = f"case '{monster_name}':{{{new_code}}}break;"
-    
-    # Try to replace
-    new_html, count = re.subn(pattern, replacement, html_content, count=1, flags=re.DOTALL)
-    
-    return new_html, count
+    new_html, report = patch_html(html_content, cases={monster_name: new_code})
+    return new_html, len(report.applied)
 
 def main():
     """Main integration"""
@@ -74,7 +110,7 @@ def main():
     print("MegaRealms - Animated Sprite Integration V2")
     print("=" * 70)
     
-    html_path = 'index.html'
+    html_path = HTML_PATH
     
     if not os.path.exists(html_path):
         print(f"✗ Error: {html_path} not found")
@@ -88,36 +124,23 @@ def main():
     print(f"   Original size: {original_size:.2f} MB")
     
     # Monster mapping
-    monsters = {
-        'bug': '_bugI',
-        'rat': '_ratI',
-        'cave_rat': '_crI',
-        'snake': '_snkI',
-        'poison_spider': '_pspI',
-        'scorpion': '_scpI',
-        'wolf': '_wlfI',
-        'bear': '_brI',
-        'deer': '_drI',
-        'boar': '_boaI',
-        'troll': '_trlI',
-        'rotworm': '_rwI',
-        'skeleton': '_sklI',
-        'dragon': '_drgI'
-    }
+    monsters = monster_cases()
     
     print(f"\n🔄 Processing {len(monsters)} monsters...\n")
     
-    total_replaced = 0
-    
-    for monster, var in monsters.items():
-        # Try with original name
-        html, count = integrate_monster(html, monster, var)
-        
-        if count > 0:
-            print(f"   ✓ {monster:15s} → animated ({var})")
-            total_replaced += count
+    # Build every case block first, then patch them all in one splice
+    blocks = {}
+    for monster, (sprite, var) in monsters.items():
+        code = create_animation_code_inline(sprite, var)
+        if code:
+            blocks[monster] = code
         else:
-            print(f"   ✗ {monster:15s} → pattern not found")
+            print(f"   ✗ {monster:15s} → frames missing")
+    
+    html, report = patch_html(html, cases=blocks)
+    for line in report.lines():
+        print(f" {line}")
+    total_replaced = len(report.applied)
     
     new_size = len(html) / 1024 / 1024
     size_diff = new_size - original_size
@@ -129,24 +152,15 @@ def main():
     print(f"{'=' * 70}")
     
     if total_replaced > 0:
-        # Backup
-        backup = 'index.html.backup-anim'
-        if not os.path.exists(backup):
-            print(f"\n💾 Creating backup: {backup}")
-            with open(backup, 'w', encoding='utf-8') as f:
-                with open(html_path, 'r', encoding='utf-8') as orig:
-                    f.write(orig.read())
-        
-        # Write
-        print(f"✍️  Writing {html_path}...")
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html)
+        # Write (atomic: the old page stays intact if anything fails)
+        print(f"\n✍️  Writing {html_path}...")
+        write_atomic(html_path, html)
         
         print("\n✅ Done! Features:")
         print("   • Transparent backgrounds (RGBA)")
-        print("   • 4-frame idle animation")
+        print("   • 4-frame idle animation, repeated/shifted frames embedded once")
         print("   • 32×32px optimized")
-        print("   • 200ms frame timing")
+        print(f"   • {'/'.join(map(str, idle_ms(ANIMATION_FRAMES)))}ms frame timing (animation_engine)")
         print("\n🚀 Next: wrangler deploy")
     else:
         print("\n⚠️  No replacements made. Check patterns.")
@@ -5,7 +5,9 @@ Converts PNG files to base64 and updates the HTML
 """
 import os
 import base64
-import re
+
+from html_patcher import patch_html, write_atomic
+from sprite_catalog import HTML_PATH, IMPROVED_DIR, monster_vars
 
 def png_to_base64(file_path):
     """Convert PNG file to base64 data URI"""
@@ -16,56 +18,32 @@ def png_to_base64(file_path):
 
 def integrate_monsters(html_content):
     """Replace monster sprite base64 data in HTML"""
-    monsters = [
-        'bug', 'rat', 'cave_rat', 'snake', 'spider', 
-        'scorpion', 'wolf', 'bear', 'deer', 'boar', 
-        'troll', 'rotworm', 'skeleton', 'dragon'
-    ]
-    
-    # Map monster names to variable names in the code
-    monster_vars = {
-        'bug': '_bugI',
-        'rat': '_ratI',
-        'cave_rat': '_crI',
-        'snake': '_snkI',
-        'spider': '_pspI',  # poison_spider
-        'scorpion': '_scpI',
-        'wolf': '_wlfI',
-        'bear': '_brI',
-        'deer': '_drI',
-        'boar': '_boaI',
-        'troll': '_trlI',
-        'rotworm': '_rwI',
-        'skeleton': '_sklI',
-        'dragon': '_drgI'
-    }
-    
-    replacements = 0
-    for monster, var in monster_vars.items():
-        sprite_path = f'assets/sprites/monsters/improved/{monster}.png'
+    slots = {}
+    for monster, var in monster_vars().items():
+        sprite_path = os.path.join(IMPROVED_DIR, f'{monster}.png')
         
         if not os.path.exists(sprite_path):
             print(f"  ⚠ Skipped {monster}: file not found")
             continue
         
         # Convert to base64
-        b64_data_uri = png_to_base64(sprite_path)
-        
-        # Find and replace in HTML
-        pattern = rf"(window\.{var}\.src=)'data:image/png;base64,[^']+'"
-        replacement = rf"\1'{b64_data_uri}'"
-        
-        new_content, count = re.subn(pattern, replacement, html_content)
-        
-        if count > 0:
-            html_content = new_content
-            replacements += count
-            file_size = os.path.getsize(sprite_path) / 1024
+        slots[var] = png_to_base64(sprite_path)
+    
+    # Replace every slot in one pass over the HTML
+    html_content, report = patch_html(html_content, slots=slots)
+    
+    for monster, var in monster_vars().items():
+        if var not in slots:
+            continue
+        if ('slot', var) in report.applied:
+            file_size = os.path.getsize(os.path.join(IMPROVED_DIR, f'{monster}.png')) / 1024
             print(f"  ✓ {monster:12s} → {var:8s} ({file_size:6.1f} KB)")
+        elif ('slot', var) in report.unmatched:
+            print(f"  ✗ {monster:12s} → {var:8s} (slot not found)")
         else:
-            print(f"  ✗ {monster:12s} → {var:8s} (pattern not found)")
+            print(f"  ✗ {monster:12s} → {var:8s} (duplicate slot, skipped)")
     
-    return html_content, replacements
+    return html_content, len(report.applied)
 
 def main():
     """Main integration process"""
@@ -74,7 +52,7 @@ def main():
     print("=" * 60)
     
     # Read original HTML
-    html_path = 'index.html'
+    html_path = HTML_PATH
     if not os.path.exists(html_path):
         print(f"Error: {html_path} not found")
         return
@@ -102,24 +80,20 @@ def main():
     print(f"Difference:    +{size_diff:7.1f} KB ({size_diff/original_size*100:+.1f}%)")
     print("=" * 60)
     
-    # Backup original
-    backup_path = 'index.html.backup'
-    if not os.path.exists(backup_path):
-        print(f"\nCreating backup: {backup_path}")
-        with open(backup_path, 'w', encoding='utf-8') as f:
-            f.write(original_html)
+    if html_content == original_html:
+        print("\n⚠ Nothing changed, index.html left as is")
+        return
     
-    # Write new HTML
-    print(f"Writing updated {html_path}...")
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    # Write new HTML (atomic: the old page stays intact if anything fails)
+    print(f"\nWriting updated {html_path}...")
+    write_atomic(html_path, html_content)
     
     print("\n✓ Integration complete!")
     print("\nNext steps:")
     print("1. Test the game locally: open index.html in browser")
     print("2. Verify sprites display correctly")
     print("3. Commit and push changes")
-    print("4. If issues occur, restore from backup: mv index.html.backup index.html")
+    print("4. If issues occur, restore with: git checkout index.html")
 
 if __name__ == '__main__':
     main()
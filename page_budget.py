@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Page weight analyzer for MegaRealms index.html
+Breaks the page into embedded images (grouped by variable and owning
+monster), inline scripts, CSS and markup, reports raw/gzip/brotli sizes of
+each, flags duplicate base64 payloads, and fails when a budget is exceeded
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import sys
+
+from extract_sprites import discover_images
+from sprite_catalog import HTML_PATH, monster_cases
+
+try:
+    import brotli
+except ImportError:  # optional; brotli sizes are unavailable and brotli budgets fail
+    brotli = None
+
+PARTS = ['images', 'scripts', 'css', 'markup', 'total']
+METRICS = ['raw', 'gzip', 'brotli']
+BUDGET_PATH = 'assets/sprites/page_budget.json'
+# "<part>.<metric>" -> bytes, used when BUDGET_PATH does not exist; the page
+# is ~540 KB raw today and once shipped at 14 MB by accident (CACHE_FIX.md)
+DEFAULT_BUDGETS = {
+    'total.raw': 1_000_000,
+    'total.gzip': 400_000,
+    'images.raw': 600_000,
+}
+SCRIPT_RE = re.compile(r"<script\b[^>]*>(.*?)</script>", re.S | re.I)
+STYLE_RE = re.compile(r"<style\b[^>]*>(.*?)</style>", re.S | re.I)
+TOP_GROUPS = 15
+
+
+def sizes(text):
+    """{'raw', 'gzip', 'brotli'} byte counts; brotli is None without the module"""
+    data = text.encode('utf-8')
+    return {
+        'raw': len(data),
+        'gzip': len(gzip.compress(data, 9, mtime=0)),
+        'brotli': len(brotli.compress(data, quality=11)) if brotli else None,
+    }
+
+
+def _subtract(spans, holes):
+    """Parts of (start, end) spans not covered by the sorted `holes`"""
+    out = []
+    for start, end in spans:
+        for h_start, h_end in holes:
+            if h_end <= start or h_start >= end:
+                continue
+            if h_start > start:
+                out.append((start, h_start))
+            start = max(start, h_end)
+        if start < end:
+            out.append((start, end))
+    return out
+
+
+def _text(html, spans):
+    return ''.join(html[start:end] for start, end in spans)
+
+
+def image_group(image, cases):
+    """'monster:<name>' for drawMonster cases, else the variable or object key"""
+    if image['case'] in cases:
+        return f"monster:{cases[image['case']][0]}"
+    if image['var']:
+        return f"var:{image['var'].split('[')[0]}"
+    if image['key']:
+        return f"key:{image['key']}"
+    return 'other'
+
+
+def analyze(html):
+    """Size breakdown of a page: parts, image groups and duplicate payloads"""
+    images = discover_images(html)
+    cases = monster_cases()
+    image_spans = []
+    groups = {}
+    payloads = {}
+    for image in images:
+        start = image['offset']
+        end = html.index(';base64,', start) + len(';base64,') + len(image['b64'])
+        image_spans.append((start, end))
+        groups.setdefault(image_group(image, cases), []).append(html[start:end])
+        payloads.setdefault(hashlib.sha256(image['b64'].encode('ascii')).hexdigest(), []).append(image)
+
+    scripts = [m.span(1) for m in SCRIPT_RE.finditer(html)]
+    styles = [m.span(1) for m in STYLE_RE.finditer(html)]
+    script_text = _text(html, _subtract(scripts, image_spans))
+    css_text = _text(html, _subtract(styles, image_spans))
+    markup_text = _text(html, _subtract([(0, len(html))], sorted(image_spans + scripts + styles)))
+
+    duplicates = []
+    for digest, found in payloads.items():
+        if len(found) > 1:
+            duplicates.append({
+                'sha256': digest[:16],
+                'count': len(found),
+                'bytes': len(found[0]['b64']),
+                'wasted': (len(found) - 1) * len(found[0]['b64']),
+                'where': [image_group(image, cases) for image in found],
+            })
+    duplicates.sort(key=lambda d: -d['wasted'])
+
+    return {
+        'parts': {
+            'images': dict(sizes(_text(html, image_spans)), count=len(images)),
+            'scripts': sizes(script_text),
+            'css': sizes(css_text),
+            'markup': sizes(markup_text),
+            'total': sizes(html),
+        },
+        'groups': {name: dict(sizes(''.join(uris)), count=len(uris)) for name, uris in groups.items()},
+        'duplicates': duplicates,
+    }
+
+
+def check_budgets(result, budgets):
+    """[(key, limit, actual)] for every budget the page exceeds
+
+    Budgets that could not be measured are not in here; see unmeasured_budgets.
+    """
+    over = []
+    for key, limit in budgets.items():
+        part, metric = key.split('.')
+        actual = result['parts'][part][metric]
+        if actual is not None and actual > limit:
+            over.append((key, limit, actual))
+    return over
+
+
+def unmeasured_budgets(result, budgets):
+    """Budget keys with no size to check, i.e. brotli ones without the brotli module"""
+    return [key for key in budgets if result['parts'][key.split('.')[0]][key.split('.')[1]] is None]
+
+
+def load_budgets(path=BUDGET_PATH):
+    """Budgets from the JSON config, falling back to DEFAULT_BUDGETS"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict(DEFAULT_BUDGETS)
+
+
+def parse_budget(text):
+    """'part.metric=KB' -> ('part.metric', bytes)"""
+    key, _, value = text.partition('=')
+    part, _, metric = key.partition('.')
+    if part not in PARTS or metric not in METRICS or not value:
+        raise argparse.ArgumentTypeError(f"expected <{'|'.join(PARTS)}>.<{'|'.join(METRICS)}>=KB, got {text!r}")
+    return key, int(float(value) * 1000)
+
+
+def _kb(n):
+    return '—' if n is None else f"{n / 1000:.1f}"
+
+
+def report_lines(result, top=TOP_GROUPS):
+    lines = [f"{'part':24s} {'raw kB':>9s} {'gzip kB':>9s} {'br kB':>9s}"]
+    for part in PARTS:
+        s = result['parts'][part]
+        lines.append(f"  {part:22s} {_kb(s['raw']):>9s} {_kb(s['gzip']):>9s} {_kb(s['brotli']):>9s}")
+    ranked = sorted(result['groups'].items(), key=lambda kv: -kv[1]['raw'])
+    lines.append(f"Largest image groups ({len(ranked)} total)")
+    for name, s in ranked[:top]:
+        lines.append(f"  {name:22s} {_kb(s['raw']):>9s} {_kb(s['gzip']):>9s} {_kb(s['brotli']):>9s}"
+                     f"  ×{s['count']}")
+    if result['duplicates']:
+        wasted = sum(d['wasted'] for d in result['duplicates'])
+        lines.append(f"Duplicate payloads: {len(result['duplicates'])} ({_kb(wasted)} kB raw wasted)")
+        for d in result['duplicates'][:top]:
+            lines.append(f"  {d['sha256']} ×{d['count']} {_kb(d['bytes']):>7s} kB  {', '.join(sorted(set(d['where'])))}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyze and budget the weight of index.html')
+    parser.add_argument('html', nargs='?', default=HTML_PATH, help=f'page to analyze (default: {HTML_PATH})')
+    parser.add_argument('--budget', action='append', type=parse_budget, default=[], metavar='PART.METRIC=KB',
+                        help='override or add a budget, e.g. total.gzip=350 (repeatable)')
+    parser.add_argument('--budgets', default=BUDGET_PATH, help=f'budget config JSON (default: {BUDGET_PATH})')
+    parser.add_argument('--no-budget', action='store_true', help='report only, never fail')
+    parser.add_argument('--json', metavar='PATH', help='also write the breakdown as JSON')
+    args = parser.parse_args(argv)
+
+    with open(args.html, 'r', encoding='utf-8') as f:
+        result = analyze(f.read())
+    print(f"Page weight: {args.html}")
+    for line in report_lines(result):
+        print(line)
+    if brotli is None:
+        print("• brotli module not installed; brotli sizes unavailable")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+
+    if args.no_budget:
+        return 0
+    budgets = dict(load_budgets(args.budgets), **dict(args.budget))
+    over = check_budgets(result, budgets)
+    unmeasured = unmeasured_budgets(result, budgets)
+    for key, limit, actual in over:
+        print(f"✗ {key}: {_kb(actual)} kB exceeds the {_kb(limit)} kB budget")
+    for key in unmeasured:
+        print(f"✗ {key}: budget set but not measurable (pip install brotli)")
+    if over or unmeasured:
+        return 1
+    print("✓ Within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
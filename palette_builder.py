@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Adaptive shared palette for MegaRealms sprites
+Runs mini-batch k-means in L*a*b* over pixels sampled from every sprite's
+keyed full-size art (what the shipped frames are made from),
+snaps the centres toward TIBIA_PALETTE, and picks a small per-sprite subset
+of the shared palette. The result is cached by a hash of the inputs.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from build_cache import hash_file, hash_params
+from palette_quantizer import get_quantizer, srgb_to_lab
+from sprite_catalog import IMPROVED_DIR, monster_names
+
+PALETTE_PATH = 'assets/sprites/palette.json'
+PALETTE_VERSION = 2
+SHARED_COLORS = 16
+SUBSET_COLORS = 6          # matches improve_sprites.MAX_COLORS
+SAMPLE_PER_SPRITE = 2048   # opaque pixels drawn from each sprite
+BATCH_SIZE = 1024
+ITERATIONS = 100
+SNAP_RADIUS = 10.0         # delta E within which a centre becomes the Tibia colour
+SNAP_WEIGHT = 0.25         # pull toward the nearest Tibia colour otherwise
+ALPHA_MIN = 128
+SEED = 0
+
+
+def sprite_pixels(path, limit=SAMPLE_PER_SPRITE, rng=None):
+    """(N, 3) uint8 opaque pixels of one sprite, at most `limit` of them
+
+    Large sources are decoded at a reduced resolution first (sprite_loader),
+    then keyed out like the animate stage so the background is not sampled.
+    """
+    from background_key import key_out_array
+    from fix_transparency_and_animate import FRAME_SIZE, KEY_COLOR, KEY_FEATHER, KEY_THRESHOLD
+    from sprite_loader import load_reduced
+
+    rgba = key_out_array(np.asarray(load_reduced(path, FRAME_SIZE).convert('RGBA')),
+                         KEY_COLOR, KEY_THRESHOLD, KEY_FEATHER)
+    pixels = rgba[rgba[..., 3] >= ALPHA_MIN][:, :3]
+    if rng is not None and len(pixels) > limit:
+        pixels = pixels[rng.choice(len(pixels), limit, replace=False)]
+    return pixels
+
+
+def kmeans_plus_plus(points, k, rng):
+    """k-means++ seeding"""
+    centers = [points[rng.integers(len(points))]]
+    dist = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        if dist.sum() == 0:
+            break
+        centers.append(points[rng.choice(len(points), p=dist / dist.sum())])
+        dist = np.minimum(dist, ((points - centers[-1]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def _nearest(points, centers):
+    return np.argmin(((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1), axis=1)
+
+
+def minibatch_kmeans(points, k, iterations=ITERATIONS, batch_size=BATCH_SIZE, rng=None):
+    """Cluster centres of (N, D) float points (Sculley's mini-batch k-means)
+
+    Each centre moves toward the mean of its batch members with a learning
+    rate of 1 / (points it has seen so far).
+    """
+    rng = rng or np.random.default_rng(SEED)
+    centers = kmeans_plus_plus(points, min(k, len(points)), rng).astype(np.float64)
+    counts = np.zeros(len(centers))
+    for _ in range(iterations):
+        batch = points[rng.integers(0, len(points), min(batch_size, len(points)))]
+        nearest = _nearest(batch, centers)
+        n = np.bincount(nearest, minlength=len(centers))
+        hit = n > 0
+        counts += n
+        sums = np.stack([np.bincount(nearest, batch[:, d], len(centers)) for d in range(points.shape[1])], axis=1)
+        centers[hit] += (sums[hit] / n[hit, None] - centers[hit]) * (n[hit] / counts[hit])[:, None]
+    return centers
+
+
+def snap(colors, reference, radius=SNAP_RADIUS, weight=SNAP_WEIGHT):
+    """Move RGB colours toward their nearest reference colour (by delta E)"""
+    colors = np.asarray(colors, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    lab, ref_lab = srgb_to_lab(colors), srgb_to_lab(reference)
+    dist = np.sqrt(((lab[:, None, :] - ref_lab[None, :, :]) ** 2).sum(axis=-1))
+    nearest = dist.argmin(axis=1)
+    target = reference[nearest]
+    within = dist[np.arange(len(colors)), nearest] <= radius
+    snapped = np.where(within[:, None], target, colors + (target - colors) * weight)
+    return np.clip(np.rint(snapped), 0, 255).astype(np.uint8)
+
+
+def shared_palette(samples, reference, size=SHARED_COLORS, rng=None):
+    """Shared RGB palette for a pixel sample, most used colour first"""
+    centers = minibatch_kmeans(srgb_to_lab(samples), size, rng=rng)
+    labels = _nearest(srgb_to_lab(samples), centers)
+    counts = np.bincount(labels, minlength=len(centers))
+    order = [i for i in np.argsort(-counts, kind='stable') if counts[i]]
+    # Palette colours are the mean sRGB of each cluster, not a Lab round trip
+    means = np.stack([samples[labels == i].mean(axis=0) for i in order])
+    palette = []
+    for color in snap(means, reference):
+        color = tuple(int(v) for v in color)
+        if color not in palette:
+            palette.append(color)
+    return palette
+
+
+def sprite_subset(pixels, palette, size=SUBSET_COLORS):
+    """Indices of the `size` shared colours covering most of a sprite's pixels"""
+    if not len(pixels):
+        return list(range(min(size, len(palette))))
+    counts = np.bincount(get_quantizer(palette).indices(pixels), minlength=len(palette))
+    order = np.argsort(-counts, kind='stable')[:size]
+    return sorted(int(i) for i in order if counts[i]) or [int(order[0])]
+
+
+def palette_params(reference, size=SHARED_COLORS, subset=SUBSET_COLORS):
+    return {
+        'version': PALETTE_VERSION, 'reference': [list(c) for c in reference], 'size': size, 'subset': subset,
+        'sample': SAMPLE_PER_SPRITE, 'batch': BATCH_SIZE, 'iterations': ITERATIONS,
+        'snap_radius': SNAP_RADIUS, 'snap_weight': SNAP_WEIGHT, 'alpha_min': ALPHA_MIN, 'seed': SEED,
+    }
+
+
+def input_hash(paths, params):
+    """Digest of every source file and the palette parameters"""
+    digest = hashlib.sha256(hash_params(params).encode('ascii'))
+    for name, path in sorted(paths.items()):
+        digest.update(f"{name}:{hash_file(path)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def build_palette(paths, reference, size=SHARED_COLORS, subset=SUBSET_COLORS, cache_path=PALETTE_PATH):
+    """{'shared': [rgb], 'subsets': {name: [index]}, ...} for {name: source path}
+
+    Reuses cache_path when its input hash matches. Returns (result, cached).
+    """
+    params = palette_params(reference, size, subset)
+    key = input_hash(paths, params)
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('input_hash') == key:
+            return cached, True
+
+    rng = np.random.default_rng(SEED)
+    pixels = {name: sprite_pixels(path, rng=rng) for name, path in sorted(paths.items())}
+    samples = np.concatenate([p for p in pixels.values() if len(p)] or [np.zeros((1, 3), np.uint8)])
+    shared = shared_palette(samples, reference, size, rng)
+    result = {
+        'input_hash': key,
+        'shared': [list(c) for c in shared],
+        'subsets': {name: sprite_subset(p, shared, subset) for name, p in pixels.items()},
+    }
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+        os.replace(tmp_path, cache_path)
+    return result, False
+
+
+def subset_colors(result, name):
+    """RGB colours of one sprite's subset, or None when it has none"""
+    indices = result['subsets'].get(name)
+    return [tuple(result['shared'][i]) for i in indices] if indices else None
+
+
+def monster_sources(names=None):
+    return {name: os.path.join(IMPROVED_DIR, f'{name}.png') for name in (names or monster_names())
+            if os.path.exists(os.path.join(IMPROVED_DIR, f'{name}.png'))}
+
+
+def main():
+    from improve_sprites import TIBIA_PALETTE
+
+    parser = argparse.ArgumentParser(description='Build an adaptive shared palette for the monster sprites')
+    parser.add_argument('--size', type=int, default=SHARED_COLORS, help='shared palette colours')
+    parser.add_argument('--subset', type=int, default=SUBSET_COLORS, help='colours per sprite')
+    parser.add_argument('--out', default=PALETTE_PATH, help=f'palette JSON (default: {PALETTE_PATH})')
+    args = parser.parse_args()
+
+    result, cached = build_palette(monster_sources(), list(TIBIA_PALETTE.values()), args.size, args.subset, args.out)
+    tibia = {tuple(c) for c in TIBIA_PALETTE.values()}
+    print(f"✓ Shared palette: {len(result['shared'])} colours "
+          f"({sum(tuple(c) in tibia for c in result['shared'])} exact Tibia){' (cached)' if cached else ''}")
+    for color in result['shared']:
+        print(f"  #{color[0]:02x}{color[1]:02x}{color[2]:02x}{'  tibia' if tuple(color) in tibia else ''}")
+    for name, subset in result['subsets'].items():
+        print(f"  {name:12s} {subset}")
+    print(f"  → {args.out}")
+
+
+if __name__ == '__main__':
+    main()
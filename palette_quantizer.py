@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Batched palette quantization for MegaRealms sprites
+Maps whole images to a fixed palette through a cached RGB -> index lookup table
+"""
+import numpy as np
+from PIL import Image
+
+# One slot per 24-bit RGB colour; 255 marks "not resolved yet"
+LUT_SIZE = 1 << 24
+UNRESOLVED = 255
+
+_quantizers = {}
+
+
+def pack_rgb(rgb):
+    """Pack an (..., 3) uint8 array into 24-bit integer keys"""
+    rgb = rgb.astype(np.uint32)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def unpack_rgb(keys):
+    """Inverse of pack_rgb"""
+    keys = keys.astype(np.uint32)
+    return np.stack([(keys >> 16) & 0xFF, (keys >> 8) & 0xFF, keys & 0xFF], axis=-1)
+
+
+def srgb_to_lab(rgb):
+    """Convert (..., 3) sRGB values (0-255) to CIE L*a*b* (D65)"""
+    c = rgb.astype(np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    m = np.array([
+        [0.4124564, 0.3575761, 0.1804375],
+        [0.2126729, 0.7151522, 0.0721750],
+        [0.0193339, 0.1191920, 0.9503041],
+    ])
+    xyz = c @ m.T
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    L = 116 * f[..., 1] - 16
+    a = 500 * (f[..., 0] - f[..., 1])
+    b = 200 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+class PaletteQuantizer:
+    """Nearest-colour mapper for one palette
+
+    Distances are only ever computed once per distinct RGB value; the
+    result is stored in a 16M-entry lookup table, so every later sprite
+    that reuses a colour costs a single table gather.
+    """
+
+    def __init__(self, palette, mode='rgb'):
+        if mode not in ('rgb', 'lab'):
+            raise ValueError(f"Unknown distance mode: {mode}")
+        palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if not 0 < len(palette) < UNRESOLVED:
+            raise ValueError(f"Palette must have 1-{UNRESOLVED - 1} colours, got {len(palette)}")
+
+        self.palette = palette
+        self.mode = mode
+        self.lut = np.full(LUT_SIZE, UNRESOLVED, dtype=np.uint8)
+
+        if mode == 'lab':
+            self._reference = srgb_to_lab(palette)
+        else:
+            self._reference = palette.astype(np.int64)
+
+    def _nearest(self, keys):
+        """Palette index of the closest colour for each packed key"""
+        rgb = unpack_rgb(keys)
+        if self.mode == 'lab':
+            diff = srgb_to_lab(rgb)[:, None, :] - self._reference[None, :, :]
+        else:
+            # Squared integer distances rank exactly like np.linalg.norm,
+            # and argmin keeps the first palette entry on ties
+            diff = rgb.astype(np.int64)[:, None, :] - self._reference[None, :, :]
+        return np.argmin((diff * diff).sum(axis=-1), axis=1).astype(np.uint8)
+
+    def indices(self, rgb):
+        """Map an (..., 3) uint8 array to palette indices of shape (...)"""
+        keys = pack_rgb(np.asarray(rgb))
+        idx = self.lut[keys]
+        missing = idx == UNRESOLVED
+        if missing.any():
+            new_keys = np.unique(keys[missing])
+            self.lut[new_keys] = self._nearest(new_keys)
+            idx = self.lut[keys]
+        return idx
+
+    def quantize_array(self, rgb):
+        """Map an (..., 3) uint8 array to palette colours"""
+        return self.palette[self.indices(rgb)]
+
+    def quantize(self, img):
+        """Quantize a PIL image, preserving its alpha channel"""
+        result = Image.fromarray(self.quantize_array(np.array(img.convert('RGB'))))
+        if img.mode == 'RGBA':
+            result.putalpha(img.split()[3])
+        return result
+
+    def quantize_batch(self, images):
+        """Quantize several same-sized PIL images in one table gather"""
+        if not images:
+            return []
+        stack = np.stack([np.array(img.convert('RGB')) for img in images])
+        quantized = self.quantize_array(stack)
+        results = []
+        for img, rgb in zip(images, quantized):
+            result = Image.fromarray(rgb)
+            if img.mode == 'RGBA':
+                result.putalpha(img.split()[3])
+            results.append(result)
+        return results
+
+
+def get_quantizer(palette, mode='rgb'):
+    """Return the shared quantizer for a palette, building its table once"""
+    key = (tuple(tuple(int(v) for v in color) for color in palette), mode)
+    quantizer = _quantizers.get(key)
+    if quantizer is None:
+        quantizer = PaletteQuantizer(palette, mode)
+        _quantizers[key] = quantizer
+    return quantizer
+
+
+def quantize_image(img, palette, mode='rgb'):
+    """Quantize a PIL image to the given list of RGB colours"""
+    return get_quantizer(palette, mode).quantize(img)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Smallest-output PNG encoder for MegaRealms sprites
+Writes palette PNGs (with tRNS for alpha) when the colour count allows,
+tries every filter mode and zlib strategy, and keeps the smallest result.
+Lossless WebP can optionally be compared as well.
+"""
+import argparse
+import glob
+import io
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, features
+
+# Bump when output bytes change, so build manifests rebuild
+ENCODER_VERSION = 1
+
+FILTERS = [0, 1, 2, 3, 4, 'adaptive']
+STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+# Above this many pixels only the usually-winning combinations are tried
+FULL_SEARCH_PIXELS = 128 * 128
+FAST_FILTERS = [0, 'adaptive']
+FAST_STRATEGIES = {name: STRATEGIES[name] for name in ('default', 'filtered')}
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+
+def _paeth(a, b, c):
+    a, b, c = (x.astype(np.int16) for x in (a, b, c))
+    p = a + b - c
+    pa, pb, pc = np.abs(p - a), np.abs(p - b), np.abs(p - c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+
+
+def filter_rows(raw, bpp):
+    """All five PNG filters applied to every row at once
+
+    raw: (H, stride) uint8. Returns (5, H, stride) uint8, indexed by filter type.
+    """
+    left = np.zeros_like(raw)
+    left[:, bpp:] = raw[:, :-bpp]
+    up = np.zeros_like(raw)
+    up[1:] = raw[:-1]
+    upleft = np.zeros_like(raw)
+    upleft[1:, bpp:] = raw[:-1, :-bpp]
+
+    avg = ((left.astype(np.uint16) + up) >> 1).astype(np.uint8)
+    return np.stack([
+        raw,
+        raw - left,
+        raw - up,
+        raw - avg,
+        raw - _paeth(left, up, upleft),
+    ])
+
+
+def filtered_scanlines(raw, bpp, mode):
+    """Scanlines with their filter-type byte for one filter mode"""
+    candidates = filter_rows(raw, bpp)
+    if mode == 'adaptive':
+        # Minimum sum of absolute differences, the usual heuristic
+        cost = np.abs(candidates.view(np.int8).astype(np.int32)).sum(axis=2)
+        types = cost.argmin(axis=0)
+    else:
+        types = np.full(raw.shape[0], mode)
+    rows = candidates[types, np.arange(raw.shape[0])]
+    return np.hstack([types.astype(np.uint8)[:, None], rows]).tobytes()
+
+
+def pack_indices(indices, bit_depth):
+    """Pack (H, W) palette indices into PNG rows of bit_depth bits"""
+    if bit_depth == 8:
+        return indices.astype(np.uint8)
+    per_byte = 8 // bit_depth
+    h, w = indices.shape
+    padded = np.zeros((h, -(-w // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :w] = indices
+    groups = padded.reshape(h, -1, per_byte)
+    shifts = (8 - bit_depth * (np.arange(per_byte) + 1)).astype(np.uint8)
+    return np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8)
+
+
+def palette_layout(rgba):
+    """Palette, tRNS alphas and (H, W) indices, or None above 256 colours
+
+    Translucent entries go first so the tRNS chunk stays as short as
+    possible; within each group the most frequent colours come first.
+    """
+    flat = rgba.reshape(-1, 4)
+    colors, inverse, counts = np.unique(flat.view(np.uint32).ravel(), return_inverse=True,
+                                        return_counts=True)
+    if len(colors) > 256:
+        return None
+    entries = colors.view(np.uint8).reshape(-1, 4)
+    order = np.lexsort((-counts, entries[:, 3] == 255))
+    remap = np.empty(len(order), dtype=np.uint8)
+    remap[order] = np.arange(len(order), dtype=np.uint8)
+    entries = entries[order]
+
+    alphas = entries[:, 3]
+    translucent = np.nonzero(alphas < 255)[0]
+    trns = alphas[:translucent[-1] + 1].tobytes() if len(translucent) else b''
+    indices = remap[inverse.reshape(rgba.shape[:2])]
+    return entries[:, :3].tobytes(), trns, indices
+
+
+def _layouts(rgba):
+    """(name, IHDR colour type, bit depth, bpp, raw rows, extra chunks) per usable layout"""
+    h, w = rgba.shape[:2]
+    opaque = bool((rgba[..., 3] == 255).all())
+
+    palette = palette_layout(rgba)
+    if palette is not None:
+        plte, trns, indices = palette
+        n = len(plte) // 3
+        bit_depth = next(d for d in (1, 2, 4, 8) if n <= 1 << d)
+        chunks = [(b'PLTE', plte)] + ([(b'tRNS', trns)] if trns else [])
+        yield 'palette', 3, bit_depth, 1, pack_indices(indices, bit_depth), chunks
+
+    if opaque:
+        yield 'rgb', 2, 8, 3, np.ascontiguousarray(rgba[..., :3]).reshape(h, w * 3), []
+    else:
+        yield 'rgba', 6, 8, 4, np.ascontiguousarray(rgba).reshape(h, w * 4), []
+
+
+def encode_png(image, filters=None, strategies=None):
+    """Smallest lossless PNG for an image or (H, W, 4) array
+
+    Sprite-sized images get the full filter x strategy search; large ones a
+    reduced set unless filters/strategies are given explicitly.
+    Returns (png bytes, description of the winning settings).
+    """
+    rgba = np.asarray(image.convert('RGBA')) if isinstance(image, Image.Image) else image
+    rgba = np.ascontiguousarray(rgba, dtype=np.uint8)
+    h, w = rgba.shape[:2]
+    small = h * w <= FULL_SEARCH_PIXELS
+    filters = filters or (FILTERS if small else FAST_FILTERS)
+    strategies = strategies or (STRATEGIES if small else FAST_STRATEGIES)
+
+    best = None
+    for name, color_type, bit_depth, bpp, raw, chunks in _layouts(rgba):
+        ihdr = struct.pack('>IIBBBBB', w, h, bit_depth, color_type, 0, 0, 0)
+        head = PNG_SIGNATURE + _chunk(b'IHDR', ihdr) + b''.join(_chunk(k, d) for k, d in chunks)
+        for mode in filters:
+            scanlines = filtered_scanlines(raw, bpp, mode)
+            for strategy_name, strategy in strategies.items():
+                compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9, strategy)
+                idat = compressor.compress(scanlines) + compressor.flush()
+                size = len(head) + len(idat) + 24
+                if best is None or size < best[0]:
+                    best = (size, head, idat, f'{name}/{bit_depth}bit filter={mode} zlib={strategy_name}')
+
+    _, head, idat, detail = best
+    return head + _chunk(b'IDAT', idat) + _chunk(b'IEND', b''), detail
+
+
+def encode_webp(image):
+    """Lossless WebP bytes, or None if Pillow was built without WebP"""
+    if not features.check('webp'):
+        return None
+    buf = io.BytesIO()
+    image.convert('RGBA').save(buf, 'WEBP', lossless=True, quality=100, method=6, exact=True)
+    return buf.getvalue()
+
+
+def save_png(image, path):
+    """Write the smallest PNG encoding of image to path; returns its size"""
+    data, _ = encode_png(image)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def recompress_file(path, webp=False):
+    """Re-encode one PNG in place if that makes it smaller
+
+    Returns (old size, new size, detail, webp size or None).
+    """
+    with open(path, 'rb') as f:
+        original = f.read()
+    with Image.open(io.BytesIO(original)) as img:
+        img = img.convert('RGBA')
+    data, detail = encode_png(img)
+    if len(data) < len(original):
+        with open(path, 'wb') as f:
+            f.write(data)
+    else:
+        data, detail = original, 'kept original'
+    webp_size = None
+    if webp:
+        webp_data = encode_webp(img)
+        webp_size = len(webp_data) if webp_data else None
+    return len(original), len(data), detail, webp_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-encode sprite PNGs at their smallest lossless size')
+    parser.add_argument('paths', nargs='*',
+                        default=['assets/sprites/monsters/improved', 'assets/sprites/monsters/animated'],
+                        help='PNG files or directories (default: improved and animated monsters)')
+    parser.add_argument('--webp', action='store_true', help='also report lossless WebP sizes')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, '*.png'))) if os.path.isdir(path) else [path])
+
+    total_before = total_after = 0
+    for path in files:
+        before, after, detail, webp_size = recompress_file(path, args.webp)
+        total_before += before
+        total_after += after
+        line = f"  {os.path.basename(path):28s} {before:7d} → {after:7d} B  (-{before - after:5d})  {detail}"
+        if webp_size is not None:
+            line += f"  webp {webp_size} B"
+        print(line)
+
+    print(f"\n✓ {len(files)} files: {total_before} → {total_after} bytes "
+          f"({total_before - total_after} saved, ≈{(total_before - total_after) * 4 // 3} in base64)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+1x/2x/3x sprite variants for HiDPI clients
+Decodes each monster source and tile once and builds every scale from
+that one array. Monsters start from the same full-size art as the animate
+stage and go through the same key-out and resize, so @1x matches the shipped
+frames. A scale the source is too small for is built at the largest scale
+it supports and enlarged with Scale2x/Scale3x, which keep pixel-art edges
+sharp. A manifest lists the files per scale so the client can pick the
+set matching devicePixelRatio.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from build_cache import BuildCache
+from sprite_catalog import IMPROVED_DIR, TILES_DIR, monster_names
+
+SCALES = (1, 2, 3)
+BASE_SIZE = 32
+VARIANTS_DIR = 'assets/sprites/variants'
+RESOLUTION_MANIFEST = 'assets/sprites/resolutions.json'
+VARIANTS_VERSION = 2
+
+
+# ------------------------------------------------------- pixel-art scaling ---
+
+def _neighbours(arr):
+    """Packed RGBA of every pixel's 3x3 neighbourhood, edges replicated
+
+    Returns A B C / D E F / G H I as (H, W) uint32 arrays.
+    """
+    packed = np.ascontiguousarray(arr, dtype=np.uint8).view(np.uint32)[..., 0]
+    padded = np.pad(packed, 1, mode='edge')
+    height, width = packed.shape
+    return [padded[y:y + height, x:x + width] for y in range(3) for x in range(3)]
+
+
+def _assemble(blocks, factor):
+    """Interleave factor*factor (H, W) packed blocks into an (H*f, W*f, 4) image"""
+    height, width = blocks[0].shape
+    out = np.stack(blocks).reshape(factor, factor, height, width).transpose(2, 0, 3, 1)
+    return np.ascontiguousarray(out).reshape(height * factor, width * factor).view(np.uint8).reshape(
+        height * factor, width * factor, 4)
+
+
+def scale2x(arr):
+    """Scale2x (EPX) of an (H, W, 4) uint8 image"""
+    a, b, c, d, e, f, g, h, i = _neighbours(arr)
+    edge = (b != h) & (d != f)
+    return _assemble([
+        np.where(edge & (d == b), d, e), np.where(edge & (b == f), f, e),
+        np.where(edge & (d == h), d, e), np.where(edge & (h == f), f, e),
+    ], 2)
+
+
+def scale3x(arr):
+    """Scale3x (AdvMAME3x) of an (H, W, 4) uint8 image"""
+    a, b, c, d, e, f, g, h, i = _neighbours(arr)
+    edge = (b != h) & (d != f)
+    db, bf, dh, hf = d == b, b == f, d == h, h == f
+    return _assemble([
+        np.where(edge & db, d, e),
+        np.where(edge & ((db & (e != c)) | (bf & (e != a))), b, e),
+        np.where(edge & bf, f, e),
+        np.where(edge & ((db & (e != g)) | (dh & (e != a))), d, e),
+        e,
+        np.where(edge & ((bf & (e != i)) | (hf & (e != c))), f, e),
+        np.where(edge & dh, d, e),
+        np.where(edge & ((dh & (e != i)) | (hf & (e != g))), h, e),
+        np.where(edge & hf, f, e),
+    ], 3)
+
+
+def upscale(arr, factor):
+    """Pixel-art enlargement by an integer factor (Scale2x/3x, nearest beyond)"""
+    if factor == 1:
+        return arr
+    if factor == 2:
+        return scale2x(arr)
+    if factor == 3:
+        return scale3x(arr)
+    if factor % 2 == 0:
+        return upscale(scale2x(arr), factor // 2)
+    return np.repeat(np.repeat(arr, factor, axis=0), factor, axis=1)
+
+
+def working_scale(source_size, scale):
+    """Largest divisor of `scale` the source is big enough to process at directly"""
+    fits = [w for w in range(scale, 0, -1) if scale % w == 0 and min(source_size) >= BASE_SIZE * w]
+    return fits[0] if fits else 1
+
+
+def scale_for(dpr, scales=SCALES):
+    """Scale a client at devicePixelRatio `dpr` should load
+
+    The smallest scale at least as dense as the screen, else the largest.
+    Mirrors the rule documented in the manifest.
+    """
+    return next((s for s in sorted(scales) if s >= dpr), max(scales))
+
+
+# ------------------------------------------------------------------ monsters ---
+
+def monster_base(keyed, scale):
+    """Keyed (H, W, 4) monster resized to BASE_SIZE * scale
+
+    The animate stage's resize: at scale 1 this is exactly the frame
+    process_sprite writes before adding the idle bob.
+    """
+    from PIL import Image
+
+    from background_key import resize_keyed
+    from fix_transparency_and_animate import FRAME_RESAMPLE
+
+    size = BASE_SIZE * scale
+    return np.asarray(resize_keyed(Image.fromarray(keyed, 'RGBA'), (size, size), FRAME_RESAMPLE))
+
+
+def scaled_animation(spec, factor):
+    """An animation_engine spec with its pixel offsets multiplied by `factor`"""
+    return {k: ([v * factor for v in spec[k]] if k in ('dx', 'dy') else spec[k]) for k in spec}
+
+
+def monster_variants(image, scales=SCALES):
+    """{scale: [encoded idle frames]} of one decoded (H, W, 4) source
+
+    The background is keyed out once at full size, as in process_sprite,
+    and every scale is resized from that.
+    """
+    from animation_engine import ANIMATIONS, render
+    from background_key import key_out_array
+    from fix_transparency_and_animate import KEY_COLOR, KEY_FEATHER, KEY_THRESHOLD
+    from png_encoder import encode_png
+    from sprite_catalog import ANIMATION_FRAMES
+
+    keyed = key_out_array(image, KEY_COLOR, KEY_THRESHOLD, KEY_FEATHER)
+    bases = {}
+    out = {}
+    for scale in scales:
+        work = working_scale(image.shape[:2], scale)
+        if work not in bases:
+            bases[work] = monster_base(keyed, work)
+        sprite = upscale(bases[work], scale // work)
+        frames = render(sprite[None], scaled_animation(ANIMATIONS['idle'], scale), ANIMATION_FRAMES)[0]
+        out[scale] = [encode_png(frame)[0] for frame in frames]
+    return out
+
+
+# --------------------------------------------------------------------- tiles ---
+
+def tile_variants(image, scales=SCALES):
+    """{scale: encoded tile} of one decoded (H, W, 4) tile"""
+    from PIL import Image
+
+    from png_encoder import encode_png
+
+    out = {}
+    for scale in scales:
+        work = working_scale(image.shape[:2], scale)
+        base = np.asarray(Image.fromarray(image, 'RGBA').resize(
+            (BASE_SIZE * work, BASE_SIZE * work), Image.Resampling.BOX))
+        out[scale] = encode_png(upscale(base, scale // work))[0]
+    return out
+
+
+# --------------------------------------------------------------------- build ---
+
+def variant_path(kind, name, scale, frame=None, out_dir=VARIANTS_DIR):
+    suffix = '' if frame is None else f'_frame{frame}'
+    return os.path.join(out_dir, kind, f'{name}@{scale}x{suffix}.png')
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _decode(path):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return np.array(img.convert('RGBA'))
+
+
+def build(names=None, tiles=True, scales=SCALES, out_dir=VARIANTS_DIR, manifest_path=RESOLUTION_MANIFEST,
+          cache=None):
+    """Build the variants of `names` (all monsters by default) and the tiles
+
+    Sources whose inputs and parameters are unchanged are skipped through
+    the build cache. Returns the manifest.
+    """
+    from animation_engine import ANIMATIONS
+    from fix_transparency_and_animate import animate_params
+    from sprite_catalog import ANIMATION_FRAMES
+
+    owns_cache = cache is None
+    cache = cache or BuildCache()
+    scales = tuple(sorted(scales))
+    manifest = {'version': VARIANTS_VERSION, 'base_size': BASE_SIZE, 'scales': list(scales),
+                'select': 'smallest scale >= devicePixelRatio, else the largest', 'monsters': {}, 'tiles': {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous.get('scales') == list(scales):
+            manifest['monsters'].update(previous.get('monsters', {}))
+            manifest['tiles'].update(previous.get('tiles', {}))
+
+    params = {'version': VARIANTS_VERSION, 'scales': list(scales), 'animation': ANIMATIONS['idle'],
+              'animate': animate_params()}
+    for name in names or monster_names():
+        source = os.path.join(IMPROVED_DIR, f'{name}.png')
+        if not os.path.exists(source):
+            continue
+        paths = {s: [variant_path('monsters', name, s, f, out_dir) for f in range(ANIMATION_FRAMES)]
+                 for s in scales}
+
+        def run_monster(source=source, paths=paths):
+            for scale, frames in monster_variants(_decode(source), scales).items():
+                for path, data in zip(paths[scale], frames):
+                    _write(path, data)
+
+        cache.run('variants', name, [source], params, [p for ps in paths.values() for p in ps], run_monster)
+        manifest['monsters'][name] = {str(s): [p.replace(os.sep, '/') for p in ps] for s, ps in paths.items()}
+
+    if tiles and os.path.isdir(TILES_DIR):
+        for filename in sorted(os.listdir(TILES_DIR)):
+            if not filename.endswith('.png'):
+                continue
+            name = filename[:-4]
+            source = os.path.join(TILES_DIR, filename)
+            paths = {s: variant_path('tiles', name, s, out_dir=out_dir) for s in scales}
+
+            def run_tile(source=source, paths=paths):
+                for scale, data in tile_variants(_decode(source), scales).items():
+                    _write(paths[scale], data)
+
+            cache.run('variants', f'tile:{name}', [source], params, list(paths.values()), run_tile)
+            manifest['tiles'][name] = {str(s): p.replace(os.sep, '/') for s, p in paths.items()}
+
+    if owns_cache:
+        cache.save()
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def parse_scales(text):
+    try:
+        scales = sorted({int(s) for s in text.split(',') if s})
+    except ValueError:
+        scales = []
+    if not scales or scales[0] < 1:
+        raise argparse.ArgumentTypeError(f"expected comma-separated positive integers, got {text!r}")
+    return scales
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build 1x/2x/3x variants of every monster and tile')
+    parser.add_argument('--scales', type=parse_scales, default=list(SCALES),
+                        help=f"comma-separated scales (default: {','.join(map(str, SCALES))})")
+    parser.add_argument('--only', default='', help='comma-separated sprite names (default: all)')
+    parser.add_argument('--no-tiles', action='store_true', help='monsters only')
+    parser.add_argument('--force', action='store_true', help='ignore the build cache')
+    args = parser.parse_args()
+
+    cache = BuildCache(force=args.force)
+    names = [n for n in args.only.split(',') if n] or None
+    manifest = build(names, not args.no_tiles, args.scales, cache=cache)
+    cache.save()
+    print(f"✓ {len(manifest['monsters'])} monsters, {len(manifest['tiles'])} tiles at "
+          f"{', '.join(f'{s}x' for s in manifest['scales'])}")
+    print(cache.summary())
+    print(f"  → {VARIANTS_DIR}/, {RESOLUTION_MANIFEST}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Per-floor lazy sprite bundles for MegaRealms
+Works out which monsters (spawn zones in index.html, checked against MONS in
+game-data.js) and tile types (the generated floors) each floor needs, moves
+the monsters' embedded images out of index.html into one content-hashed
+bundle per floor plus an always-loaded core bundle, and patches the client
+to fetch a floor's bundle when the player enters it
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+from externalize_sprites import HASHED_DIR
+from extract_sprites import discover_images
+from sprite_catalog import HTML_PATH
+
+GAME_DATA_PATH = 'game-data.js'
+BUNDLE_MANIFEST = 'assets/sprites/bundles.json'
+CORE = 'core'
+ZONE_TABLES = ['ZONES', 'PREM_ZONES', 'TOWER_ZONES']
+# A failed bundle fetch is retried after BUNDLE_RETRY_MS * attempt
+BUNDLE_RETRIES = 3
+BUNDLE_RETRY_MS = 2000
+
+BUNDLE_BEGIN = '// ============ SPRITE BUNDLES (generated by sprite_bundles.py) ============\n'
+BUNDLE_END = '// ============ END SPRITE BUNDLES ============\n'
+BUNDLE_ANCHOR = 'function getFloorZones(f){'
+# Where the client learns which floor it is about to show: (pattern, replacement)
+FLOOR_HOOKS = [
+    ("const oldFloor=G.floor;", "loadFloorSprites(newFloor);const oldFloor=G.floor;"),
+    ("G.floor=data.floor||0;", "G.floor=data.floor||0;loadFloorSprites(G.floor);"),
+    ("G.floor=0;\n  G.player=new Player(name,voc);", "G.floor=0;loadFloorSprites(0);\n  G.player=new Player(name,voc);"),
+]
+
+ZONE_RE = re.compile(r"(\w+):\{(?:[^{}]|\{[^{}]*\})*\}")
+ZONE_ID_RE = re.compile(r"\bid:'([\w$]+)'")
+MONS_KEY_RE = re.compile(r"(?:^|[{,])\s*([\w$]+):\{n:'")
+# Draw guards in case blocks; a bundled slot is '' (complete, but broken) until it loads
+COMPLETE_RE = re.compile(r"if\((window\.[\w$]+|cf)\.complete\)")
+
+
+def _object_body(text, name):
+    """Source of the object literal assigned to `const <name>=`"""
+    from html_patcher import match_brace
+
+    match = re.search(rf"\bconst {name}\s*=\s*\{{", text)
+    if not match:
+        raise LookupError(f"{name} not found")
+    return text[match.end():match_brace(text, match.end() - 1)]
+
+
+def zone_floor(key):
+    """Floor a zone key belongs to, mirroring getFloorZones(): f0_* and fN"""
+    match = re.fullmatch(r"f(\d+)(?:_\w+)?", key)
+    if not match or ('_' in key and match.group(1) != '0'):
+        return None
+    return int(match.group(1))
+
+
+def floor_monsters(html):
+    """{floor: sorted monster ids} from the spawn zone tables"""
+    floors = {}
+    for table in ZONE_TABLES:
+        for zone in ZONE_RE.finditer(_object_body(html, table)):
+            floor = zone_floor(zone.group(1))
+            if floor is not None:
+                floors.setdefault(floor, set()).update(ZONE_ID_RE.findall(zone.group(0)))
+    return {floor: sorted(ids) for floor, ids in sorted(floors.items())}
+
+
+def known_monsters(source):
+    """Monster ids defined in the MONS table of a page or script"""
+    return set(MONS_KEY_RE.findall(_object_body(source, 'MONS')))
+
+
+def floor_tiles(html):
+    """{floor: sorted TT names present}, from assets/maps when generated, else generated now"""
+    from world_generator import (DEFAULT_SEED, MAP_MANIFEST, decode_floor, generate_floor, js_constants,
+                                 seeded_random)
+
+    consts = js_constants(html)
+    names = {v: k for k, v in consts['TT'].items()}
+    files = {}
+    if os.path.exists(MAP_MANIFEST):
+        with open(MAP_MANIFEST, 'r', encoding='utf-8') as f:
+            files = {int(k): v['path'] for k, v in json.load(f)['floors'].items()}
+
+    out = {}
+    for floor in range(consts['FLOORS']):
+        if floor in files and os.path.exists(files[floor]):
+            with open(files[floor], 'rb') as f:
+                tiles = decode_floor(f.read())[1]
+        else:
+            tiles = generate_floor(floor, consts, seeded_random(DEFAULT_SEED, floor))
+        out[floor] = sorted(names[int(t)] for t in set(tiles.ravel().tolist()))
+    return out
+
+
+def plan_bundles(html, floors):
+    """{bundle name: {slot variable: data URI}} for the core and every floor
+
+    Images owned by a drawMonster case of a spawning monster go to the
+    bundles of the floors it spawns on; other window.* slots (NPCs) go to
+    the core bundle. Item icons in ITEMS stay in the page.
+    """
+    spawning = {mon for mons in floors.values() for mon in mons}
+    bundles = {CORE: {}}
+    bundles.update({str(floor): {} for floor in floors})
+    for image in discover_images(html):
+        if not image['var']:
+            continue
+        uri = f"data:image/{image['format']};base64,{image['b64']}"
+        if image['case'] in spawning:
+            for floor, mons in floors.items():
+                if image['case'] in mons:
+                    bundles[str(floor)][image['var']] = uri
+        else:
+            bundles[CORE][image['var']] = uri
+    return bundles
+
+
+def load_bundles(manifest_path=BUNDLE_MANIFEST):
+    """{bundle name: {slot: data URI}} from the files of a previous run"""
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    bundles = {}
+    entries = dict(manifest['floors'], **{CORE: manifest[CORE]})
+    for name, entry in entries.items():
+        if entry['bundle'] and os.path.exists(entry['bundle']):
+            with open(entry['bundle'], 'r', encoding='utf-8') as f:
+                bundles[name] = json.load(f)
+    return bundles
+
+
+def write_bundles(bundles, out_dir=HASHED_DIR):
+    """Save each non-empty bundle as bundle-<name>-<hash>.json; {name: path}"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, sprites in bundles.items():
+        if not sprites:
+            continue
+        data = json.dumps(sprites, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        path = os.path.join(out_dir, f'bundle-{name}-{hashlib.sha256(data).hexdigest()[:16]}.json')
+        if not os.path.exists(path):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        paths[name] = path.replace(os.sep, '/')
+    return paths
+
+
+def bundle_js(paths):
+    """Client loader: core at startup, a floor's bundle when it is entered"""
+    entries = ','.join(f"{json.dumps(name)}:{json.dumps(path)}" for name, path in paths.items())
+    return (
+        BUNDLE_BEGIN
+        + f"const SPRITE_BUNDLES={{{entries}}};\n"
+        + f"const BUNDLE_RETRIES={BUNDLE_RETRIES},BUNDLE_RETRY_MS={BUNDLE_RETRY_MS};\n"
+        + "const SPRITE_SRC={},BUNDLE_LOADS={};\n"
+          "function spriteSrc(v){return SPRITE_SRC[v]||'';}\n"
+          "function applySprite(v,uri){\n"
+          "  SPRITE_SRC[v]=uri;const m=v.match(/^([\\w$]+)\\[(\\d+)\\]$/);\n"
+          "  const o=m?(window[m[1]]&&window[m[1]][+m[2]]):window[v];if(o&&o.src!==uri)o.src=uri;\n"
+          "}\n"
+          "function loadSpriteBundle(k,n){\n"
+          "  const u=SPRITE_BUNDLES[k];if(!u)return Promise.resolve();\n"
+          "  return BUNDLE_LOADS[k]||(BUNDLE_LOADS[k]=fetch(u)"
+          ".then(r=>{if(!r.ok)throw new Error('HTTP '+r.status);return r.json();})"
+          ".then(b=>{for(const v in b)applySprite(v,b[v]);}).catch(e=>{\n"
+          "    delete BUNDLE_LOADS[k];n=(n||0)+1;const retry=n<BUNDLE_RETRIES;\n"
+          "    console.warn('sprite bundle '+k+' failed: '+e.message+(retry?', retrying':''));\n"
+          "    if(retry)return new Promise(r=>setTimeout(r,BUNDLE_RETRY_MS*n)).then(()=>loadSpriteBundle(k,n));\n"
+          "  }));\n"
+          "}\n"
+          "function loadFloorSprites(f){return loadSpriteBundle(String(f));}\n"
+          f"loadSpriteBundle('{CORE}');\n"
+        + BUNDLE_END
+    )
+
+
+def inject_bundles(html, bundles, js):
+    """Point bundled slots at spriteSrc(), add the loader and the floor hooks
+
+    Returns (html, [hooks not found]).
+    """
+    from html_patcher import HtmlIndex
+
+    bundled = {var for sprites in bundles.values() for var in sprites}
+    index = HtmlIndex(html)
+    edits = sorted((start, end, f"spriteSrc('{var}')")
+                   for var in bundled for start, end in index.slots.get(var, []))
+    pieces = []
+    pos = 0
+    for start, end, text in edits:
+        pieces.append(html[pos:start])
+        pieces.append(text)
+        pos = end
+    pieces.append(html[pos:])
+    html = ''.join(pieces)
+
+    # Until its bundle arrives a slot has no pixels, so fall through to px()
+    def guard(match):
+        img = match.group(1)
+        if img != 'cf' and img[len('window.'):] not in bundled:
+            return match.group(0)
+        return f"if({img}.complete&&{img}.naturalWidth)"
+    html = COMPLETE_RE.sub(guard, html)
+
+    start = html.find(BUNDLE_BEGIN)
+    if start != -1:
+        end = html.index(BUNDLE_END, start) + len(BUNDLE_END)
+        html = html[:start] + js + html[end:]
+    else:
+        pos = html.find(BUNDLE_ANCHOR)
+        if pos == -1:
+            raise LookupError(f"getFloorZones not found in {HTML_PATH}")
+        html = html[:pos] + js + html[pos:]
+
+    missing = []
+    for pattern, replacement in FLOOR_HOOKS:
+        if replacement in html:
+            continue
+        if pattern not in html:
+            missing.append(pattern)
+        html = html.replace(pattern, replacement)
+    return html, missing
+
+
+def build(html, manifest_path=BUNDLE_MANIFEST, out_dir=HASHED_DIR):
+    """Plan, write and inject; returns (new html, manifest, [problems])"""
+    floors = floor_monsters(html)
+    spawning = sorted({mon for mons in floors.values() for mon in mons})
+    with open(GAME_DATA_PATH, 'r', encoding='utf-8') as f:
+        sources = {HTML_PATH: known_monsters(html), GAME_DATA_PATH: known_monsters(f.read())}
+    problems = [f"spawned but missing from MONS in {path}: {', '.join(missing)}"
+                for path, known in sources.items() for missing in [[m for m in spawning if m not in known]]
+                if missing]
+    tiles = floor_tiles(html)
+
+    # Slots bundled by an earlier run are no longer data URIs in the page;
+    # keep them, and let freshly integrated images replace them
+    previous = load_bundles(manifest_path)
+    bundles = {}
+    for name, sprites in plan_bundles(html, floors).items():
+        bundles[name] = dict(previous.get(name, {}), **sprites)
+    paths = write_bundles(bundles, out_dir)
+
+    def entry(name):
+        sprites = bundles.get(name, {})
+        return {'bundle': paths.get(name), 'sprites': sorted(sprites),
+                'bytes': sum(len(uri) for uri in sprites.values())}
+
+    manifest = {
+        CORE: entry(CORE),
+        'floors': {str(floor): dict(entry(str(floor)), monsters=floors.get(floor, []), tiles=tiles[floor])
+                   for floor in tiles},
+    }
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+
+    new_html, missing = inject_bundles(html, bundles, bundle_js(paths))
+    problems += [f"floor hook not found: {pattern!r}" for pattern in missing]
+    return new_html, manifest, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split embedded monster sprites into per-floor bundles')
+    parser.add_argument('--dry-run', action='store_true', help=f'write bundles and manifest but not {HTML_PATH}')
+    args = parser.parse_args()
+
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+    new_html, manifest, problems = build(html)
+    print(f"✓ core: {len(manifest[CORE]['sprites'])} sprites, {manifest[CORE]['bytes'] / 1024:.1f} KB")
+    for floor, entry in manifest['floors'].items():
+        if entry['bundle']:
+            print(f"  floor {floor:>2s}: {len(entry['monsters'])} monsters, {len(entry['sprites'])} sprites, "
+                  f"{entry['bytes'] / 1024:.1f} KB, {len(entry['tiles'])} tile types")
+    print(f"  → {BUNDLE_MANIFEST}")
+    for problem in problems:
+        print(f"✗ {problem}")
+
+    if not args.dry_run and new_html != html:
+        from html_patcher import write_atomic
+        write_atomic(HTML_PATH, new_html)
+        print(f"✓ {HTML_PATH}: {(len(html) - len(new_html)) / 1024:.1f} KB moved to bundles")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Single source of truth for the MegaRealms sprite pipeline
+Every build script reads its monster list from here
+"""
+import os
+
+# sprite file name -> index.html image variable + drawMonster case label
+MONSTERS = {
+    'bug': {'var': '_bugI', 'case': 'bug'},
+    'rat': {'var': '_ratI', 'case': 'rat'},
+    'cave_rat': {'var': '_crI', 'case': 'cave_rat'},
+    'snake': {'var': '_snkI', 'case': 'snake'},
+    'spider': {'var': '_pspI', 'case': 'poison_spider'},
+    'scorpion': {'var': '_scpI', 'case': 'scorpion'},
+    'wolf': {'var': '_wlfI', 'case': 'wolf'},
+    'bear': {'var': '_brI', 'case': 'bear'},
+    'deer': {'var': '_drI', 'case': 'deer'},
+    'boar': {'var': '_boaI', 'case': 'boar'},
+    'troll': {'var': '_trlI', 'case': 'troll'},
+    'rotworm': {'var': '_rwI', 'case': 'rotworm'},
+    'skeleton': {'var': '_sklI', 'case': 'skeleton'},
+    'dragon': {'var': '_drgI', 'case': 'dragon'},
+}
+
+SPRITE_DIR = 'assets/sprites/monsters'
+ORIGINAL_DIR = f'{SPRITE_DIR}/original'
+# improved/ holds the committed full-size AI art the animate stage reads;
+# the improve stage's 32x32 palette output goes to quantized/ so it never
+# overwrites it
+IMPROVED_DIR = f'{SPRITE_DIR}/improved'
+QUANTIZED_DIR = f'{SPRITE_DIR}/quantized'
+ANIMATED_DIR = f'{SPRITE_DIR}/animated'
+TILES_DIR = 'assets/sprites/tiles/improved'
+TILE_VARIANTS_DIR = 'assets/sprites/tiles/generated'
+HTML_PATH = 'index.html'
+
+ANIMATION_FRAMES = 4
+
+
+def monster_names():
+    """Sprite file names, in build order"""
+    return list(MONSTERS)
+
+
+def monster_vars():
+    """Sprite file name -> index.html image variable"""
+    return {name: info['var'] for name, info in MONSTERS.items()}
+
+
+def monster_cases():
+    """drawMonster case label -> (sprite file name, image variable)"""
+    return {info['case']: (name, info['var']) for name, info in MONSTERS.items()}
+
+
+def site_path(path):
+    """path relative to the site root (the directory holding index.html)
+
+    Build outputs are referenced from the page by this path, so it must be
+    a URL wrangler can serve; raises ValueError for paths outside the root.
+    """
+    root = os.path.dirname(os.path.abspath(HTML_PATH))
+    rel = os.path.relpath(os.path.abspath(path), root)
+    if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+        raise ValueError(f"{path} is outside the site root {root}")
+    return rel
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+In-memory stage graph for the MegaRealms sprite pipeline
+extract -> resize -> quantize -> outline -> key-out -> animate -> encode -> inject
+
+Stages pass RGBA arrays to each other; PNG encoding only happens for the
+final frames, plus any stages explicitly checkpointed to disk for debugging.
+"""
+import base64
+import io
+import os
+import re
+
+import numpy as np
+from PIL import Image, ImageEnhance
+
+from background_key import key_out_array
+from palette_quantizer import get_quantizer
+from png_encoder import ENCODER_VERSION, encode_png
+from sprite_outline import outline_array
+
+RESAMPLE = {
+    'nearest': Image.Resampling.NEAREST,
+    'lanczos': Image.Resampling.LANCZOS,
+    'box': Image.Resampling.BOX,
+    'bilinear': Image.Resampling.BILINEAR,
+}
+
+def new_sprite(name, image=None):
+    """A sprite travelling through the graph
+
+    'image' is the current (H, W, 4) uint8 array, 'frames' the animation
+    frames once animate has run, and 'png' the encoded frames.
+    """
+    return {'name': name, 'image': image, 'frames': None, 'png': None}
+
+
+def _to_array(img):
+    return np.array(img.convert('RGBA'))
+
+
+def _frames(sprite):
+    """The arrays the next stage should operate on"""
+    return sprite['frames'] if sprite['frames'] is not None else [sprite['image']]
+
+
+def _map_frames(sprite, fn):
+    if sprite['frames'] is not None:
+        sprite['frames'] = [fn(frame) for frame in sprite['frames']]
+    else:
+        sprite['image'] = fn(sprite['image'])
+    return sprite
+
+
+# ---------------------------------------------------------------- stages ---
+
+def stage_load(sprite, path, working_size=None):
+    """Decode a PNG file once
+
+    With working_size, large sources are decoded straight down to a few
+    times that size (sprite_loader) instead of at full resolution.
+    """
+    if working_size:
+        from sprite_loader import load_reduced
+        sprite['image'] = _to_array(load_reduced(path, tuple(working_size)))
+        return sprite
+    with Image.open(path) as img:
+        sprite['image'] = _to_array(img)
+    return sprite
+
+
+def stage_extract(sprite, html, var):
+    """Decode a sprite's base64 payload straight out of index.html"""
+    match = re.search(rf"window\.{re.escape(var)}\.src='data:image/png;base64,([^']+)'", html)
+    if not match:
+        raise LookupError(f"{var} not found in HTML")
+    with Image.open(io.BytesIO(base64.b64decode(match.group(1)))) as img:
+        sprite['image'] = _to_array(img)
+    return sprite
+
+
+def stage_resize(sprite, size, resample='nearest'):
+    """Resize to `size`; a no-op when already that size"""
+    size = tuple(size)
+
+    def resize(arr):
+        if arr.shape[1::-1] == size:
+            return arr
+        return _to_array(Image.fromarray(arr, 'RGBA').resize(size, RESAMPLE[resample]))
+
+    return _map_frames(sprite, resize)
+
+
+def stage_sharpen(sprite, amount):
+    """PIL sharpness enhancement"""
+    return _map_frames(sprite, lambda arr: _to_array(
+        ImageEnhance.Sharpness(Image.fromarray(arr, 'RGBA')).enhance(amount)))
+
+
+def stage_quantize(sprite, palette, mode='rgb'):
+    """Snap RGB to the palette, keeping alpha"""
+    quantizer = get_quantizer(palette, mode)
+
+    def quantize(arr):
+        result = arr.copy()
+        result[..., :3] = quantizer.quantize_array(arr[..., :3])
+        return result
+
+    return _map_frames(sprite, quantize)
+
+
+def stage_outline(sprite, color=(0, 0, 0), thickness=1, connectivity=8, placement='inner'):
+    """Morphological outline"""
+    return _map_frames(sprite, lambda arr: outline_array(arr, color, thickness, connectivity, placement))
+
+
+def stage_key_out(sprite, key=(255, 255, 255), threshold=240, feather=20):
+    """Make the background colour transparent"""
+    return _map_frames(sprite, lambda arr: key_out_array(arr, key, threshold, feather))
+
+
+def stage_animate(sprite, spec=None, frames=None):
+    """Expand the current image into the frames of an animation_engine spec (idle bob by default)"""
+    from animation_engine import ANIMATIONS, render
+
+    sprite['frames'] = list(render(sprite['image'][None], spec or ANIMATIONS['idle'], frames)[0])
+    return sprite
+
+
+def stage_encode(sprite, encoder=ENCODER_VERSION):
+    """PNG-encode the final frames at their smallest size (see png_encoder)
+
+    `encoder` only exists so the version lands in the build manifest.
+    """
+    sprite['png'] = [encode_png(arr)[0] for arr in _frames(sprite)]
+    return sprite
+
+
+STAGES = {
+    'load': stage_load,
+    'extract': stage_extract,
+    'resize': stage_resize,
+    'sharpen': stage_sharpen,
+    'quantize': stage_quantize,
+    'outline': stage_outline,
+    'key_out': stage_key_out,
+    'animate': stage_animate,
+    'encode': stage_encode,
+}
+
+
+# -------------------------------------------------------------- pipeline ---
+
+def write_checkpoint(sprite, step_name, checkpoint_dir):
+    """Dump the current arrays of one stage as PNGs"""
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    for i, arr in enumerate(_frames(sprite)):
+        suffix = f'_frame{i}' if sprite['frames'] is not None else ''
+        path = os.path.join(checkpoint_dir, f"{sprite['name']}.{step_name}{suffix}.png")
+        Image.fromarray(arr, 'RGBA').save(path, 'PNG')
+
+
+def run_pipeline(sprite, steps, checkpoints=(), checkpoint_dir='build/checkpoints'):
+    """Push one sprite through a list of (stage, kwargs) steps
+
+    Stages named in `checkpoints` are also written to `checkpoint_dir`.
+    """
+    for i, (stage, kwargs) in enumerate(steps):
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        sprite = STAGES[stage](sprite, **kwargs)
+        if stage in checkpoints:
+            write_checkpoint(sprite, f'{i:02d}_{stage}', checkpoint_dir)
+    return sprite
+
+
+def default_steps(source_path, reduce=False, palette=None):
+    """The animate stage (process_sprite) as one in-memory graph
+
+    Loads the full-size art, keys it out, Lanczos-resizes it to FRAME_SIZE
+    and renders the idle frames, so the output matches the default build.
+    reduce=True decodes large sources at a reduced working resolution;
+    `palette` adds a quantize step to those colours after the resize.
+    """
+    from animation_engine import ANIMATIONS
+    from fix_transparency_and_animate import FRAME_SIZE, KEY_COLOR, KEY_FEATHER, KEY_THRESHOLD
+    from sprite_catalog import ANIMATION_FRAMES
+
+    steps = [
+        ('load', {'path': source_path, 'working_size': FRAME_SIZE} if reduce else {'path': source_path}),
+        ('key_out', {'key': KEY_COLOR, 'threshold': KEY_THRESHOLD, 'feather': KEY_FEATHER}),
+        ('resize', {'size': FRAME_SIZE, 'resample': 'lanczos'}),
+    ]
+    if palette:
+        steps.append(('quantize', {'palette': list(palette)}))
+    return steps + [
+        ('animate', {'spec': ANIMATIONS['idle'], 'frames': ANIMATION_FRAMES}),
+        ('encode', {'encoder': ENCODER_VERSION}),
+    ]
+
+
+def inject(html, sprites, monsters):
+    """Patch encoded frames for many sprites into index.html in one splice
+
+    `monsters` maps sprite name -> {'var', 'case'} as in sprite_catalog.
+    Returns (html, PatchReport).
+    """
+    from html_patcher import patch_html
+    from integrate_animated_v2 import packed_animation_code
+
+    blocks = {}
+    for sprite in sprites:
+        info = monsters[sprite['name']]
+        blocks[info['case']] = packed_animation_code(info['var'], sprite['png'])
+    return patch_html(html, cases=blocks)
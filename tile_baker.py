@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+"""
+Offline baker for the canvas-drawn fallback tiles in buildTileSpritesOLD
+Parses each tile's draw list out of index.html, rasterizes it with NumPy
+(fixed seed for the Math.random() speckles, supersampled path edges) into
+one atlas PNG and emits the
+coordinate map the client uses to blit pre-baked tiles instead of redrawing
+them on every page load
+"""
+import argparse
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+from html_patcher import match_brace, write_atomic
+from png_encoder import encode_png
+from sprite_catalog import HTML_PATH
+
+BAKE_DIR = 'assets/sprites/hashed'
+BAKE_MAP = 'assets/sprites/baked_tiles.json'
+DEFAULT_SEED = 1
+TS = 32
+COLUMNS = 8
+# Path edges are anti-aliased by coverage over SUPERSAMPLE x SUPERSAMPLE
+# samples per pixel; arcs are flattened to ARC_SEGMENTS per full turn
+SUPERSAMPLE = 16
+ARC_SEGMENTS = 64
+MITER_LIMIT = 10
+
+TT_RE = re.compile(r"const TT=\{([^}]*)\}")
+TILE_RE = re.compile(r"tiles\[TT\.(?P<name>\w+)\]=c\(TT\.(?P=name),\(ctx\)=>\{")
+C_DEF = "const c=(n,d)=>createSprite(TS,TS,d);"
+C_BAKED = "const c=(n,d)=>bakedTile(n,d);"
+BAKE_BEGIN = '// ============ BAKED TILES (generated by tile_baker.py) ============\n'
+BAKE_END = '// ============ END BAKED TILES ============\n'
+OLD_FN = 'function buildTileSpritesOLD(){'
+
+TOKEN_RE = re.compile(r"""
+    \s*(?:
+      (?P<num>\d+(?:\.\d+)?)
+    | (?P<str>'[^']*'|"[^"]*")
+    | (?P<name>[A-Za-z_$][\w$]*(?:\.[A-Za-z_$][\w$]*)*)
+    | (?P<op>===|!==|<=|>=|\+\+|--|\+=|-=|&&|\|\||=>|[-+*/%<>=!|&(){},;?:\[\]])
+    )""", re.X)
+
+
+class Unsupported(Exception):
+    """A statement the baker cannot reproduce (text, unknown ctx calls or styles...)"""
+
+
+# ------------------------------------------------------------- tokenizer ---
+
+def tokenize(src):
+    tokens = []
+    pos = 0
+    src = src.strip()
+    while pos < len(src):
+        match = TOKEN_RE.match(src, pos)
+        if not match or match.end() == pos:
+            raise Unsupported(f"cannot tokenize near {src[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+        while pos < len(src) and src[pos].isspace():
+            pos += 1
+    return tokens
+
+
+def _int32(v):
+    v = int(math.trunc(v)) & 0xffffffff
+    return v - (1 << 32) if v & 0x80000000 else v
+
+
+class Interpreter:
+    """Runs the tiny JS subset used by the tile draw lists
+
+    Supports px(...) and the ctx.<method>(...) calls and ctx.<prop>= styles
+    Canvas implements, const/let declarations, for loops, if statements and
+    numeric expressions with Math.random(). Anything else raises Unsupported.
+    """
+
+    BINARY = [
+        ('||',), ('&&',), ('|',), ('===', '!=='), ('<', '>', '<=', '>='), ('+', '-'), ('*', '/', '%'),
+    ]
+
+    def __init__(self, canvas, rng):
+        self.canvas = canvas
+        self.rng = rng
+
+    def run(self, src):
+        self.tokens = tokenize(src)
+        self.pos = 0
+        stmts = []
+        while self.pos < len(self.tokens):
+            stmts.append(self.statement())
+        self.execute(stmts, {})
+
+    # parsing: statements become small tuples, executed afterwards
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        tok = self.peek()
+        if value is not None and tok[1] != value:
+            raise Unsupported(f"expected {value!r}, got {tok[1]!r}")
+        self.pos += 1
+        return tok
+
+    def arguments(self):
+        self.take('(')
+        args = []
+        while self.peek()[1] != ')':
+            args.append(self.expression())
+            if self.peek()[1] == ',':
+                self.take()
+        self.take(')')
+        self.take(';') if self.peek()[1] == ';' else None
+        return args
+
+    def block(self):
+        if self.peek()[1] == '{':
+            self.take('{')
+            stmts = []
+            while self.peek()[1] != '}':
+                stmts.append(self.statement())
+            self.take('}')
+            return stmts
+        return [self.statement()]
+
+    def statement(self):
+        kind, value = self.peek()
+        if value == ';':
+            self.take()
+            return ('nop',)
+        if value in ('const', 'let', 'var'):
+            self.take()
+            decls = []
+            while True:
+                name = self.take()[1]
+                self.take('=')
+                decls.append((name, self.expression()))
+                if self.peek()[1] != ',':
+                    break
+                self.take(',')
+            self.take(';') if self.peek()[1] == ';' else None
+            return ('let', decls)
+        if value == 'for':
+            self.take()
+            self.take('(')
+            init = self.statement()
+            cond = self.expression()
+            self.take(';')
+            var = self.take()[1]
+            op = self.take()[1]
+            step = self.expression() if op in ('+=', '-=') else ('num', 1)
+            if op not in ('++', '+=', '--', '-='):
+                raise Unsupported(f"for step {op}")
+            sign = -1 if op in ('--', '-=') else 1
+            self.take(')')
+            return ('for', init, cond, var, sign, step, self.block())
+        if value == 'if':
+            self.take()
+            self.take('(')
+            cond = self.expression()
+            self.take(')')
+            return ('if', cond, self.block())
+        if value == 'px':
+            self.take()
+            return ('call', 'px', self.arguments()[1:])
+        if kind == 'name' and value.startswith('ctx.'):
+            prop = value[4:]
+            if self.peek(1)[1] == '=' and prop in Canvas.STYLES | Canvas.TEXT_STYLES:
+                self.take()
+                self.take('=')
+                expr = self.expression()
+                self.take(';') if self.peek()[1] == ';' else None
+                return ('set', prop, expr)
+            if self.peek(1)[1] == '(' and prop in Canvas.METHODS:
+                self.take()
+                return ('call', prop, self.arguments())
+            raise Unsupported(value)
+        raise Unsupported(f"statement starting with {value!r}")
+
+    def expression(self, level=0):
+        if level == len(self.BINARY):
+            return self.unary()
+        left = self.expression(level + 1)
+        while self.peek()[1] in self.BINARY[level]:
+            op = self.take()[1]
+            left = ('bin', op, left, self.expression(level + 1))
+        return left
+
+    def unary(self):
+        kind, value = self.peek()
+        if value in ('-', '!'):
+            self.take()
+            return ('neg' if value == '-' else 'not', self.unary())
+        if value == '(':
+            self.take()
+            node = self.expression()
+            self.take(')')
+            return node
+        self.take()
+        if kind == 'num':
+            return ('num', float(value))
+        if kind == 'str':
+            return ('str', value[1:-1])
+        if kind == 'name':
+            if value == 'Math.random':
+                self.take('(')
+                self.take(')')
+                return ('random',)
+            if value == 'Math.PI':
+                return ('num', math.pi)
+            return ('var', value)
+        raise Unsupported(f"expression token {value!r}")
+
+    # evaluation
+    def evaluate(self, node, env):
+        kind = node[0]
+        if kind in ('num', 'str'):
+            return node[1]
+        if kind == 'var':
+            if node[1] not in env:
+                raise Unsupported(f"unknown variable {node[1]}")
+            return env[node[1]]
+        if kind == 'random':
+            return float(self.rng.random())
+        if kind == 'neg':
+            return -self.evaluate(node[1], env)
+        if kind == 'not':
+            return not self.evaluate(node[1], env)
+        op, a, b = node[1], self.evaluate(node[2], env), self.evaluate(node[3], env)
+        if op == '+':
+            return a + b
+        if op == '-':
+            return a - b
+        if op == '*':
+            return a * b
+        if op == '/':
+            return a / b
+        if op == '%':
+            return math.fmod(a, b)
+        if op == '|':
+            return float(_int32(a) | _int32(b))
+        if op == '===':
+            return a == b
+        if op == '!==':
+            return a != b
+        if op == '<':
+            return a < b
+        if op == '>':
+            return a > b
+        if op == '<=':
+            return a <= b
+        if op == '>=':
+            return a >= b
+        if op == '&&':
+            return a and b
+        return a or b
+
+    def execute(self, stmts, env):
+        for stmt in stmts:
+            kind = stmt[0]
+            if kind == 'let':
+                for name, expr in stmt[1]:
+                    env[name] = self.evaluate(expr, env)
+            elif kind == 'set':
+                self.canvas.set(stmt[1], self.evaluate(stmt[2], env))
+            elif kind == 'call':
+                getattr(self.canvas, stmt[1])(*[self.evaluate(arg, env) for arg in stmt[2]])
+            elif kind == 'if':
+                if self.evaluate(stmt[1], env):
+                    self.execute(stmt[2], dict(env))
+            elif kind == 'for':
+                _, init, cond, var, sign, step, body = stmt
+                scope = dict(env)
+                self.execute([init], scope)
+                while self.evaluate(cond, scope):
+                    self.execute(body, dict(scope))
+                    scope[var] += sign * self.evaluate(step, scope)
+
+
+# ------------------------------------------------------------ rasterizer ---
+
+def _winding(polygons, x, y):
+    """Winding number of the sample points (x, y) around the closed polygons"""
+    winding = np.zeros(np.broadcast_shapes(x.shape, y.shape), dtype=np.int32)
+    for polygon in polygons:
+        for (ax, ay), (bx, by) in zip(polygon, polygon[1:] + polygon[:1]):
+            if ay == by:
+                continue
+            rows = (y >= min(ay, by)) & (y < max(ay, by))
+            crossing = ax + (y - ay) * (bx - ax) / (by - ay)
+            winding += np.where(rows & (x < crossing), 1 if by > ay else -1, 0).astype(np.int32)
+    return winding
+
+
+def _join(d1, n1, d2, n2, vx, vy, half):
+    """Polygon filling the outer corner where two stroked segments meet"""
+    cos = d1[0] * d2[0] + d1[1] * d2[1]
+    if cos >= 1 - 1e-9:
+        return None
+    # The outer side is the one the second segment turns away from
+    side = -1 if n1[0] * d2[0] + n1[1] * d2[1] > 0 else 1
+    a = (vx + side * n1[0], vy + side * n1[1])
+    b = (vx + side * n2[0], vy + side * n2[1])
+    ratio = 1 / math.sqrt(max((1 + cos) / 2, 1e-12))
+    if ratio > MITER_LIMIT:
+        return [(vx, vy), a, b]
+    mx, my = n1[0] + n2[0], n1[1] + n2[1]
+    norm = math.hypot(mx, my)
+    miter = (vx + side * mx / norm * half * ratio, vy + side * my / norm * half * ratio)
+    return [(vx, vy), a, miter, b]
+
+
+def parse_color(css):
+    """(r, g, b, a) for #rgb, #rrggbb, rgb() and rgba() colours"""
+    css = css.strip()
+    if css.startswith('#'):
+        hexa = css[1:]
+        if len(hexa) == 3:
+            hexa = ''.join(c * 2 for c in hexa)
+        return tuple(int(hexa[i:i + 2], 16) for i in (0, 2, 4)) + (1.0,)
+    match = re.fullmatch(r"rgba?\(([^)]*)\)", css)
+    if match:
+        parts = [float(p) for p in match.group(1).split(',')]
+        return tuple(int(p) for p in parts[:3]) + ((parts[3],) if len(parts) > 3 else (1.0,))
+    raise Unsupported(f"colour {css!r}")
+
+
+class Canvas:
+    """Enough of CanvasRenderingContext2D for the tile draw lists
+
+    fillRect (and px()) on whole pixels; paths of moveTo/lineTo/arc/closePath,
+    filled with the nonzero rule or stroked with butt caps and miter joins;
+    strokeRect. Path coverage is sampled SUPERSAMPLE² times per pixel, so
+    edges can differ from a browser's own anti-aliasing by a step of alpha.
+    Text is not supported.
+    """
+
+    METHODS = {'px', 'fillRect', 'strokeRect', 'beginPath', 'moveTo', 'lineTo', 'closePath', 'arc',
+               'fill', 'stroke'}
+    STYLES = {'fillStyle', 'strokeStyle', 'lineWidth'}
+    # Only read by fillText, which is unsupported anyway
+    TEXT_STYLES = {'font', 'textAlign', 'textBaseline'}
+
+    def __init__(self, size=TS):
+        self.rgb = np.zeros((size, size, 3), dtype=np.float64)
+        self.alpha = np.zeros((size, size), dtype=np.float64)
+        self.fillStyle = '#000'
+        self.strokeStyle = '#000'
+        self.lineWidth = 1.0
+        self.subpaths = []
+
+    def set(self, prop, value):
+        if prop == 'lineWidth' and not value > 0:
+            return
+        if prop in self.STYLES:
+            setattr(self, prop, value)
+
+    def _composite(self, coverage, color):
+        r, g, b, a = parse_color(color)
+        weight = coverage * a
+        self.rgb = np.array([r, g, b]) * weight[..., None] + self.rgb * (1 - weight[..., None])
+        self.alpha = weight + self.alpha * (1 - weight)
+
+    def px(self, x, y, w=0, h=0, color='#000'):
+        # px() in index.html: ctx.fillStyle=col; ctx.fillRect(x, y, w||1, h||1)
+        self.fillStyle = color
+        self.fillRect(x, y, w or 1, h or 1)
+
+    def fillRect(self, x, y, w, h):
+        x, y, w, h = (int(round(v)) for v in (x, y, w, h))
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, self.alpha.shape[1]), min(y + h, self.alpha.shape[0])
+        if x1 <= x0 or y1 <= y0:
+            return
+        coverage = np.zeros_like(self.alpha)
+        coverage[y0:y1, x0:x1] = 1
+        self._composite(coverage, self.fillStyle)
+
+    # paths: a list of [points, closed] subpaths
+    def beginPath(self):
+        self.subpaths = []
+
+    def moveTo(self, x, y):
+        self.subpaths.append([[(x, y)], False])
+
+    def lineTo(self, x, y):
+        if not self.subpaths:
+            self.moveTo(x, y)
+        else:
+            self.subpaths[-1][0].append((x, y))
+
+    def closePath(self):
+        if self.subpaths and not self.subpaths[-1][1]:
+            self.subpaths[-1][1] = True
+            self.moveTo(*self.subpaths[-1][0][0])
+
+    def arc(self, x, y, radius, start, end, ccw=False):
+        if radius < 0:
+            raise Unsupported("negative arc radius")
+        sweep = end - start
+        if not ccw:
+            sweep = 2 * math.pi if sweep >= 2 * math.pi else sweep % (2 * math.pi)
+        else:
+            sweep = -2 * math.pi if sweep <= -2 * math.pi else -(-sweep % (2 * math.pi))
+        steps = max(1, math.ceil(abs(sweep) / (2 * math.pi) * ARC_SEGMENTS))
+        for i in range(steps + 1):
+            angle = start + sweep * i / steps
+            self.lineTo(x + radius * math.cos(angle), y + radius * math.sin(angle))
+
+    def fill(self):
+        # Every subpath is implicitly closed; windings add up across them
+        polygons = [points for points, _ in self.subpaths if len(points) > 2]
+        if polygons:
+            self._composite(self._coverage([polygons]), self.fillStyle)
+
+    def stroke(self):
+        self._stroke(self.subpaths)
+
+    def strokeRect(self, x, y, w, h):
+        if w or h:
+            self._stroke([[[(x, y), (x + w, y), (x + w, y + h), (x, y + h)], True]])
+
+    def _stroke(self, subpaths):
+        """Union of one quad per segment plus a miter (or bevel) per join"""
+        half = self.lineWidth / 2
+        pieces = []
+        for points, closed in subpaths:
+            points = [p for i, p in enumerate(points) if i == 0 or p != points[i - 1]]
+            if closed and len(points) > 1 and points[-1] != points[0]:
+                points.append(points[0])
+            segments = []
+            for (ax, ay), (bx, by) in zip(points, points[1:]):
+                length = math.hypot(bx - ax, by - ay)
+                dx, dy = (bx - ax) / length, (by - ay) / length
+                nx, ny = -dy * half, dx * half
+                segments.append(((dx, dy), (nx, ny), (bx, by)))
+                pieces.append([(ax + nx, ay + ny), (bx + nx, by + ny), (bx - nx, by - ny), (ax - nx, ay - ny)])
+            joins = list(zip(segments, segments[1:]))
+            if closed and len(segments) > 1:
+                joins.append((segments[-1], segments[0]))
+            for (d1, n1, (vx, vy)), (d2, n2, _) in joins:
+                join = _join(d1, n1, d2, n2, vx, vy, half)
+                if join:
+                    pieces.append(join)
+        if pieces:
+            self._composite(self._coverage([[piece] for piece in pieces]), self.strokeStyle)
+
+    def _coverage(self, shapes):
+        """Fraction of each pixel inside the union of `shapes`
+
+        Each shape is a list of polygons filled together with the nonzero rule.
+        """
+        size = self.alpha.shape[0]
+        xs = [x for shape in shapes for polygon in shape for x, _ in polygon]
+        ys = [y for shape in shapes for polygon in shape for _, y in polygon]
+        x0, x1 = max(math.floor(min(xs)), 0), min(math.ceil(max(xs)), size)
+        y0, y1 = max(math.floor(min(ys)), 0), min(math.ceil(max(ys)), size)
+        coverage = np.zeros_like(self.alpha)
+        if x1 <= x0 or y1 <= y0:
+            return coverage
+        sx = x0 + (np.arange((x1 - x0) * SUPERSAMPLE) + 0.5) / SUPERSAMPLE
+        sy = y0 + (np.arange((y1 - y0) * SUPERSAMPLE) + 0.5) / SUPERSAMPLE
+        inside = np.zeros((sy.size, sx.size), dtype=bool)
+        for shape in shapes:
+            inside |= _winding(shape, sx[None, :], sy[:, None]) != 0
+        coverage[y0:y1, x0:x1] = inside.reshape(y1 - y0, SUPERSAMPLE, x1 - x0, SUPERSAMPLE).mean(axis=(1, 3))
+        return coverage
+
+    def to_array(self):
+        out = np.empty(self.alpha.shape + (4,), dtype=np.uint8)
+        out[..., :3] = np.clip(np.rint(self.rgb), 0, 255)
+        out[..., 3] = np.clip(np.rint(self.alpha * 255), 0, 255)
+        return out
+
+
+# --------------------------------------------------------------- baking ---
+
+def tile_sources(html):
+    """{TT name: draw-list source} for every tile in buildTileSpritesOLD"""
+    start = html.find(OLD_FN)
+    if start == -1:
+        raise LookupError(f"buildTileSpritesOLD not found in {HTML_PATH}")
+    end = match_brace(html, start + len(OLD_FN) - 1)
+    sources = {}
+    for match in TILE_RE.finditer(html, start, end):
+        close = match_brace(html, match.end() - 1)
+        sources[match.group('name')] = html[match.end():close]
+    return sources
+
+
+def tt_values(html):
+    """TT constant name -> numeric tile id"""
+    match = TT_RE.search(html)
+    if not match:
+        raise LookupError(f"TT constants not found in {HTML_PATH}")
+    return {k: int(v) for k, v in (item.split(':') for item in match.group(1).split(','))}
+
+
+def bake_tiles(html, seed=DEFAULT_SEED):
+    """Rasterize every tile whose draw list the Interpreter supports
+
+    Returns ({name: (TS, TS, 4) array}, {name: reason skipped}). A single
+    rng serves all tiles in document order, so output depends only on seed.
+    """
+    rng = np.random.default_rng(seed)
+    baked = {}
+    skipped = {}
+    for name, src in tile_sources(html).items():
+        canvas = Canvas()
+        try:
+            Interpreter(canvas, rng).run(src)
+        except Unsupported as e:
+            skipped[name] = str(e)
+            continue
+        baked[name] = canvas.to_array()
+    return baked, skipped
+
+
+def build_sheet(baked, columns=COLUMNS):
+    """Lay tiles out on a TS grid; returns (sheet array, {name: [x, y]})"""
+    names = list(baked)
+    cols = min(columns, len(names))
+    rows = -(-len(names) // cols)
+    sheet = np.zeros((rows * TS, cols * TS, 4), dtype=np.uint8)
+    coords = {}
+    for i, name in enumerate(names):
+        x, y = (i % cols) * TS, (i // cols) * TS
+        sheet[y:y + TS, x:x + TS] = baked[name]
+        coords[name] = [x, y]
+    return sheet, coords
+
+
+def bake_js(path, coords, tt):
+    entries = ','.join(f"{tt[name]}:[{x},{y}]" for name, (x, y) in coords.items())
+    return (
+        BAKE_BEGIN
+        + f"const TILE_BAKE=new Image();TILE_BAKE.src='{path}';\n"
+        + f"const TB={{{entries}}};\n"
+        + "function bakedTile(n,draw){\n"
+          "  const e=TB[n];\n"
+          "  if(e===undefined||!TILE_BAKE.complete||!TILE_BAKE.naturalWidth)return createSprite(TS,TS,draw);\n"
+          "  return createSprite(TS,TS,(ctx)=>ctx.drawImage(TILE_BAKE,e[0],e[1],TS,TS,0,0,TS,TS));\n"
+          "}\n"
+        + BAKE_END
+    )
+
+
+def inject_bake(html, js):
+    """Add the baked-tile block before buildTileSpritesOLD and route c() through it"""
+    start = html.find(BAKE_BEGIN)
+    if start != -1:
+        end = html.index(BAKE_END, start) + len(BAKE_END)
+        html = html[:start] + js + html[end:]
+    else:
+        at = html.find(OLD_FN)
+        if at == -1:
+            raise LookupError(f"buildTileSpritesOLD not found in {HTML_PATH}")
+        html = html[:at] + js + html[at:]
+    if C_BAKED not in html:
+        if html.count(C_DEF) != 1:
+            raise LookupError("tile factory c() in buildTileSpritesOLD not found exactly once")
+        html = html.replace(C_DEF, C_BAKED)
+    return html
+
+
+def bake(html, seed=DEFAULT_SEED, out_dir=BAKE_DIR, map_path=BAKE_MAP):
+    """Bake, save the content-hashed sheet and map; returns (path, coords, skipped)"""
+    from build_cache import hash_bytes
+
+    baked, skipped = bake_tiles(html, seed)
+    if not baked:
+        raise LookupError("No tile could be baked")
+    sheet, coords = build_sheet(baked)
+    data, _ = encode_png(sheet)
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f'tiles-{hash_bytes(data)[:16]}.png').replace(os.sep, '/')
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(map_path, 'w', encoding='utf-8') as f:
+        json.dump({'sheet': path, 'seed': seed, 'tile_size': TS, 'tiles': coords, 'skipped': skipped},
+                  f, indent=1)
+    return path, coords, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bake the canvas-drawn fallback tiles into an atlas')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='seed for Math.random() speckles')
+    parser.add_argument('--inject', action='store_true',
+                        help=f'make buildTileSpritesOLD in {HTML_PATH} blit the baked tiles')
+    args = parser.parse_args()
+
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+    path, coords, skipped = bake(html, args.seed)
+    print(f"✓ Baked {len(coords)} tiles → {path}")
+    print(f"  → {BAKE_MAP}")
+    for name, reason in skipped.items():
+        print(f"  • {name}: drawn on the client ({reason})")
+
+    if args.inject:
+        new_html = inject_bake(html, bake_js(path, coords, tt_values(html)))
+        if new_html != html:
+            write_atomic(HTML_PATH, new_html)
+        print(f"\n✓ {HTML_PATH} now blits {len(coords)} pre-baked tiles")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Deterministic procedural tile generator for MegaRealms
+Draws N seamless variants per terrain in one vectorized pass from an
+explicit seed, named after the SM sprite keys (grass1..grass5, lava1, ...).
+The same seed always gives byte-identical PNGs.
+"""
+import argparse
+import os
+import zlib
+
+import numpy as np
+
+from improve_sprites import TIBIA_PALETTE
+from png_encoder import ENCODER_VERSION, save_png
+from sprite_catalog import TILE_VARIANTS_DIR
+
+DEFAULT_SEED = 7
+TILE_SIZE = 32
+LINE_SAMPLES = 64
+
+# Terrain -> SM key prefix, variant count and layers drawn over the base colour.
+# Layers follow the old create_tile_sprites recipes; random stamps wrap around
+# the tile edges so every variant tiles seamlessly.
+#   rect:    count, (w, h) at random positions
+#   point:   count single pixels
+#   ellipse: count circles of the given diameter
+#   line:    count random segments
+#   box:     fixed (x, y, w, h)
+#   hline:   fixed rows spanning (x0, x1)
+#   grid:    fixed (step, inset, size) squares on a checkerboard of cells
+TERRAINS = {
+    'grass': {
+        'key': 'grass', 'variants': 5, 'base': TIBIA_PALETTE['green_grass'],
+        'layers': [
+            ('rect', TIBIA_PALETTE['green_bright'], {'count': 8, 'size': (4, 4)}),
+            ('point', TIBIA_PALETTE['green_dark'], {'count': 5}),
+        ],
+    },
+    'dirt': {
+        'key': 'dirt', 'variants': 3, 'base': (139, 115, 85),
+        'layers': [
+            ('rect', (107, 83, 69), {'count': 10, 'size': (7, 7)}),
+            ('point', (166, 143, 105), {'count': 8}),
+        ],
+    },
+    'water': {
+        'key': 'water', 'variants': 2, 'base': TIBIA_PALETTE['blue_water'],
+        'layers': [
+            ('box', (37, 99, 212), {'box': (6, 6, 21, 21)}),
+            ('rect', (74, 149, 255), {'count': 6, 'size': (5, 5)}),
+            ('hline', (13, 38, 73), {'rows': (14, 22), 'span': (2, 31)}),
+        ],
+    },
+    'stone_wall': {
+        'key': 'brick', 'variants': 2, 'base': (101, 67, 33),
+        'layers': [
+            ('grid', (85, 85, 85), {'step': 8, 'inset': 2, 'size': 5}),
+            ('point', (74, 60, 42), {'count': 6}),
+        ],
+    },
+    'sand': {
+        'key': 'sand', 'variants': 2, 'base': (232, 199, 90),
+        'layers': [
+            ('rect', (212, 169, 55), {'count': 9, 'size': (6, 4)}),
+        ],
+    },
+    'cave_floor': {
+        'key': 'cave', 'variants': 2, 'base': (74, 60, 42),
+        'layers': [
+            ('rect', (101, 67, 33), {'count': 6, 'size': (5, 5)}),
+            ('line', (42, 24, 16), {'count': 4}),
+        ],
+    },
+    'ice': {
+        'key': 'ice', 'variants': 2, 'base': (184, 224, 255),
+        'layers': [
+            ('rect', (212, 240, 255), {'count': 4, 'size': (13, 13)}),
+            ('rect', (255, 255, 255), {'count': 8, 'size': (2, 1)}),
+        ],
+    },
+    'lava': {
+        'key': 'lava', 'variants': 2, 'base': (74, 32, 32),
+        'layers': [
+            ('ellipse', (255, 68, 68), {'count': 4, 'diameter': 9}),
+            ('ellipse', (255, 136, 68), {'count': 3, 'diameter': 11}),
+        ],
+    },
+}
+
+
+def terrain_rng(seed, terrain):
+    """Independent stream per terrain, so adding one never reshuffles the others"""
+    return np.random.default_rng([seed, zlib.crc32(terrain.encode('utf-8'))])
+
+
+def _wrapped(coord, start, size):
+    """Mask of coord in [start, start + size) modulo the tile size"""
+    return (coord - start) % TILE_SIZE < size
+
+
+def layer_mask(kind, spec, rng, n, yy, xx):
+    """(n, S, S) boolean mask of one layer for all n variants"""
+    s = TILE_SIZE
+    if kind in ('rect', 'ellipse'):
+        origin = rng.integers(0, s, (2, n, spec['count'], 1, 1))
+        if kind == 'rect':
+            w, h = spec['size']
+            mask = _wrapped(xx, origin[0], w) & _wrapped(yy, origin[1], h)
+        else:
+            r = spec['diameter'] / 2
+            dx = (xx - origin[0] + s // 2) % s - s // 2
+            dy = (yy - origin[1] + s // 2) % s - s // 2
+            mask = dx * dx + dy * dy <= r * r
+        return mask.any(axis=1)
+
+    mask = np.zeros((n, s, s), dtype=bool)
+    if kind == 'point':
+        x, y = rng.integers(0, s, (2, n, spec['count']))
+        mask[np.arange(n)[:, None], y, x] = True
+    elif kind == 'line':
+        ends = rng.integers(0, s, (4, n, spec['count'], 1))
+        t = np.linspace(0, 1, LINE_SAMPLES)
+        x = np.rint(ends[0] + (ends[2] - ends[0]) * t).astype(int)
+        y = np.rint(ends[1] + (ends[3] - ends[1]) * t).astype(int)
+        mask[np.arange(n)[:, None, None], y, x] = True
+    elif kind == 'box':
+        x, y, w, h = spec['box']
+        mask[:, y:y + h, x:x + w] = True
+    elif kind == 'hline':
+        x0, x1 = spec['span']
+        mask[:, list(spec['rows']), x0:x1] = True
+    elif kind == 'grid':
+        step, inset, size = spec['step'], spec['inset'], spec['size']
+        cell = ((yy // step + xx // step) % 2 == 0)
+        inside = (yy % step >= inset) & (yy % step < inset + size) & \
+                 (xx % step >= inset) & (xx % step < inset + size)
+        mask[:] = cell & inside
+    else:
+        raise ValueError(f"Unknown layer kind: {kind}")
+    return mask
+
+
+def generate_terrain(terrain, seed=DEFAULT_SEED, variants=None):
+    """(N, S, S, 4) uint8 array of variants for one terrain"""
+    spec = TERRAINS[terrain]
+    n = variants or spec['variants']
+    rng = terrain_rng(seed, terrain)
+    yy, xx = np.mgrid[0:TILE_SIZE, 0:TILE_SIZE]
+
+    tiles = np.empty((n, TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    tiles[...] = tuple(spec['base']) + (255,)
+    for kind, color, layer in spec['layers']:
+        tiles[layer_mask(kind, layer, rng, n, yy, xx)] = tuple(color) + (255,)
+    return tiles
+
+
+def generate_all(seed=DEFAULT_SEED, variants=None, terrains=None):
+    """{SM key: (S, S, 4) array} for every variant of every terrain"""
+    out = {}
+    for terrain in terrains or TERRAINS:
+        for i, tile in enumerate(generate_terrain(terrain, seed, variants), start=1):
+            out[f"{TERRAINS[terrain]['key']}{i}"] = tile
+    return out
+
+
+def tile_params(seed=DEFAULT_SEED, variants=None):
+    """Everything that affects generated tile bytes (recorded in the build manifest)"""
+    return {'seed': seed, 'variants': variants, 'size': TILE_SIZE,
+            'terrains': TERRAINS, 'encoder': ENCODER_VERSION}
+
+
+def write_tiles(tiles, out_dir=TILE_VARIANTS_DIR):
+    """Save each tile as <key>.png; returns the paths"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for key, tile in tiles.items():
+        path = os.path.join(out_dir, f'{key}.png')
+        save_png(tile, path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate seeded MegaRealms tile variants')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f'RNG seed (default: {DEFAULT_SEED})')
+    parser.add_argument('--variants', type=int, default=None,
+                        help='variants per terrain (default: as many as SM has keys for)')
+    parser.add_argument('--out', default=TILE_VARIANTS_DIR, help='output directory')
+    args = parser.parse_args()
+
+    paths = write_tiles(generate_all(args.seed, args.variants), args.out)
+    print(f"✓ Generated {len(paths)} tiles (seed {args.seed}) in {args.out}")
+    for terrain, spec in TERRAINS.items():
+        n = args.variants or spec['variants']
+        print(f"  {terrain:11s} → {spec['key']}1..{spec['key']}{n}")
+
+
+if __name__ == '__main__':
+    main()
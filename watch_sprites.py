@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Watch mode for the MegaRealms sprite build
+Polls the monster sprite directories, debounces bursts of changes, and for
+each touched sprite reruns only its own stages (skipping anything the build
+cache says is fresh) and patches only its case block into index.html
+"""
+import argparse
+import os
+import sys
+import time
+
+from build_cache import BuildCache
+from build_sprites import build_sprite, stage_files, stage_integrate
+from sprite_catalog import ANIMATED_DIR, IMPROVED_DIR, MONSTERS
+
+# Only what ends up in animated/: the AI art animate reads, and the frames
+# themselves. original/ only feeds improve, whose output is not shipped.
+WATCH_DIRS = [IMPROVED_DIR, ANIMATED_DIR]
+FRAME_STAGES = ('animate', 'graph')
+POLL_INTERVAL = 0.1
+DEBOUNCE = 0.25
+
+
+def scan(dirs=WATCH_DIRS):
+    """{path: (mtime_ns, size)} of every PNG under the watched directories"""
+    state = {}
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file() and entry.name.endswith('.png'):
+                st = entry.stat()
+                state[entry.path] = (st.st_mtime_ns, st.st_size)
+    return state
+
+
+def changed_paths(old, new):
+    return sorted(p for p in old.keys() | new.keys() if old.get(p) != new.get(p))
+
+
+def sprite_for(path):
+    """Monster name a changed file belongs to, or None
+
+    Improved sprites are <name>.png; animated frames are <name>_frameN.png.
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if os.path.dirname(path) == os.path.normpath(ANIMATED_DIR):
+        stem = stem.rsplit('_frame', 1)[0]
+    return stem if stem in MONSTERS else None
+
+
+def stages_for(path, in_memory=False):
+    """Per-sprite stages a change to `path` makes stale
+
+    Edited animated frames only need re-integrating; edited AI art reruns
+    the stage that turns it into frames.
+    """
+    if os.path.dirname(path) == os.path.normpath(IMPROVED_DIR):
+        return ['graph' if in_memory else 'animate']
+    return []
+
+
+def rebuild(changes, cache, options):
+    """Rebuild the sprites behind `changes` ({name: stages}) and patch index.html
+
+    Only sprites whose frames changed are re-integrated: edited frames
+    (no stages), or a frame stage the build cache did not skip.
+    Returns (patched names, failures, output paths written by the stages).
+    """
+    patched = []
+    failures = []
+    payloads = {}
+    outputs = set()
+    for name, stages in changes.items():
+        _, failed, detail, payload, cache_report, records = build_sprite(
+            name, stages, cache.snapshot(stages, name), options)
+        cache.merge(*cache_report)
+        for stage in stages:
+            outputs.update(stage_files(stage, name)[1])
+        if failed:
+            failures.append((name, failed, detail))
+            continue
+        if not stages or any(r['stage'] in FRAME_STAGES and not r['cached'] for r in records):
+            patched.append(name)
+        if payload is not None and 'graph' in stages:
+            payloads[name] = payload
+    cache.save()
+    if patched:
+        failures.extend(stage_integrate(patched, payloads))
+    return patched, failures, outputs
+
+
+def watch(options, in_memory=False, interval=POLL_INTERVAL, debounce=DEBOUNCE, once=False):
+    cache = BuildCache(force=options['force'])
+    state = scan()
+    pending = {}
+    last_change = None
+    print(f"Watching {', '.join(WATCH_DIRS)} (Ctrl+C to stop)")
+    while True:
+        time.sleep(interval)
+        current = scan()
+        for path in changed_paths(state, current):
+            name = sprite_for(path)
+            if name and path in current:
+                stages = pending.setdefault(name, [])
+                stages.extend(s for s in stages_for(path, in_memory) if s not in stages)
+                last_change = time.monotonic()
+        state = current
+        if not pending or time.monotonic() - last_change < debounce:
+            continue
+
+        started = time.perf_counter()
+        changes, pending = pending, {}
+        patched, failures, outputs = rebuild(changes, cache, options)
+        # Our own outputs are not edits; anything else that changed meanwhile still is
+        current = scan()
+        for path in outputs:
+            if path in current:
+                state[path] = current[path]
+        elapsed = (time.perf_counter() - started) * 1e3
+        if patched:
+            print(f"→ {', '.join(patched)} patched into index.html in {elapsed:.0f} ms")
+        for name, stage, detail in failures:
+            print(f"✗ {name} ({stage}): {detail.strip().splitlines()[-1]}")
+        if once:
+            return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rebuild MegaRealms sprites as their PNGs change')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='rebuild with the in-memory stage graph instead of animate')
+    parser.add_argument('--reduce', action='store_true',
+                        help='decode large originals at a reduced working resolution')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE,
+                        help=f'seconds of quiet before rebuilding (default: {DEBOUNCE})')
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                        help=f'seconds between directory scans (default: {POLL_INTERVAL})')
+    parser.add_argument('--once', action='store_true', help='exit after the first rebuild')
+    args = parser.parse_args(argv)
+
+    options = {'force': False, 'checkpoints': [], 'profile_dir': None, 'reduce': args.reduce}
+    try:
+        return watch(options, args.in_memory, args.interval, args.debounce, args.once)
+    except KeyboardInterrupt:
+        print("\n✓ Stopped watching")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Offline, vectorized port of genMap() from index.html
+Reproduces the JS integer hash, quintic value noise and fbm over whole
+NumPy coordinate grids, writes every floor as a run-length encoded tile-type
+array under assets/maps/, and can check its output against the JS itself
+(run under node with Math.random stubbed) for parity.
+
+genMap draws Math.random() for scattered trees, rocks and lava. Here those
+draws come from an explicit seed, so every client loads the same world.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import subprocess
+import sys
+
+import numpy as np
+
+from sprite_catalog import HTML_PATH, site_path
+
+MAP_DIR = 'assets/maps'
+MAP_MANIFEST = f'{MAP_DIR}/manifest.json'
+DEFAULT_SEED = 7
+BAND_ROWS = 200  # overworld rows generated per pass, bounds peak memory
+
+# File layout (little endian): header, then `runs` tile values (uint8),
+# then `runs` run lengths (uint16); long runs are split at 65535
+MAGIC = b'MRMP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sBBHHI')
+MAX_RUN = 0xFFFF
+
+MAP_BEGIN = '// ============ PREBUILT MAPS (generated by world_generator.py) ============\n'
+MAP_END = '// ============ END PREBUILT MAPS ============\n'
+GENMAP_CALL = 'G.maps.push(genMap(f))'
+PREBUILT_CALL = 'G.maps.push(loadMap(f))'
+
+CONST_RE = re.compile(r"\b(MW|MH|FLOORS)=(\d+)")
+TT_RE = re.compile(r"const TT=\{([^}]*)\}")
+STAIRS_RE = re.compile(r"const STAIRS=\[(.*?)\];", re.S)
+STAIR_RE = re.compile(r"\{([^{}]*)\}")
+FIELD_RE = re.compile(r"(\w+):('?)([\w-]+)\2")
+
+
+# -------------------------------------------------------------- constants ---
+
+def js_constants(html):
+    """MW, MH, FLOORS, TT and STAIRS as genMap sees them"""
+    consts = {k: int(v) for k, v in CONST_RE.findall(html)}
+    tt = TT_RE.search(html)
+    stairs = STAIRS_RE.search(html)
+    if not tt or not stairs or not {'MW', 'MH', 'FLOORS'} <= consts.keys():
+        raise LookupError(f"genMap constants not found in {HTML_PATH}")
+    consts['TT'] = {k: int(v) for k, v in (pair.split(':') for pair in tt.group(1).split(','))}
+    consts['STAIRS'] = [
+        {k: (v if quote else int(v)) for k, quote, v in FIELD_RE.findall(obj)}
+        for obj in STAIR_RE.findall(stairs.group(1))
+    ]
+    return consts
+
+
+def floor_shape(floor, consts):
+    """(height, width) of a floor's tile grid"""
+    return (consts['MH'], consts['MW']) if floor == 0 else (80, 100)
+
+
+# ------------------------------------------------------------------ noise ---
+
+def to_int32(d):
+    """ECMAScript ToInt32 of float64 integers"""
+    v = np.fmod(d, 2.0 ** 32).astype(np.int64)
+    return (v + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+def hash2(x, y):
+    """hash(x,y) from genMap, including its float64 rounding of the second product"""
+    h = to_int32(x * 374761393.0 + y * 668265263.0)
+    h = to_int32((h ^ (h >> 13)).astype(np.float64) * 1274126177.0)
+    return (h ^ (h >> 16)) & 0x7fffffff
+
+
+def _smooth(t):
+    # Same operation order as the JS, so results match bit for bit
+    return 6 * t * t * t * t * t - 15 * t * t * t * t + 10 * t * t * t
+
+
+def noise(x, y, s):
+    ix, iy = np.floor(x / s), np.floor(y / s)
+    fx, fy = x / s - ix, y / s - iy
+    sx, sy = _smooth(fx), _smooth(fy)
+    # Hash each lattice corner once, then gather; the lattice is s^2 times smaller
+    x0, y0 = ix.min(), iy.min()
+    lattice = hash2(np.arange(x0, ix.max() + 2)[None, :], np.arange(y0, iy.max() + 2)[:, None]) / 0x7fffffff
+    cx, cy = (ix - x0).astype(np.intp), (iy - y0).astype(np.intp)
+    v00 = lattice[cy, cx]
+    v10 = lattice[cy, cx + 1]
+    v01 = lattice[cy + 1, cx]
+    v11 = lattice[cy + 1, cx + 1]
+    return v00 * (1 - sx) * (1 - sy) + v10 * sx * (1 - sy) + v01 * (1 - sx) * sy + v11 * sx * sy
+
+
+def fbm(x, y, s):
+    return noise(x, y, s) * 0.5 + noise(x + 100, y + 100, s / 2) * 0.3 + noise(x + 200, y + 200, s / 4) * 0.2
+
+
+def seeded_random(seed, floor):
+    """random(shape) -> uniform [0, 1) draws, one independent stream per floor"""
+    rng = np.random.default_rng([seed, floor])
+    return rng.random
+
+
+# ----------------------------------------------------------------- floors ---
+
+def overworld(consts, random, y0, y1):
+    """Rows y0..y1 of floor 0"""
+    TT, MW, MH = consts['TT'], consts['MW'], consts['MH']
+    y, x = np.mgrid[y0:y1, 0:MW]
+    fy, fx = y.astype(np.float64), x.astype(np.float64)
+    e = fbm(fx, fy, 80)
+    m2 = fbm(fx + 500, fy + 500, 60)
+    t2 = fbm(fx + 1000, fy + 1000, 40)
+    lat, lon = fy / MH, fx / MW
+    # Every tile takes at most one Math.random() branch, so one draw per tile
+    u = random(x.shape)
+    t = np.full(x.shape, TT['G'], dtype=np.uint8)
+
+    left = np.ones(x.shape, dtype=bool)
+
+    def take(cond):
+        sel = left & cond
+        left[sel] = False
+        return sel
+
+    # Base terrain from elevation
+    sel = take(e < 0.25)
+    t[sel] = TT['W']
+    sel = take(e < 0.32)
+    t[sel] = TT['SA']
+    t[sel & (u < 0.02)] = TT['TR']
+    sel = take(e > 0.8)
+    t[sel] = TT['MT']
+    t[sel & (u < 0.15)] = TT['G']
+    sel = take((e > 0.7) & (m2 > 0.5))
+    t[sel] = TT['MT']
+
+    # Biomes, in the order of genMap's if/else chain
+    sel = take(lat < 0.25)  # northern forest
+    t[sel] = TT['G']
+    t[sel & (m2 > 0.7)] = TT['D']
+    t[sel & (t2 > 0.78)] = TT['TR']
+    sel = take((lat > 0.7) & (lon > 0.4))  # southern desert
+    t[sel] = np.where(m2 > 0.6, TT['SA'], TT['D'])[sel]
+    t[sel & (u < 0.02)] = TT['MT']
+    sel = take((lon < 0.2) & (lat > 0.25) & (lat < 0.7))  # western swamp
+    t[sel] = TT['SWAMP']
+    t[sel & (t2 < 0.35)] = TT['G']
+    t[sel & (t2 < 0.15)] = TT['TR']
+    t[sel & (t2 > 0.65)] = TT['W']
+    sel = take((lon > 0.8) & (lat > 0.2) & (lat < 0.55))  # eastern mountains
+    t[sel] = np.where(e > 0.55, TT['MT'], TT['G'])[sel]
+    t[sel & (u < 0.03)] = TT['TR']
+    sel = take((lat > 0.55) & (lon < 0.25))  # dark woods
+    t[sel] = TT['G']
+    t[sel & (t2 > 0.68)] = TT['TR']
+    t[sel & (m2 > 0.7)] = TT['SWAMP']
+    sel = take((lat > 0.4) & (lat < 0.7) & (lon > 0.2) & (lon < 0.5))  # savanna
+    t[sel] = TT['G']
+    t[sel & (t2 > 0.82)] = TT['TR']
+    t[sel & (u < 0.08)] = TT['D']
+    sel = take((lon > 0.7) & (lat > 0.55))  # coastal
+    t[sel] = TT['SA']
+    t[sel & (e > 0.45)] = TT['G']
+    t[sel & (t2 > 0.82)] = TT['TR']
+    sel = take((lat > 0.3) & (lat < 0.55) & (lon > 0.35) & (lon < 0.6))  # ice region
+    t[sel] = TT['IC']
+    t[sel & (t2 > 0.5)] = TT['G']
+    t[sel & (e > 0.65)] = TT['MT']
+    sel = left  # general plains
+    t[sel] = TT['G']
+    t[sel & (m2 > 0.65)] = TT['D']
+    t[sel & (t2 > 0.78)] = TT['TR']
+
+    # Rivers using sine curves
+    for r in range(3):
+        ry = np.floor(np.sin(fx / 120 + r * 2) * 80 + 400 + r * 400)
+        t[np.abs(fy - ry) < 3] = TT['W']
+        t[(np.abs(fy - ry) < 1) & (x % 80 < 3)] = TT['BRIDGE']
+
+    def box(x0, x1, yy0, yy1):
+        return (x >= x0) & (x <= x1) & (y >= yy0) & (y <= yy1)
+
+    # Town center, houses, farm
+    town = box(800, 1100, 700, 900)
+    t[town] = TT['FL']
+    t[town & ((x == 800) | (x == 1100) | (y == 700) | (y == 900))] = TT['WL']
+    t[town & (((x == 950) & ((y == 700) | (y == 900))) | (((x == 800) | (x == 1100)) & (y == 800)))] = TT['DR']
+    t[box(920, 980, 770, 830)] = TT['TM']
+    for hx0, hx1, hy0, hy1, door in [(810, 850, 710, 740, (830, 740)), (860, 900, 710, 740, (880, 740)),
+                                     (1010, 1050, 710, 740, (1030, 740)), (1010, 1050, 860, 890, (1030, 860)),
+                                     (810, 850, 860, 890, (830, 860))]:
+        house = box(hx0, hx1, hy0, hy1)
+        t[house] = TT['FL']
+        t[house & ((x == hx0) | (x == hx1) | (y == hy0) | (y == hy1))] = TT['WL']
+        t[(x == door[0]) & (y == door[1])] = TT['DR']
+    t[box(870, 930, 660, 695)] = TT['FARM']
+
+    # Roads
+    t[((np.abs(x - 950) < 4) & ((y < 700) | (y > 900)) & (y > 50) & (y < 1550)) |
+      ((np.abs(y - 800) < 4) & ((x < 800) | (x > 1100)) & (x > 50) & (x < 1950))] = TT['D']
+    t[(np.abs(x - 400) < 3) & (y > 30) & (y < 850)] = TT['D']
+    t[(np.abs(y - 500) < 3) & (x > 380) & (x < 960)] = TT['D']
+    dx, dy = x - 1100, y - 700  # NE
+    t[(dx > 0) & (dy < 0) & (dx < 500) & (np.abs(dx + dy) < 5)] = TT['D']
+    dx, dy = x - 800, y - 700  # NW
+    t[(dx < 0) & (dy < 0) & (dx > -500) & (np.abs(-dx + dy) < 5)] = TT['D']
+    dx, dy = x - 1100, y - 900  # SE
+    t[(dx > 0) & (dy > 0) & (dx < 400) & (np.abs(dx - dy) < 5)] = TT['D']
+    dx, dy = x - 800, y - 900  # SW
+    t[(dx < 0) & (dy > 0) & (np.abs(dx) < 400) & (np.abs(dx + dy) < 5)] = TT['D']
+
+    # Dungeon entrances and 7x7 tower footprints
+    for sx, sy in [(880, 800), (1500, 550), (300, 1200), (1800, 400)]:
+        t[(x == sx) & (y == sy)] = TT['SD']
+    for tx, ty in [(1700, 350), (900, 450), (250, 900), (1600, 1200)]:
+        dx, dy = x - tx + 3, y - ty + 3
+        inside = (dx >= 0) & (dx < 7) & (dy >= 0) & (dy < 7)
+        wall = ((dx == 0) | (dx == 6) | (dy == 0) | (dy == 6)) & ~((dx == 3) & ((dy == 0) | (dy == 6)))
+        t[inside] = TT['FL']
+        t[inside & (dx == 3) & (dy == 3)] = TT['SD']
+        t[inside & wall] = TT['WL']
+    return t
+
+
+def sanctuary(consts):
+    """Floor 10, the premium sanctuary"""
+    TT = consts['TT']
+    y, x = np.mgrid[0:80, 0:100]
+    t = np.full(x.shape, TT['FL'], dtype=np.uint8)
+
+    def box(x0, x1, y0, y1):
+        return (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+
+    t[(x == 0) | (x == 99) | (y == 0) | (y == 79)] = TT['WL']
+    t[((x == 15) | (x == 85)) & (y >= 10) & (y <= 70)] = TT['WL']
+    t[((y == 10) | (y == 70)) & (x >= 15) & (x <= 85)] = TT['WL']
+    t[((x == 15) | (x == 85)) & ((y == 30) | (y == 50))] = TT['DR']
+    t[((y == 10) | (y == 70)) & (x == 50)] = TT['DR']
+    t[box(16, 84, 11, 69)] = TT['TM']
+    for x0 in (35, 55, 75):
+        t[box(x0, x0 + 10, 45, 55)] = TT['FL']
+    shop = box(20, 30, 32, 40)
+    t[shop] = TT['FL']
+    t[shop & ((x == 20) | (x == 30) | (y == 32) | (y == 40))] = TT['WL']
+    t[(x == 25) & (y == 40)] = TT['DR']
+    t[((x == 30) | (x == 70)) & ((y == 30) | (y == 40))] = TT['W']
+    t[box(8, 12, 8, 12)] = TT['FL']
+    return t
+
+
+def tower(floor, consts):
+    """Floors 14-33, five per tower"""
+    TT, STAIRS = consts['TT'], consts['STAIRS']
+    tower_idx, tower_floor = (floor - 14) // 5, (floor - 14) % 5
+    y, x = np.mgrid[0:80, 0:100]
+    t = np.full(x.shape, TT['FL'], dtype=np.uint8)
+    t[(x == 0) | (x == 99) | (y == 0) | (y == 79)] = TT['WL']
+    if tower_floor >= 1:
+        t[np.isin(x, (25, 50, 75)) & np.isin(y, (20, 40, 60))] = TT['WL']
+    if tower_floor >= 2:
+        t[((x == 40) & (y >= 15) & (y <= 35)) | ((x == 60) & (y >= 45) & (y <= 65))] = TT['WL']
+    if tower_floor >= 3:
+        t[((y == 30) & (x >= 20) & (x <= 45)) | ((y == 50) & (x >= 55) & (x <= 80))] = TT['WL']
+    if tower_floor >= 2:
+        t[(x == 40) & (y == 25)] = TT['DR']
+        t[(x == 60) & (y == 55)] = TT['DR']
+    if tower_floor >= 3:
+        t[(y == 30) & (x == 32)] = TT['DR']
+        t[(y == 50) & (x == 68)] = TT['DR']
+    nv = noise((x + floor * 1000).astype(np.float64), (y + floor * 1000).astype(np.float64), 12)
+    t[nv > 0.72] = TT[['LV', 'IC', 'SWAMP', 'CW'][tower_idx]]
+
+    departures = [s for s in STAIRS if s['fx'] == floor]
+    for s in departures:
+        t[(np.abs(x - s['x']) <= 3) & (np.abs(y - s['y']) <= 3)] = TT['FL']
+    for s in departures:
+        t[s['y'], s['x']] = TT['SU'] if s['tx'] < s['fx'] else TT['SD']
+    arrivals = [s for s in STAIRS if s['tx'] == floor]
+    for s in arrivals:
+        t[(np.abs(x - s['dx']) <= 3) & (np.abs(y - s['dy']) <= 3)] = TT['FL']
+    for s in arrivals:
+        t[s['dy'], s['dx']] = TT['SD'] if s['fx'] < s['tx'] else TT['SU']
+    return t
+
+
+def cave(floor, consts, random):
+    """Underground floors 1-9 and 11-13, including the flood-fill cleanup"""
+    TT, STAIRS = consts['TT'], consts['STAIRS']
+    y, x = np.mgrid[0:80, 0:100]
+    cft = TT['FL'] if 3 <= floor <= 5 else TT['CV']
+    t = np.full(x.shape, TT['CW'], dtype=np.uint8)
+    cv = noise((x + floor * 1000).astype(np.float64), (y + floor * 1000).astype(np.float64), 8)
+    cv2 = noise((x + floor * 2000).astype(np.float64), (y + floor * 2000).astype(np.float64), 12)
+    open_ = (cv > 0.25) | (cv2 > 0.35)
+    t[open_] = cft
+    u1, u2 = random(x.shape), random(x.shape)
+    if floor >= 7:
+        t[open_ & (u1 < 0.12)] = TT['LV']
+    if floor >= 8:
+        t[open_ & (u2 < 0.18)] = TT['LV']
+    if 11 <= floor <= 13:
+        t[(np.abs(x - 50) <= 6) & (np.abs(y - 40) <= 6)] = cft
+    for cy in range(10, 71, 15):
+        t[(y >= cy - 2) & (y <= cy + 2) & (x >= 2) & (x <= 95)] = cft
+    for cx in range(10, 91, 15):
+        t[(x >= cx - 2) & (x <= cx + 2) & (y >= 2) & (y <= 75)] = cft
+
+    stairs = [s for s in STAIRS if s['fx'] == floor]
+    for s in stairs:
+        t[(np.abs(x - s['x']) <= 5) & (np.abs(y - s['y']) <= 5)] = cft
+    for i, a in enumerate(stairs):
+        for b in stairs[i + 1:]:
+            t[(x >= min(a['x'], b['x'])) & (x <= max(a['x'], b['x'])) & (np.abs(y - a['y']) <= 2)] = cft
+            t[(np.abs(x - b['x']) <= 2) & (y >= min(a['y'], b['y'])) & (y <= max(a['y'], b['y']))] = cft
+    for s in stairs:
+        t[s['y'], s['x']] = TT['SU'] if s['dir'] == 'up' else TT['SD']
+    return connect(t, floor, consts)
+
+
+def _carve(t, rows, cols, wall, fill):
+    """Set CW tiles to `fill` in rows x cols, skipping rows outside the map"""
+    rows = [r for r in rows if 0 <= r < t.shape[0]]
+    cols = [c for c in cols if 0 <= c < t.shape[1]]
+    block = t[np.ix_(rows, cols)]
+    block[block == wall] = fill
+    t[np.ix_(rows, cols)] = block
+
+
+def connect(t, floor, consts):
+    """Carve corridors between stairs and wall off pockets unreachable from the first"""
+    TT, STAIRS = consts['TT'], consts['STAIRS']
+    walkable = np.isin(np.arange(256), [TT[k] for k in ('CV', 'FL', 'SU', 'SD', 'LV', 'IC', 'DR')])
+    cft = TT['FL'] if 3 <= floor <= 5 else TT['CV']
+    points = [(s['x'], s['y']) for s in STAIRS if s['fx'] == floor]
+    arrivals = [(s['dx'], s['dy']) for s in STAIRS if s['tx'] == floor]
+    if not points and 11 <= floor <= 13:
+        points, arrivals = [(50, 40)], [(50, 40)]
+    if not points:
+        return t
+
+    # L-shaped corridors between every pair: along a's row, then b's column
+    start = points[0]
+    points = points + arrivals
+    for i, (ax, ay) in enumerate(points):
+        for bx, by in points[i + 1:]:
+            xd, yd = (1 if bx > ax else -1), (1 if by > ay else -1)
+            if ax != bx:
+                _carve(t, range(ay - 1, ay + 2), range(ax, bx, xd), TT['CW'], cft)
+            if ay != by:
+                _carve(t, range(ay, by, yd), range(bx - 1, bx + 2), TT['CW'], cft)
+
+    # Flood fill from the first stair by repeated 4-neighbour dilation
+    passable = walkable[t]
+    reached = np.zeros(t.shape, dtype=bool)
+    reached[start[1], start[0]] = True
+    while True:
+        grown = reached.copy()
+        grown[1:] |= reached[:-1]
+        grown[:-1] |= reached[1:]
+        grown[:, 1:] |= reached[:, :-1]
+        grown[:, :-1] |= reached[:, 1:]
+        grown &= passable
+        grown[start[1], start[0]] = True
+        if np.array_equal(grown, reached):
+            break
+        reached = grown
+    t[passable & ~reached] = TT['CW']
+    return t
+
+
+def generate_floor(floor, consts, random):
+    """(H, W) uint8 tile types of one floor; random(shape) supplies Math.random()"""
+    if floor == 0:
+        return np.concatenate([overworld(consts, random, y0, min(y0 + BAND_ROWS, consts['MH']))
+                               for y0 in range(0, consts['MH'], BAND_ROWS)])
+    if floor == 10:
+        return sanctuary(consts)
+    if 14 <= floor <= 33:
+        return tower(floor, consts)
+    return cave(floor, consts, random)
+
+
+# ---------------------------------------------------------------- storage ---
+
+def encode_floor(floor, tiles):
+    """Run-length encode a floor into the MRMP binary layout"""
+    flat = tiles.ravel()
+    starts = np.flatnonzero(np.concatenate(([True], flat[1:] != flat[:-1])))
+    lengths = np.diff(np.append(starts, flat.size))
+    values = flat[starts]
+    # Split runs longer than a uint16
+    repeats = -(-lengths // MAX_RUN)
+    values = np.repeat(values, repeats)
+    split = np.full(values.size, MAX_RUN, dtype=np.int64)
+    last = np.cumsum(repeats) - 1
+    split[last] = lengths - (repeats - 1) * MAX_RUN
+    h, w = tiles.shape
+    return (HEADER.pack(MAGIC, FORMAT_VERSION, floor, w, h, values.size)
+            + values.astype(np.uint8).tobytes() + split.astype('<u2').tobytes())
+
+
+def decode_floor(data):
+    """(floor, (H, W) uint8 tiles) from MRMP bytes"""
+    magic, version, floor, w, h, runs = HEADER.unpack_from(data)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not an MRMP v1 map file")
+    values = np.frombuffer(data, np.uint8, runs, HEADER.size)
+    lengths = np.frombuffer(data, '<u2', runs, HEADER.size + runs)
+    return floor, np.repeat(values, lengths).reshape(h, w)
+
+
+def write_maps(maps, seed, out_dir=MAP_DIR, manifest_path=MAP_MANIFEST):
+    """Save floor-<n>-<hash>.bin files and the manifest; returns the manifest"""
+    os.makedirs(out_dir, exist_ok=True)
+    floors = {}
+    for floor, tiles in maps.items():
+        data = encode_floor(floor, tiles)
+        path = os.path.join(out_dir, f'floor-{floor}-{hashlib.sha256(data).hexdigest()[:16]}.bin')
+        if not os.path.exists(path):
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        floors[str(floor)] = {'path': site_path(path).replace(os.sep, '/'), 'width': tiles.shape[1],
+                              'height': tiles.shape[0], 'bytes': len(data)}
+    manifest = {'version': FORMAT_VERSION, 'seed': seed, 'floors': floors}
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def map_js(manifest, floors):
+    """Client block: fetch every prebuilt floor early, fall back to genMap"""
+    files = ','.join(repr(manifest['floors'][str(f)]['path']) if str(f) in manifest['floors'] else 'null'
+                     for f in range(floors))
+    return (
+        MAP_BEGIN
+        + f"const MAP_FILES=[{files}];\n"
+        + "const MAP_BUFS=[];\n"
+          "MAP_FILES.forEach((u,f)=>{if(u)fetch(u).then(r=>r.ok?r.arrayBuffer():null)"
+          ".then(b=>{if(b)MAP_BUFS[f]=b;}).catch(()=>{});});\n"
+          "function decodeMap(buf){\n"
+          f"  const v=new DataView(buf),w=v.getUint16(6,true),h=v.getUint16(8,true),n=v.getUint32(10,true);\n"
+          f"  const vals=new Uint8Array(buf,{HEADER.size},n),m=[];let row=[],i=0;\n"
+          f"  for(let r=0;r<n;r++){{const t=vals[r];let len=v.getUint16({HEADER.size}+n+r*2,true);\n"
+          "    while(len--){row.push(t);if(++i===w){m.push(row);row=[];i=0;}}}\n"
+          "  return m.length===h?m:null;\n"
+          "}\n"
+          "function loadMap(f){return(MAP_BUFS[f]&&decodeMap(MAP_BUFS[f]))||genMap(f);}\n"
+        + MAP_END
+    )
+
+
+def inject_maps(html, js):
+    """Place the prebuilt-map block before genMap and load floors through it"""
+    start = html.find(MAP_BEGIN)
+    if start != -1:
+        end = html.index(MAP_END, start) + len(MAP_END)
+        html = html[:start] + js + html[end:]
+    else:
+        pos = html.find('function genMap(floor){')
+        if pos == -1:
+            raise LookupError(f"genMap not found in {HTML_PATH}")
+        html = html[:pos] + js + html[pos:]
+    return html.replace(GENMAP_CALL, PREBUILT_CALL)
+
+
+# ----------------------------------------------------------------- parity ---
+
+def genmap_source(html):
+    from html_patcher import match_brace
+
+    start = html.find('function genMap(floor){')
+    if start == -1:
+        raise LookupError(f"genMap not found in {HTML_PATH}")
+    return html[start:match_brace(html, html.index('{', start)) + 1]
+
+
+def js_floor(html, consts, floor, random_value):
+    """Run the page's own genMap under node with Math.random() pinned to a constant"""
+    script = (
+        f"const MW={consts['MW']},MH={consts['MH']},FLOORS={consts['FLOORS']};\n"
+        f"const TT={json.dumps(consts['TT'])};\nconst STAIRS={json.dumps(consts['STAIRS'])};\n"
+        f"Math.random=()=>{random_value!r};\n{genmap_source(html)}\n"
+        f"const m=genMap({floor});const out=Buffer.alloc(m.length*m[0].length);\n"
+        "let i=0;for(const row of m)for(const t of row)out[i++]=t;process.stdout.write(out);\n"
+    )
+    result = subprocess.run(['node', '-e', script], capture_output=True, check=True)
+    return np.frombuffer(result.stdout, np.uint8).reshape(floor_shape(floor, consts))
+
+
+def parity(html, consts, floors, random_values=(0.0, 0.999)):
+    """[(floor, random value, mismatched tiles, first mismatch (x, y) or None)]
+
+    Pinning Math.random() to 0 takes every random branch and 0.999 none, so
+    together they cover all of genMap's code paths.
+    """
+    rows = []
+    for floor in floors:
+        for value in random_values:
+            ours = generate_floor(floor, consts, lambda shape: np.full(shape, value))
+            diff = np.argwhere(ours != js_floor(html, consts, floor, value))
+            rows.append((floor, value, len(diff), tuple(diff[0][::-1]) if len(diff) else None))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute genMap output for every floor')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f'Math.random() seed (default: {DEFAULT_SEED})')
+    parser.add_argument('--floors', default='', help='comma-separated floors (default: all)')
+    parser.add_argument('--out', default=MAP_DIR, help=f'output directory (default: {MAP_DIR})')
+    parser.add_argument('--inject', action='store_true',
+                        help=f'make {HTML_PATH} load the prebuilt floors before falling back to genMap')
+    parser.add_argument('--parity', action='store_true', help='compare against the JS genMap under node')
+    args = parser.parse_args()
+    try:
+        args.out = site_path(args.out)
+    except ValueError as e:
+        parser.error(f"--out: {e}")
+
+    with open(HTML_PATH, 'r', encoding='utf-8') as f:
+        html = f.read()
+    consts = js_constants(html)
+    floors = [int(f) for f in args.floors.split(',') if f] or list(range(consts['FLOORS']))
+
+    if args.parity:
+        failed = False
+        for floor, value, mismatches, first in parity(html, consts, floors):
+            mark = '✓' if not mismatches else '✗'
+            where = f" (first at x={first[0]}, y={first[1]})" if first else ''
+            print(f"  {mark} floor {floor:2d}, Math.random()={value}: {mismatches} mismatched tiles{where}")
+            failed |= bool(mismatches)
+        return 1 if failed else 0
+
+    maps = {f: generate_floor(f, consts, seeded_random(args.seed, f)) for f in floors}
+    manifest = write_maps(maps, args.seed, args.out, os.path.join(args.out, 'manifest.json'))
+    total = sum(entry['bytes'] for entry in manifest['floors'].values())
+    raw = sum(tiles.size for tiles in maps.values())
+    print(f"✓ Generated {len(maps)} floors (seed {args.seed}): {raw / 1e6:.1f}M tiles → {total / 1024:.1f} KB")
+
+    if args.inject:
+        from html_patcher import write_atomic
+        new_html = inject_maps(html, map_js(manifest, consts['FLOORS']))
+        if new_html != html:
+            write_atomic(HTML_PATH, new_html)
+        print(f"✓ {HTML_PATH} now loads prebuilt floors")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())